@@ -20,6 +20,10 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    # Trace id + root span per request, returned in X-Request-ID (leave/tracing.py)
+    'leave.tracing.TracingMiddleware',
+    # Request latency/status/query metrics (leave/metrics.py) - inside tracing, so request time includes everything below but not span setup
+    'leave.metrics.MetricsMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -27,6 +31,8 @@ MIDDLEWARE = [
     'django.contrib.auth.middleware.AuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
+    # Opt-in request profiling - removes itself unless LEAVE_PROFILE_RATE or LEAVE_PROFILE_USERS is set
+    'leave.profiling.ProfilingMiddleware',
 ]
 
 ROOT_URLCONF = 'config.urls'
@@ -53,6 +59,8 @@ DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.sqlite3',
         'NAME': BASE_DIR / 'db.sqlite3',
+        # Test databases are built from the models (the migrations lag behind them)
+        'TEST': {'MIGRATE': False},
     }
 }
 
@@ -82,4 +90,60 @@ DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 # Slack Configuration
 SLACK_BOT_TOKEN = os.getenv('SLACK_BOT_TOKEN')
 SLACK_SIGNING_SECRET = os.getenv('SLACK_SIGNING_SECRET')
-SLACK_MANAGER_CHANNEL = os.getenv('SLACK_MANAGER_CHANNEL', '#leave-approvals')
\ No newline at end of file
+SLACK_MANAGER_CHANNEL = os.getenv('SLACK_MANAGER_CHANNEL', '#leave-approvals')
+# File link cache (seconds) - links are refreshed in the background shortly before they expire
+SLACK_FILE_LINK_TTL = int(os.getenv('SLACK_FILE_LINK_TTL', '3600'))
+SLACK_FILE_LINK_REFRESH_AHEAD = int(os.getenv('SLACK_FILE_LINK_REFRESH_AHEAD', '300'))
+
+# Max concurrent Slack notification sends for bulk actions
+SLACK_NOTIFY_MAX_WORKERS = int(os.getenv('SLACK_NOTIFY_MAX_WORKERS', '4'))
+
+# Working-day engine - weekmask is Mon..Sun, holidays come from the Holiday table
+LEAVE_WEEKMASK = os.getenv('LEAVE_WEEKMASK', '1111100')
+LEAVE_HOLIDAY_CALENDAR = os.getenv('LEAVE_HOLIDAY_CALENDAR', 'default')
+
+# In-memory leave interval index - overlay size before the tree is rebuilt (in the background), how often
+# (seconds) each process picks up leaves saved by other workers, which bounds how stale conflict checks can
+# be, and how often it does a full comparison with the database for deletes and raw writes (0 = never)
+LEAVE_INDEX_REBUILD_THRESHOLD = int(os.getenv('LEAVE_INDEX_REBUILD_THRESHOLD', '256'))
+LEAVE_INDEX_VERIFY_INTERVAL = int(os.getenv('LEAVE_INDEX_VERIFY_INTERVAL', '60'))
+LEAVE_INDEX_FULL_VERIFY_INTERVAL = int(os.getenv('LEAVE_INDEX_FULL_VERIFY_INTERVAL', '3600'))
+
+# iCalendar subscription feeds (calendar/department/<id>.ics, calendar/team/<id>.ics)
+LEAVE_CALENDAR_FEED_PAST_DAYS = int(os.getenv('LEAVE_CALENDAR_FEED_PAST_DAYS', '90'))
+LEAVE_CALENDAR_FEED_CACHE_TTL = int(os.getenv('LEAVE_CALENDAR_FEED_CACHE_TTL', '86400'))
+LEAVE_CALENDAR_FEED_BASE_URL = os.getenv('LEAVE_CALENDAR_FEED_BASE_URL', '')
+
+# Slack Web API endpoint - point at `manage.py fake_slack_server` for offline load tests
+SLACK_API_BASE_URL = os.getenv('SLACK_API_BASE_URL', 'https://slack.com/api/')
+
+# Per-handler query budgets (leave/query_budget.py): 'off', 'log' (warn on overrun) or 'raise'
+QUERY_BUDGET_MODE = os.getenv('QUERY_BUDGET_MODE', 'log')
+
+# On-demand profiling (leave/profiling.py, `manage.py profiles`) - profile LEAVE_PROFILE_RATE of requests
+# to LEAVE_PROFILE_PATHS (optionally only LEAVE_PROFILE_COMMANDS) plus every request from LEAVE_PROFILE_USERS
+LEAVE_PROFILE_RATE = float(os.getenv('LEAVE_PROFILE_RATE', '0'))
+LEAVE_PROFILE_PATHS = [path for path in os.getenv('LEAVE_PROFILE_PATHS', '/slack/').split(',') if path]
+LEAVE_PROFILE_COMMANDS = [command for command in os.getenv('LEAVE_PROFILE_COMMANDS', '').split(',') if command]
+LEAVE_PROFILE_USERS = [user for user in os.getenv('LEAVE_PROFILE_USERS', '').split(',') if user]
+LEAVE_PROFILE_MODE = os.getenv('LEAVE_PROFILE_MODE', 'cprofile')  # 'cprofile' or 'sample'
+LEAVE_PROFILE_SAMPLE_MS = float(os.getenv('LEAVE_PROFILE_SAMPLE_MS', '5'))
+LEAVE_PROFILE_DIR = os.getenv('LEAVE_PROFILE_DIR', str(BASE_DIR / 'profiles'))
+
+# App metrics at /metrics in Prometheus text format (leave/metrics.py) - served to LEAVE_METRICS_ALLOWED_IPS,
+# or only to scrapers sending 'Authorization: Bearer <LEAVE_METRICS_TOKEN>' when a token is set
+LEAVE_METRICS_ENABLED = os.getenv('LEAVE_METRICS_ENABLED', 'true').lower() == 'true'
+LEAVE_METRICS_TOKEN = os.getenv('LEAVE_METRICS_TOKEN', '')
+LEAVE_METRICS_ALLOWED_IPS = [ip for ip in os.getenv('LEAVE_METRICS_ALLOWED_IPS', '127.0.0.1,::1').split(',') if ip]
+
+# Request tracing (leave/tracing.py) - finished spans are logged on leave.tracing; set a path to also
+# append them as JSON lines for `manage.py traces`
+LEAVE_TRACE_FILE = os.getenv('LEAVE_TRACE_FILE', '')
+
+# JSON codec for Slack payloads and responses (leave/json_codec.py): 'auto' uses orjson when it is installed
+# (optional - `pip install orjson`), 'json' forces the stdlib
+LEAVE_JSON_BACKEND = os.getenv('LEAVE_JSON_BACKEND', 'auto')  # 'auto' or 'json'
+
+# Seconds a process keeps a working-day holiday calendar (leave/working_days.py) - bounds how long other
+# workers count durations without a holiday added or removed elsewhere
+LEAVE_HOLIDAY_CACHE_TTL = int(os.getenv('LEAVE_HOLIDAY_CACHE_TTL', '300'))
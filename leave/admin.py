@@ -1,5 +1,5 @@
 from django.contrib import admin
-from .models import LeaveRequest, LeaveBalance, LeavePolicy, Department, Team, UserRole
+from .models import LeaveRequest, LeaveBalance, LeavePolicy, Department, Team, UserRole, LeaveDocument, LeaveApproverAssignment, SlackMessageRef, BalanceRollover, Holiday, DailyOccupancy
 
 @admin.register(LeaveBalance)
 class LeaveBalanceAdmin(admin.ModelAdmin):
@@ -7,6 +7,23 @@ class LeaveBalanceAdmin(admin.ModelAdmin):
     search_fields = ['user__username']
     readonly_fields = ['last_reset_date']
 
+@admin.register(BalanceRollover)
+class BalanceRolloverAdmin(admin.ModelAdmin):
+    list_display = ['period', 'rows_updated', 'rolled_at']
+    readonly_fields = ['period', 'rows_updated', 'rolled_at']
+
+@admin.register(Holiday)
+class HolidayAdmin(admin.ModelAdmin):
+    list_display = ['date', 'name', 'calendar']
+    list_filter = ['calendar']
+    search_fields = ['name']
+
+@admin.register(DailyOccupancy)
+class DailyOccupancyAdmin(admin.ModelAdmin):
+    list_display = ['date', 'department', 'team', 'approved_count', 'pending_count']
+    list_filter = ['department', 'team']
+    date_hierarchy = 'date'
+
 @admin.register(LeavePolicy)
 class LeavePolicyAdmin(admin.ModelAdmin):
     list_display = ['name', 'casual_leave_limit', 'sick_leave_limit', 'created_at']
@@ -20,6 +37,26 @@ class LeaveRequestAdmin(admin.ModelAdmin):
     search_fields = ['employee__username', 'reason']
     readonly_fields = ['created_at', 'updated_at']
 
+@admin.register(LeaveDocument)
+class LeaveDocumentAdmin(admin.ModelAdmin):
+    list_display = ['leave', 'file_name', 'file_type', 'file_size', 'uploaded_at']
+    search_fields = ['file_id', 'file_name', 'leave__employee__username']
+    readonly_fields = ['uploaded_at']
+
+@admin.register(LeaveApproverAssignment)
+class LeaveApproverAssignmentAdmin(admin.ModelAdmin):
+    list_display = ['leave', 'manager_slack_id', 'state', 'thread_ts', 'updated_at']
+    list_filter = ['state']
+    search_fields = ['manager_slack_id', 'leave__employee__username']
+    readonly_fields = ['created_at', 'updated_at']
+
+@admin.register(SlackMessageRef)
+class SlackMessageRefAdmin(admin.ModelAdmin):
+    list_display = ['channel', 'ts', 'thread_ts', 'leave', 'role', 'manager_slack_id', 'created_at']
+    list_filter = ['role']
+    search_fields = ['channel', 'ts', 'thread_ts', 'manager_slack_id']
+    readonly_fields = ['created_at']
+
 @admin.register(Department)
 class DepartmentAdmin(admin.ModelAdmin):
     list_display = ['name', 'created_at']
@@ -1,4 +1,4 @@
-from django.http import JsonResponse
+from .json_codec import JsonResponse
 from .models import LeaveRequest
 from .slack_utils import get_or_create_user, slack_client, update_leave_thread
 from .leave_utils import update_leave_balance_on_approval
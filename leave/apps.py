@@ -3,4 +3,9 @@ from django.apps import AppConfig
 
 class LeaveConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
-    name = 'leave'
\ No newline at end of file
+    name = 'leave'
+
+    def ready(self):
+        from . import signals  # noqa: F401
+        from .tracing import install_log_record_factory
+        install_log_record_factory()
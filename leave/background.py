@@ -0,0 +1,48 @@
+"""
+Background jobs for Slack handlers
+
+Handlers answer Slack within its 3 second limit and do the real work in a
+daemon thread. run_in_background starts that thread with a copy of the
+caller's contextvars, so per-request state (an active profile, for one)
+follows the job into the thread. Each job runs in a span of the trace
+that started it and is counted in leave.metrics while it runs. Thread
+pools do not copy the context; wrap their functions in with_current_context.
+"""
+from functools import wraps
+import contextvars
+import threading
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+def _run_job(target, args, kwargs):
+    from .metrics import track_job
+    from .profiling import profile_job
+    from .tracing import span
+    name = getattr(target, '__qualname__', repr(target))
+    with span(f'job {name}'), track_job(name), profile_job(name):
+        return target(*args, **kwargs)
+
+
+def run_in_background(target, *args, **kwargs):
+    """Run target(*args, **kwargs) in a daemon thread that inherits the caller's context; returns the thread"""
+    context = contextvars.copy_context()
+    thread = threading.Thread(
+        target=context.run,
+        args=(_run_job, target, args, kwargs),
+        name=f"bg-{getattr(target, '__name__', 'job')}",
+        daemon=True
+    )
+    thread.start()
+    return thread
+
+
+def with_current_context(func):
+    """func wrapped to run in a copy of the caller's context - for thread pool workers, which start without it"""
+    context = contextvars.copy_context()
+
+    @wraps(func)
+    def wrapper(*args, **kwargs):
+        return context.copy().run(func, *args, **kwargs)
+    return wrapper
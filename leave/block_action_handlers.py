@@ -1,15 +1,20 @@
-from django.http import JsonResponse
-from .slack_utils import slack_client, update_leave_thread
+from .json_codec import JsonResponse
+from .slack_utils import slack_client, update_leave_thread, record_message_ref
 from .leave_utils import update_leave_balance_on_approval
 from .approval_utils import create_compensatory_notification_blocks, process_employee_response, create_document_upload_modal
 from .models import LeaveRequest
+from .working_days import leave_working_days
+from .query_budget import query_budget
+from .background import run_in_background
 from django.utils import timezone
 from slack_sdk.errors import SlackApiError
 import logging
-from .file_access_handler import handle_document_access_request
+from .file_access_handler import handle_document_access_request, get_leave_document
+from .file_cache import get_file_links, get_best_link, update_from_file_data, create_public_link
 
 logger = logging.getLogger(__name__)
 
+@query_budget(38)
 def handle_block_actions(payload):
     """
     Main handler for all block action button clicks in Slack messages
@@ -20,25 +25,24 @@ def handle_block_actions(payload):
     - No messages sent to leave-approval channel
     """
     try:
-        action = payload['actions'][0]
-        action_id = action['action_id']
+        action_id = payload.action_id
         
         if action_id == 'upload_document':
-            return handle_upload_document_action(payload, action)
+            return handle_upload_document_action(payload)
         elif action_id in ['approve_unpaid', 'approve_compensatory']:
-            return handle_compensatory_actions(payload, action, action_id)
+            return handle_compensatory_actions(payload, action_id)
         elif action_id in ['employee_accept_unpaid', 'employee_reject_offer', 'employee_accept_comp']:
-            return handle_employee_responses(payload, action, action_id)
+            return handle_employee_responses(payload, action_id)
         elif action_id in ['request_med_cert', 'request_docs', 'request_medical_certificate']:
-            return handle_document_requests(payload, action, action_id)
+            return handle_document_requests(payload, action_id)
         elif action_id == 'submit_doc_later':
-            return handle_submit_doc_later(payload, action)
+            return handle_submit_doc_later(payload)
         elif action_id == 'cancel_request':
-            return handle_cancel_request(payload, action)
+            return handle_cancel_request(payload)
         elif action_id in ['verify_document', 'reject_document']:
-            return handle_document_verification(payload, action, action_id)
+            return handle_document_verification(payload, action_id)
         elif action_id in ['approve_regular', 'reject_leave', 'approve_leave']:
-            return handle_regular_approval(payload, action, action_id)
+            return handle_regular_approval(payload, action_id)
         elif action_id == 'get_fresh_file_link':
             return handle_get_fresh_file_link_action(payload)
         elif action_id == 'reshare_file':
@@ -56,16 +60,17 @@ def handle_block_actions(payload):
         logger.error(f"Error handling block actions: {e}")
         return JsonResponse({'text': f'Error: {str(e)}'}, status=200)
 
-def handle_upload_document_action(payload, action):
+@query_budget(5)
+def handle_upload_document_action(payload):
     """Handle document upload button click - using working version logic"""
-    leave_id = action['value'].split('|')[0]
+    leave_id = payload.action_value.split('|')[0]
     leave_request = LeaveRequest.objects.get(id=leave_id)
     
     # Update the original message to show upload in progress
     try:
         slack_client.chat_update(
-            channel=payload['channel']['id'],
-            ts=payload['message']['ts'],
+            channel=payload.channel_id,
+            ts=payload.message_ts,
             blocks=[{
                 "type": "section",
                 "text": {
@@ -86,24 +91,23 @@ def handle_upload_document_action(payload, action):
     
     # Show upload modal - direct approach like working version
     slack_client.views_open(
-        trigger_id=payload['trigger_id'],
+        trigger_id=payload.trigger_id,
         view=create_document_upload_modal(leave_request)
     )
     return JsonResponse({'text': 'Opening document upload form...'})
 
-def handle_document_requests(payload, action, action_id):
+@query_budget(22)
+def handle_document_requests(payload, action_id):
     """Handle document request actions with proper threaded notifications like leave_tmp_out"""
-    leave_id = action['value'].split('|')[0]
+    leave_id = payload.action_value.split('|')[0]
     leave_request = LeaveRequest.objects.get(id=leave_id)
-    current_user_id = payload['user']['id']  # This is the manager requesting docs
+    current_user_id = payload.user_id  # This is the manager requesting docs
     
     # Get supervisor comment with fallback
-    state_values = payload.get('state', {}).get('values', {})
-    comment_input = state_values.get('supervisor_comment', {}).get('comment_input', {})
-    comment = comment_input.get('value') if comment_input and comment_input.get('value') else 'No comment provided'
+    comment = payload.value('supervisor_comment', 'comment_input', 'No comment provided')
     
     # Set document details based on action
-    if action_id in ['request_med_cert', 'request_medical_certificate'] or action['value'].split('|')[1] == 'REQUEST_MED_CERT' or action['value'].split('|')[1] == 'REQUEST_DOCS':
+    if action_id in ['request_med_cert', 'request_medical_certificate'] or payload.action_value.split('|')[1] == 'REQUEST_MED_CERT' or payload.action_value.split('|')[1] == 'REQUEST_DOCS':
         if leave_request.leave_type == 'SICK':
             doc_desc = "medical certificate"
             leave_request.document_type = 'Medical Certificate'
@@ -129,8 +133,8 @@ def handle_document_requests(payload, action, action_id):
     # UPDATE: Remove buttons from original message and show action completed
     try:
         slack_client.chat_update(
-            channel=payload['channel']['id'],
-            ts=payload['message']['ts'],
+            channel=payload.channel_id,
+            ts=payload.message_ts,
             blocks=[{
                 "type": "section",
                 "text": {
@@ -240,15 +244,15 @@ def handle_document_requests(payload, action, action_id):
     
     return JsonResponse({'status': 'ok'})
 
-def handle_regular_approval(payload, action, action_id):
+@query_budget(38)
+def handle_regular_approval(payload, action_id):
     """Handle regular approval and rejection actions with proper threaded notifications like leave_tmp_out"""
-    leave_id = action['value'].split('|')[0]
+    leave_id = payload.action_value.split('|')[0]
     leave_request = LeaveRequest.objects.get(id=leave_id)
-    current_user_id = payload['user']['id']  # This is the manager taking action
+    current_user_id = payload.user_id  # This is the manager taking action
     
     # Get supervisor comment with fallback
-    state_values = payload.get('state', {}).get('values', {})
-    comment = state_values.get('supervisor_comment', {}).get('comment_input', {}).get('value', 'No comment provided')
+    comment = payload.value('supervisor_comment', 'comment_input', 'No comment provided')
     
     # Handle different action_id variations
     if action_id in ['approve_regular', 'approve_leave']:
@@ -268,8 +272,8 @@ def handle_regular_approval(payload, action, action_id):
     # UPDATE: Remove buttons from original message and show action completed
     try:
         slack_client.chat_update(
-            channel=payload['channel']['id'],
-            ts=payload['message']['ts'],
+            channel=payload.channel_id,
+            ts=payload.message_ts,
             blocks=[{
                 "type": "section",
                 "text": {
@@ -346,16 +350,15 @@ def handle_regular_approval(payload, action, action_id):
     
     return JsonResponse({'status': 'ok'})
 
-def handle_compensatory_actions(payload, action, action_id):
+@query_budget(20)
+def handle_compensatory_actions(payload, action_id):
     """Handle unpaid and compensatory leave actions with proper threaded notifications like leave_tmp_out"""
-    leave_id = action['value'].split('|')[0]
+    leave_id = payload.action_value.split('|')[0]
     leave_request = LeaveRequest.objects.get(id=leave_id)
-    current_user_id = payload['user']['id']
+    current_user_id = payload.user_id
     
     # Get supervisor comment with fallback
-    state_values = payload.get('state', {}).get('values', {})
-    comment_input = state_values.get('supervisor_comment', {}).get('comment_input', {})
-    comment = comment_input.get('value') if comment_input and comment_input.get('value') else 'No comment provided'
+    comment = payload.value('supervisor_comment', 'comment_input', 'No comment provided')
     
     # Create employee notification and get status
     notification_blocks = create_compensatory_notification_blocks(leave_request, action_id, comment)
@@ -364,8 +367,8 @@ def handle_compensatory_actions(payload, action, action_id):
     # UPDATE: Remove buttons from original message and show action completed
     try:
         slack_client.chat_update(
-            channel=payload['channel']['id'],
-            ts=payload['message']['ts'],
+            channel=payload.channel_id,
+            ts=payload.message_ts,
             blocks=[{
                 "type": "section",
                 "text": {
@@ -426,19 +429,20 @@ def handle_compensatory_actions(payload, action, action_id):
     
     return JsonResponse({'status': 'ok'})
 
-def handle_employee_responses(payload, action, action_id):
+@query_budget(38)
+def handle_employee_responses(payload, action_id):
     """Handle employee responses with proper threaded notifications to managers like leave_tmp_out"""
-    leave_id = action['value'].split('|')[0]
+    leave_id = payload.action_value.split('|')[0]
     leave_request = LeaveRequest.objects.get(id=leave_id)
-    current_user_id = payload['user']['id']  # This is the employee responding
+    current_user_id = payload.user_id  # This is the employee responding
     
     # Process response and create notification
     if action_id == 'employee_accept_comp':
         # Update the original message to show acceptance
         try:
             slack_client.chat_update(
-                channel=payload['channel']['id'],
-                ts=payload['message']['ts'],
+                channel=payload.channel_id,
+                ts=payload.message_ts,
                 blocks=[{
                     "type": "section",
                     "text": {
@@ -474,7 +478,7 @@ def handle_employee_responses(payload, action, action_id):
                         "text": (
                             f"*Please select when you will do compensatory work:*\n\n"
                             f"*Leave Period:* {leave_request.start_date} to {leave_request.end_date}\n"
-                            f"*Duration:* {(leave_request.end_date - leave_request.start_date).days + 1} days\n\n"
+                            f"*Duration:* {leave_working_days(leave_request)} working days\n\n"
                             f"You need to complete equivalent work hours on the selected date(s)."
                         )
                     }
@@ -494,7 +498,7 @@ def handle_employee_responses(payload, action, action_id):
         }
         
         slack_client.views_open(
-            trigger_id=payload['trigger_id'],
+            trigger_id=payload.trigger_id,
             view=date_modal
         )
         
@@ -531,8 +535,8 @@ def handle_employee_responses(payload, action, action_id):
         response_emoji = "✅" if "accepted" in status_text else "❌"
         try:
             slack_client.chat_update(
-                channel=payload['channel']['id'],
-                ts=payload['message']['ts'],
+                channel=payload.channel_id,
+                ts=payload.message_ts,
                 blocks=[{
                     "type": "section",
                     "text": {
@@ -563,7 +567,7 @@ def handle_employee_responses(payload, action, action_id):
         
         # Send THREADED acknowledgment to EMPLOYEE (like leave_tmp_out)
         try:
-            slack_client.chat_postMessage(
+            ack_response = slack_client.chat_postMessage(
                 channel=current_user_id,
                 thread_ts=leave_request.thread_ts if leave_request.thread_ts else None,
                 blocks=[{
@@ -581,23 +585,25 @@ def handle_employee_responses(payload, action, action_id):
                 }],
                 text=f"Response recorded: {status_text}"
             )
+            record_message_ref(ack_response, leave_request, 'EMPLOYEE', notification_type='employee_response_ack')
         except Exception as e:
             logger.error(f"Error sending threaded employee acknowledgment: {e}")
         
         return JsonResponse({'status': 'ok'})
 
-def handle_document_verification(payload, action, action_id):
+@query_budget(5)
+def handle_document_verification(payload, action_id):
     """Handle document verification and rejection with immediate response like leave_tmp_out"""
     try:
         # IMMEDIATE RESPONSE - Return success first to avoid timeout
+        @query_budget(41)
         def process_document_verification_background():
             """Background function to process document verification"""
             try:
-                leave_id = action['value'].split('|')[0]
+                leave_id = payload.action_value.split('|')[0]
                 leave_request = LeaveRequest.objects.get(id=leave_id)
-                current_user_id = payload['user']['id']
-                state_values = payload.get('state', {}).get('values', {})
-                comment = state_values.get('supervisor_comment', {}).get('comment_input', {}).get('value', 'No comment provided')
+                current_user_id = payload.user_id
+                comment = payload.value('supervisor_comment', 'comment_input', 'No comment provided')
                 
                 if action_id == 'verify_document':
                     leave_request.document_status = 'APPROVED'
@@ -620,8 +626,8 @@ def handle_document_verification(payload, action, action_id):
                 # UPDATE: Remove buttons from original message and show action completed
                 try:
                     slack_client.chat_update(
-                        channel=payload['channel']['id'],
-                        ts=payload['message']['ts'],
+                        channel=payload.channel_id,
+                        ts=payload.message_ts,
                         blocks=[{
                             "type": "section",
                             "text": {
@@ -709,10 +715,7 @@ def handle_document_verification(payload, action, action_id):
                     pass
         
         # Start background thread IMMEDIATELY
-        import threading
-        thread = threading.Thread(target=process_document_verification_background)
-        thread.daemon = True
-        thread.start()
+        run_in_background(process_document_verification_background)
         
         # Return immediate response (prevents timeout)
         return JsonResponse({'status': 'ok'})
@@ -721,12 +724,13 @@ def handle_document_verification(payload, action, action_id):
         logger.error(f"Error handling document verification: {e}")
         return JsonResponse({'text': f'Error: {str(e)}'}, status=200)
 
-def handle_submit_doc_later(payload, action):
+@query_budget(22)
+def handle_submit_doc_later(payload):
     """Handle employee choosing to submit documents later"""
     try:
-        leave_id = action['value'].split('|')[0]
+        leave_id = payload.action_value.split('|')[0]
         leave_request = LeaveRequest.objects.get(id=leave_id)
-        current_user_id = payload['user']['id']  # This is the employee
+        current_user_id = payload.user_id  # This is the employee
         
         # Update status to indicate documents will be submitted later
         leave_request.status = 'DOCS_PENDING_LATER'
@@ -735,8 +739,8 @@ def handle_submit_doc_later(payload, action):
         # Update the original message to show decision
         try:
             slack_client.chat_update(
-                channel=payload['channel']['id'],
-                ts=payload['message']['ts'],
+                channel=payload.channel_id,
+                ts=payload.message_ts,
                 blocks=[{
                     "type": "section",
                     "text": {
@@ -784,7 +788,7 @@ def handle_submit_doc_later(payload, action):
         
         # Send THREADED acknowledgment to EMPLOYEE
         try:
-            slack_client.chat_postMessage(
+            ack_response = slack_client.chat_postMessage(
                 channel=current_user_id,
                 thread_ts=leave_request.thread_ts if leave_request.thread_ts else None,
                 blocks=[{
@@ -803,6 +807,7 @@ def handle_submit_doc_later(payload, action):
                 }],
                 text="Document submission delayed"
             )
+            record_message_ref(ack_response, leave_request, 'EMPLOYEE', notification_type='document_delay_ack')
         except Exception as e:
             logger.error(f"Error sending threaded employee acknowledgment: {e}")
         
@@ -812,12 +817,13 @@ def handle_submit_doc_later(payload, action):
         logger.error(f"Error handling submit doc later: {e}")
         return JsonResponse({'text': f'Error: {str(e)}'}, status=200)
 
-def handle_cancel_request(payload, action):
+@query_budget(30)
+def handle_cancel_request(payload):
     """Handle employee canceling their leave request"""
     try:
-        leave_id = action['value'].split('|')[0]
+        leave_id = payload.action_value.split('|')[0]
         leave_request = LeaveRequest.objects.get(id=leave_id)
-        current_user_id = payload['user']['id']  # This is the employee
+        current_user_id = payload.user_id  # This is the employee
         
         # Update status to cancelled
         leave_request.status = 'CANCELLED'
@@ -826,8 +832,8 @@ def handle_cancel_request(payload, action):
         # Update the original message to show cancellation
         try:
             slack_client.chat_update(
-                channel=payload['channel']['id'],
-                ts=payload['message']['ts'],
+                channel=payload.channel_id,
+                ts=payload.message_ts,
                 blocks=[{
                     "type": "section",
                     "text": {
@@ -873,7 +879,7 @@ def handle_cancel_request(payload, action):
         
         # Send THREADED acknowledgment to EMPLOYEE
         try:
-            slack_client.chat_postMessage(
+            ack_response = slack_client.chat_postMessage(
                 channel=current_user_id,
                 thread_ts=leave_request.thread_ts if leave_request.thread_ts else None,
                 blocks=[{
@@ -891,6 +897,7 @@ def handle_cancel_request(payload, action):
                 }],
                 text="Leave request cancelled"
             )
+            record_message_ref(ack_response, leave_request, 'EMPLOYEE', notification_type='request_cancelled_ack')
         except Exception as e:
             logger.error(f"Error sending threaded employee acknowledgment: {e}")
         
@@ -900,87 +907,66 @@ def handle_cancel_request(payload, action):
         logger.error(f"Error handling cancel request: {e}")
         return JsonResponse({'text': f'Error: {str(e)}'}, status=200)
 
+@query_budget(10)
 def handle_get_fresh_file_link_action(payload):
     """Handle get fresh file link action"""
     try:
-        action_value = payload['actions'][0]['value']
+        action_value = payload.action_value
         leave_id = action_value.split('|')[0]
-        leave_request = LeaveRequest.objects.get(id=leave_id)
         
-        # Extract file ID from document_notes
-        file_id = None
-        if leave_request.document_notes:
-            for line in leave_request.document_notes.split('\n'):
-                if line.startswith('File ID:'):
-                    file_id = line.split(': ')[1].strip()
-                    break
+        # Single indexed lookup - file details were stored at upload time
+        document = get_leave_document(leave_id)
         
-        if not file_id:
+        if not document:
             return JsonResponse({
                 "response_type": "ephemeral",
                 "text": "❌ Could not find file ID. Please contact the employee to reshare the document."
             })
         
-        # Try to get a fresh file link with multiple methods
+        leave_request = document.leave
+        file_id = document.file_id
+        file_name = document.file_name
+        
         try:
-            file_response = slack_client.files_info(file=file_id)
-            if file_response['ok']:
-                file_data = file_response['file']
-                file_name = file_data.get('name', 'document')
-                
-                # Try multiple URL methods
-                fresh_url = None
-                access_method = "failed"
-                
-                # Method 1: Try public URL
-                try:
-                    share_response = slack_client.files_sharedPublicURL(file=file_id)
-                    if share_response['ok']:
-                        fresh_url = share_response['file']['permalink_public']
-                        access_method = "Fresh Public Link"
-                except:
-                    pass
-                
-                # Method 2: Try private download URL
-                if not fresh_url:
-                    fresh_url = file_data.get('url_private_download')
-                    if fresh_url:
-                        access_method = "Fresh Private Download Link"
-                
-                # Method 3: Fallback to private URL
-                if not fresh_url:
-                    fresh_url = file_data.get('url_private')
-                    access_method = "Fresh Private Link"
-                
-                if fresh_url:
-                    return JsonResponse({
-                        "response_type": "ephemeral",
-                        "blocks": [
-                            {
-                                "type": "section",
-                                "text": {
-                                    "type": "mrkdwn",
-                                    "text": (
-                                        f"🔗 *Fresh Document Link Generated*\n\n"
-                                        f"*File:* {file_name}\n"
-                                        f"*Link Type:* {access_method}\n"
-                                        f"*Employee:* <@{leave_request.employee.username}>\n\n"
-                                        f"📄 **Click here to view:** <{fresh_url}|Open {file_name}>\n\n"
-                                        f"💡 *Tip:* If this link still doesn't work, try the 'Re-share File' button or contact IT support."
-                                    )
-                                }
+            # Shared link cache - seeded from the document, refreshed before expiry
+            links = get_file_links(file_id, document)
+            if not links:
+                return JsonResponse({
+                    "response_type": "ephemeral",
+                    "text": f"❌ Could not access file information. File ID: `{file_id}`"
+                })
+            
+            file_name = links.get('name') or file_name
+            # The manager asked for a fresh link - the one place a public link is created
+            fresh_url = create_public_link(file_id)
+            access_method = "Fresh Public Link"
+            if not fresh_url:
+                fresh_url, access_method = get_best_link(links)
+            
+            if fresh_url:
+                return JsonResponse({
+                    "response_type": "ephemeral",
+                    "blocks": [
+                        {
+                            "type": "section",
+                            "text": {
+                                "type": "mrkdwn",
+                                "text": (
+                                    f"🔗 *Fresh Document Link Generated*\n\n"
+                                    f"*File:* {file_name}\n"
+                                    f"*Link Type:* {access_method}\n"
+                                    f"*Employee:* <@{leave_request.employee.username}>\n\n"
+                                    f"📄 **Click here to view:** <{fresh_url}|Open {file_name}>\n\n"
+                                    f"💡 *Tip:* If this link still doesn't work, try the 'Re-share File' button or contact IT support."
+                                )
                             }
-                        ]
-                    })
-                else:
-                    return JsonResponse({
-                        "response_type": "ephemeral",
-                        "text": f"❌ Could not generate fresh link. File ID: `{file_id}`. Please try re-sharing the file."
-                    })
+                        }
+                    ]
+                })
             else:
                 return JsonResponse({
                     "response_type": "ephemeral",
-                    "text": f"❌ Could not access file information. File ID: `{file_id}`"
+                    "text": f"❌ Could not generate fresh link. File ID: `{file_id}`. Please try re-sharing the file."
                 })
                 
         except Exception as e:
@@ -997,28 +983,24 @@ def handle_get_fresh_file_link_action(payload):
             "text": f"❌ Error: {str(e)}"
         })
 
+@query_budget(10)
 def handle_reshare_file_action(payload):
     """Handle re-share file action"""
     try:
-        action_value = payload['actions'][0]['value']
+        action_value = payload.action_value
         leave_id = action_value.split('|')[0]
-        leave_request = LeaveRequest.objects.get(id=leave_id)
-        manager_id = payload['user']['id']
+        manager_id = payload.user_id
         
-        # Extract file ID from document_notes
-        file_id = None
-        if leave_request.document_notes:
-            for line in leave_request.document_notes.split('\n'):
-                if line.startswith('File ID:'):
-                    file_id = line.split(': ')[1].strip()
-                    break
+        document = get_leave_document(leave_id)
         
-        if not file_id:
+        if not document:
             return JsonResponse({
                 "response_type": "ephemeral",
                 "text": "❌ Could not find file ID. Please contact the employee to reshare the document."
             })
         
+        file_id = document.file_id
+        
         try:
             # Share file directly to the manager's DM
             share_response = slack_client.files_share(
@@ -1027,6 +1009,8 @@ def handle_reshare_file_action(payload):
             )
             
             if share_response['ok']:
+                document.mark_shared(manager_id)
+                update_from_file_data(file_id, share_response.get('file'))
                 return JsonResponse({
                     "response_type": "ephemeral",
                     "text": (
@@ -1055,30 +1039,26 @@ def handle_reshare_file_action(payload):
             "text": f"❌ Error: {str(e)}"
         })
 
+@query_budget(10)
 def handle_reshare_document_action(payload):
     """Handle reshare document action - simple approach"""
     try:
-        action_value = payload['actions'][0]['value']
+        action_value = payload.action_value
         leave_id = action_value.split('|')[0]
-        leave_request = LeaveRequest.objects.get(id=leave_id)
-        manager_id = payload['user']['id']
+        manager_id = payload.user_id
         
-        # Extract file ID from document_notes
-        file_id = None
-        file_name = "document"
-        if leave_request.document_notes:
-            for line in leave_request.document_notes.split('\n'):
-                if line.startswith('File ID:'):
-                    file_id = line.split(': ')[1].strip()
-                elif line.startswith('File Name:'):
-                    file_name = line.split(': ')[1].strip()
+        document = get_leave_document(leave_id)
         
-        if not file_id:
+        if not document:
             return JsonResponse({
                 "response_type": "ephemeral",
                 "text": "❌ Could not find file ID. Please ask the employee to resubmit the document."
             })
         
+        leave_request = document.leave
+        file_id = document.file_id
+        file_name = document.file_name
+        
         try:
             # Simple approach: Share file directly to manager's DM
             response = slack_client.files_share(
@@ -1087,6 +1067,8 @@ def handle_reshare_document_action(payload):
             )
             
             if response['ok']:
+                document.mark_shared(manager_id)
+                update_from_file_data(file_id, response.get('file'))
                 return JsonResponse({
                     "response_type": "ephemeral",
                     "blocks": [
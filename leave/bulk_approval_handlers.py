@@ -0,0 +1,352 @@
+from .json_codec import JsonResponse
+from django.conf import settings
+from django.db import transaction, connection
+from django.utils import timezone
+from concurrent.futures import ThreadPoolExecutor
+from .slack_utils import slack_client, is_manager, send_employee_notification, send_manager_update_notification
+from .models import LeaveRequest, LeaveBalance, LeaveApproverAssignment
+from .leave_utils import rollover_leave_balances
+from .working_days import leave_durations
+from .occupancy import apply_bulk_status_change
+from .leave_index import leaves_changed
+from .background import run_in_background, with_current_context
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Slack static selects accept at most 100 options
+MAX_BULK_OPTIONS = 100
+
+def get_pending_assignments_for_manager(manager_id):
+    """Pending approver assignments for a manager (index on manager + state)"""
+    return LeaveApproverAssignment.objects.select_related('leave', 'leave__employee').filter(
+        manager_slack_id=manager_id,
+        state='PENDING',
+        leave__status='PENDING'
+    ).order_by('leave__start_date')
+
+def handle_bulk_approve(request):
+    """Handle /bulk-approve command - open a modal listing the manager's pending requests"""
+    try:
+        user_id = request.POST.get('user_id')
+        trigger_id = request.POST.get('trigger_id')
+
+        if not is_manager(user_id):
+            return JsonResponse({'text': '❌ Sorry, only managers can bulk approve leave requests.'})
+
+        def open_bulk_modal():
+            """Background function to open bulk approval modal"""
+            try:
+                assignments = list(get_pending_assignments_for_manager(user_id)[:MAX_BULK_OPTIONS])
+
+                if not assignments:
+                    slack_client.chat_postMessage(
+                        channel=user_id,
+                        text="✅ You have no pending leave requests to review."
+                    )
+                    return
+
+                slack_client.views_open(
+                    trigger_id=trigger_id,
+                    view=create_bulk_approval_modal(assignments)
+                )
+            except Exception as e:
+                logger.error(f"Background error opening bulk approval modal: {e}")
+
+        run_in_background(open_bulk_modal)
+
+        return JsonResponse({'text': '⏳ Loading your pending leave requests...'})
+
+    except Exception as e:
+        logger.error(f"Error handling bulk approve command: {e}")
+        return JsonResponse({'text': 'Error opening bulk approval'}, status=200)
+
+def create_bulk_approval_modal(assignments):
+    """Create modal with a multi-select of pending leave requests"""
+    options = []
+    durations = leave_durations([assignment.leave for assignment in assignments])
+    for assignment, days in zip(assignments, durations):
+        leave = assignment.leave
+        label = f"{leave.employee.username} - {leave.get_leave_type_display()} {leave.start_date:%b %d}-{leave.end_date:%b %d} ({days}d)"
+        options.append({
+            "text": {"type": "plain_text", "text": label[:75]},
+            "value": str(leave.id)
+        })
+
+    return {
+        "type": "modal",
+        "callback_id": "bulk_approval_modal",
+        "title": {"type": "plain_text", "text": "Bulk Approve/Reject"},
+        "submit": {"type": "plain_text", "text": "Apply"},
+        "close": {"type": "plain_text", "text": "Cancel"},
+        "blocks": [
+            {
+                "type": "section",
+                "text": {
+                    "type": "mrkdwn",
+                    "text": f"📋 You have *{len(options)}* pending leave request(s)."
+                }
+            },
+            {
+                "type": "input",
+                "block_id": "bulk_leaves",
+                "element": {
+                    "type": "multi_static_select",
+                    "action_id": "leaves_select",
+                    "placeholder": {"type": "plain_text", "text": "Select leave requests"},
+                    "options": options
+                },
+                "label": {"type": "plain_text", "text": "Leave Requests"}
+            },
+            {
+                "type": "input",
+                "block_id": "bulk_decision",
+                "element": {
+                    "type": "radio_buttons",
+                    "action_id": "decision_select",
+                    "initial_option": {"text": {"type": "plain_text", "text": "✅ Approve"}, "value": "APPROVE"},
+                    "options": [
+                        {"text": {"type": "plain_text", "text": "✅ Approve"}, "value": "APPROVE"},
+                        {"text": {"type": "plain_text", "text": "❌ Reject"}, "value": "REJECT"}
+                    ]
+                },
+                "label": {"type": "plain_text", "text": "Decision"}
+            },
+            {
+                "type": "input",
+                "block_id": "supervisor_comment",
+                "element": {
+                    "type": "plain_text_input",
+                    "action_id": "comment_input",
+                    "multiline": True,
+                    "placeholder": {"type": "plain_text", "text": "Comment sent to every selected employee"}
+                },
+                "label": {"type": "plain_text", "text": "Comment"},
+                "optional": True
+            }
+        ]
+    }
+
+def handle_bulk_approval_submission(payload):
+    """Handle bulk approval modal submission - apply in background, clear modal immediately"""
+    try:
+        manager_id = payload.user_id
+
+        leave_ids = [int(value) for value in payload.value('bulk_leaves', 'leaves_select', [])]
+        decision = payload.required('bulk_decision', 'decision_select')
+        comment = payload.value('supervisor_comment', 'comment_input', 'No comment provided')
+
+        if not leave_ids:
+            return JsonResponse({
+                "response_action": "errors",
+                "errors": {"bulk_leaves": "Select at least one leave request"}
+            })
+
+        def process_bulk_approval_background():
+            """Background function to apply the decision and notify"""
+            try:
+                decided = apply_bulk_decision(manager_id, leave_ids, decision, comment)
+                notify_bulk_decision(manager_id, decided, decision, comment)
+            except Exception as e:
+                logger.error(f"Error processing bulk approval: {e}")
+                try:
+                    slack_client.chat_postMessage(
+                        channel=manager_id,
+                        text=f"❌ Error processing bulk {decision.lower()}: {str(e)}"
+                    )
+                except:
+                    pass
+
+        run_in_background(process_bulk_approval_background)
+
+        return JsonResponse({"response_action": "clear"})
+
+    except Exception as e:
+        logger.error(f"Error in bulk approval submission: {e}")
+        return JsonResponse({
+            "response_action": "errors",
+            "errors": {"bulk_leaves": f"Error processing request: {str(e)}"}
+        })
+
+def apply_bulk_decision(manager_id, leave_ids, decision, comment):
+    """
+    Approve or reject many leave requests in one transaction
+
+    Only requests still PENDING and assigned to this manager are changed, so
+    requests decided elsewhere in the meantime are skipped. Balance usage is
+    added per employee in one pass. Returns the ids that were changed.
+    """
+    new_status = 'APPROVED' if decision == 'APPROVE' else 'REJECTED'
+    now = timezone.now()
+
+    with transaction.atomic():
+        assigned = LeaveApproverAssignment.objects.filter(
+            manager_slack_id=manager_id,
+            state='PENDING',
+            leave_id__in=leave_ids
+        ).values('leave_id')
+        leaves = list(
+            LeaveRequest.objects.select_for_update()
+            .filter(id__in=assigned, status='PENDING')
+        )
+        if not leaves:
+            return []
+
+        for leave in leaves:
+            leave.status = new_status
+            leave.supervisor_comment = comment
+            leave.updated_at = now  # bulk_update skips auto_now
+        LeaveRequest.objects.bulk_update(leaves, ['status', 'supervisor_comment', 'updated_at'])
+        # bulk_update bypasses the occupancy/index signals
+        apply_bulk_status_change(leaves, 'PENDING')
+        leaves_changed(leaves)
+
+        if new_status == 'APPROVED':
+            apply_bulk_balance_usage(leaves)
+
+        decided_ids = [leave.id for leave in leaves]
+        LeaveApproverAssignment.objects.filter(leave_id__in=decided_ids, state='PENDING').update(
+            state=new_status,
+            updated_at=now
+        )
+
+    logger.info(f"Bulk {new_status} by {manager_id}: {len(decided_ids)} of {len(leave_ids)} requests")
+    return decided_ids
+
+def apply_bulk_balance_usage(leaves):
+    """Add approved casual/sick days to balances - one read and one write for all employees"""
+    usage = {}
+    for leave, days in zip(leaves, leave_durations(leaves)):
+        if leave.leave_type not in ('CASUAL', 'SICK'):
+            continue
+        used = usage.setdefault(leave.employee_id, {'CASUAL': 0, 'SICK': 0})
+        used[leave.leave_type] += int(days)
+
+    if not usage:
+        return
+
+    # Rows the monthly job has not reached yet are rolled over first
+    rollover_leave_balances(user_ids=list(usage))
+    balances = {b.user_id: b for b in LeaveBalance.objects.select_for_update().filter(user_id__in=usage)}
+    missing = [LeaveBalance(user_id=user_id) for user_id in usage if user_id not in balances]
+    if missing:
+        LeaveBalance.objects.bulk_create(missing)
+        balances.update({b.user_id: b for b in LeaveBalance.objects.select_for_update().filter(user_id__in=[m.user_id for m in missing])})
+
+    for user_id, used in usage.items():
+        balances[user_id].casual_used += used['CASUAL']
+        balances[user_id].sick_used += used['SICK']
+    LeaveBalance.objects.bulk_update(list(balances.values()), ['casual_used', 'sick_used'])
+
+def notify_bulk_decision(manager_id, leave_ids, decision, comment):
+    """Send employee and manager notifications for a bulk decision through a bounded pool"""
+    if not leave_ids:
+        slack_client.chat_postMessage(
+            channel=manager_id,
+            text="ℹ️ None of the selected requests were still pending - nothing was changed."
+        )
+        return
+
+    status_text = "approved" if decision == 'APPROVE' else "rejected"
+    emoji = "✅" if decision == 'APPROVE' else "❌"
+
+    leaves = list(
+        LeaveRequest.objects.select_related('employee')
+        .prefetch_related('approver_assignments')
+        .filter(id__in=leave_ids)
+    )
+
+    def notify_one(leave_request):
+        try:
+            # Remove buttons from this manager's original request message
+            for assignment in leave_request.approver_assignments.all():
+                if assignment.manager_slack_id == manager_id and assignment.channel and assignment.thread_ts:
+                    try:
+                        slack_client.chat_update(
+                            channel=assignment.channel,
+                            ts=assignment.thread_ts,
+                            text=f"Leave request {status_text} (bulk)",
+                            blocks=[{
+                                "type": "section",
+                                "text": {
+                                    "type": "mrkdwn",
+                                    "text": (
+                                        f"{emoji} *Action Completed: Leave Request {status_text.upper()}*\n\n"
+                                        f"*Employee:* <@{leave_request.employee.username}>\n"
+                                        f"*Leave Type:* {leave_request.get_leave_type_display()}\n"
+                                        f"*Duration:* {leave_request.start_date} to {leave_request.end_date}\n"
+                                        f"*Your Comment:* {comment}\n\n"
+                                        f"🔒 *This request is now complete*"
+                                    )
+                                }
+                            }]
+                        )
+                    except Exception as e:
+                        logger.error(f"Error updating original message for leave {leave_request.id}: {e}")
+
+            send_employee_notification(
+                leave_request,
+                [{
+                    "type": "section",
+                    "text": {
+                        "type": "mrkdwn",
+                        "text": (
+                            f"{emoji} *Leave Request - FINAL DECISION*\n\n"
+                            f"Your leave request has been *{status_text.upper()}*\n\n"
+                            f"*Duration:* {leave_request.start_date} to {leave_request.end_date}\n"
+                            f"*Manager:* <@{manager_id}>\n"
+                            f"*Final Status:* {status_text.upper()}\n"
+                            f"*Comment:* {comment}\n\n"
+                            f"🔒 *This request is now complete.*"
+                        )
+                    }
+                }],
+                f"Leave request {status_text} by <@{manager_id}>",
+                notification_type="final_decision"
+            )
+            send_manager_update_notification(
+                leave_request,
+                [{
+                    "type": "section",
+                    "text": {
+                        "type": "mrkdwn",
+                        "text": (
+                            f"{emoji} *Manager Action: Leave Request {status_text.upper()}*\n\n"
+                            f"*Employee:* <@{leave_request.employee.username}>\n"
+                            f"*Duration:* {leave_request.start_date} to {leave_request.end_date}\n"
+                            f"*Action by:* <@{manager_id}> (bulk)\n"
+                            f"*Final Status:* {status_text.upper()}\n"
+                            f"*Comment:* {comment}\n\n"
+                            f"🔒 *This request is now complete.*"
+                        )
+                    }
+                }],
+                f"Leave request {status_text} by <@{manager_id}> for <@{leave_request.employee.username}>",
+                exclude_manager_id=manager_id,
+                notification_type="final_decision"
+            )
+            return True
+        except Exception as e:
+            logger.error(f"Error notifying bulk decision for leave {leave_request.id}: {e}")
+            return False
+        finally:
+            # Pool threads are not request threads - release their DB connection
+            connection.close()
+
+    max_workers = getattr(settings, 'SLACK_NOTIFY_MAX_WORKERS', 4)
+    with ThreadPoolExecutor(max_workers=max_workers) as pool:
+        results = list(pool.map(with_current_context(notify_one), leaves))
+
+    lines = [
+        f"• <@{leave.employee.username}> {leave.get_leave_type_display()} ({leave.start_date} to {leave.end_date})"
+        for leave in leaves
+    ]
+    failed = results.count(False)
+    slack_client.chat_postMessage(
+        channel=manager_id,
+        text=(
+            f"{emoji} *Bulk {status_text.title()}: {len(leaves)} request(s)*\n\n"
+            + "\n".join(lines)
+            + (f"\n\n⚠️ {failed} notification(s) could not be delivered" if failed else "")
+        )
+    )
@@ -0,0 +1,188 @@
+from django.db import connection
+from django.utils import timezone
+from datetime import timedelta
+import tempfile
+import csv
+import os
+import logging
+
+from .slack_utils import slack_client
+from .background import run_in_background
+from .working_days import working_days_array
+
+logger = logging.getLogger(__name__)
+
+# Rows fetched per round trip - the export never holds more than one chunk
+EXPORT_CHUNK_SIZE = 2000
+
+EXPORT_FIELDS = (
+    'id', 'employee__username', 'employee__userrole__department__name', 'leave_type',
+    'status', 'start_date', 'end_date', 'updated_at'
+)
+NO_DEPARTMENT = 'No Department'
+CSV_HEADER = ['Leave ID', 'Employee', 'Department', 'Leave Type', 'Status', 'Start Date', 'End Date', 'Working Days']
+
+LEAVE_TYPE_NAMES = {
+    'CASUAL': 'Casual Leave',
+    'SICK': 'Sick Leave',
+    'MATERNITY': 'Maternity Leave',
+    'PATERNITY': 'Paternity Leave',
+}
+
+
+def iter_export_rows(leaves, chunk_size=EXPORT_CHUNK_SIZE):
+    """
+    Yield chunks of export rows (tuples in EXPORT_FIELDS order + working days)
+
+    Uses values_list().iterator() so model instances are never built and the
+    queryset is never cached; working days are computed per chunk in one
+    vectorized call.
+    """
+    chunk = []
+    for row in leaves.values_list(*EXPORT_FIELDS).iterator(chunk_size=chunk_size):
+        chunk.append(row)
+        if len(chunk) >= chunk_size:
+            yield _with_working_days(chunk)
+            chunk = []
+    if chunk:
+        yield _with_working_days(chunk)
+
+
+def _with_working_days(chunk):
+    days = working_days_array([row[5] for row in chunk], [row[6] for row in chunk])
+    return [row + (int(count),) for row, count in zip(chunk, days)]
+
+
+def csv_rows(chunk):
+    return [
+        (leave_id, username, department or NO_DEPARTMENT, leave_type, status,
+         start_date.isoformat(), end_date.isoformat(), days)
+        for leave_id, username, department, leave_type, status, start_date, end_date, updated_at, days in chunk
+    ]
+
+
+def _ics_escape(text):
+    return (text or '').replace('\\', '\\\\').replace(';', '\\;').replace(',', '\\,').replace('\n', '\\n')
+
+
+def _ics_fold(line):
+    """Fold a content line at 75 octets (RFC 5545 3.1)"""
+    encoded = line.encode('utf-8')
+    if len(encoded) <= 75:
+        return line + '\r\n'
+    parts = []
+    while encoded:
+        limit = 75 if not parts else 74
+        cut = min(limit, len(encoded))
+        while cut < len(encoded) and (encoded[cut] & 0xC0) == 0x80:
+            cut -= 1  # Never split a UTF-8 sequence
+        parts.append(encoded[:cut].decode('utf-8'))
+        encoded = encoded[cut:]
+    return '\r\n '.join(parts) + '\r\n'
+
+
+def ics_header(calendar_name='Team Leave Calendar'):
+    return ''.join(_ics_fold(line) for line in [
+        'BEGIN:VCALENDAR',
+        'VERSION:2.0',
+        'PRODID:-//Leave Application//Team Calendar//EN',
+        'CALSCALE:GREGORIAN',
+        f'X-WR-CALNAME:{_ics_escape(calendar_name)}',
+    ])
+
+
+def ics_events(chunk):
+    """One all-day VEVENT per leave row (DTEND is exclusive)"""
+    stamp = timezone.now().strftime('%Y%m%dT%H%M%SZ')
+    lines = []
+    for leave_id, username, department, leave_type, status, start_date, end_date, updated_at, days in chunk:
+        summary = f"{username} - {LEAVE_TYPE_NAMES.get(leave_type, leave_type)} ({status.replace('_', ' ').title()})"
+        lines += [
+            'BEGIN:VEVENT',
+            f'UID:leave-{leave_id}@leave-app',
+            f"DTSTAMP:{updated_at.strftime('%Y%m%dT%H%M%SZ') if updated_at else stamp}",
+            f"DTSTART;VALUE=DATE:{start_date.strftime('%Y%m%d')}",
+            f"DTEND;VALUE=DATE:{(end_date + timedelta(days=1)).strftime('%Y%m%d')}",
+            f'SUMMARY:{_ics_escape(summary)}',
+            f"DESCRIPTION:{_ics_escape(f'{department or NO_DEPARTMENT} - {days} working day(s)')}",
+            'TRANSP:TRANSPARENT',
+            'END:VEVENT',
+        ]
+    return ''.join(_ics_fold(line) for line in lines)
+
+
+def ics_footer():
+    return _ics_fold('END:VCALENDAR')
+
+
+def iter_ics(chunks, calendar_name='Team Leave Calendar'):
+    """Yield an iCalendar document piece by piece"""
+    yield ics_header(calendar_name)
+    for chunk in chunks:
+        yield ics_events(chunk)
+    yield ics_footer()
+
+
+def export_team_calendar(leaves, user_id, label):
+    """
+    Stream a filtered calendar queryset to CSV and ICS files and upload both to the user's DM
+
+    Files are written to temporary files chunk by chunk, so memory use does
+    not grow with the number of leaves.
+    """
+    paths = []
+    try:
+        base = f"team-calendar-{timezone.now().strftime('%Y%m%d-%H%M%S')}"
+        # One pass over the queryset feeds both files
+        rows = 0
+        with tempfile.NamedTemporaryFile('w', suffix='.csv', newline='', encoding='utf-8', delete=False) as csv_fh, \
+                tempfile.NamedTemporaryFile('w', suffix='.ics', newline='', encoding='utf-8', delete=False) as ics_fh:
+            paths += [csv_fh.name, ics_fh.name]
+            writer = csv.writer(csv_fh)
+            writer.writerow(CSV_HEADER)
+            ics_fh.write(ics_header(label))
+            for chunk in iter_export_rows(leaves):
+                writer.writerows(csv_rows(chunk))
+                ics_fh.write(ics_events(chunk))
+                rows += len(chunk)
+            ics_fh.write(ics_footer())
+
+        channel = slack_client.conversations_open(users=[user_id])['channel']['id']
+        slack_client.files_upload_v2(
+            channel=channel,
+            initial_comment=f"📤 *Team calendar export* - {label}\n{rows} leave(s) as CSV and iCalendar",
+            file_uploads=[
+                {'file': paths[0], 'filename': f'{base}.csv', 'title': f'{label} (CSV)'},
+                {'file': paths[1], 'filename': f'{base}.ics', 'title': f'{label} (iCalendar)'},
+            ]
+        )
+        logger.info(f"Exported {rows} leave(s) for {user_id}")
+        return rows
+    except Exception as e:
+        logger.error(f"Error exporting team calendar for {user_id}: {e}")
+        try:
+            slack_client.chat_postMessage(channel=user_id, text=f"⚠️ Error exporting team calendar: {str(e)}")
+        except Exception as slack_error:
+            logger.error(f"Failed to send export error message: {slack_error}")
+    finally:
+        for path in paths:
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+        connection.close()
+
+
+def start_export(leaves, user_id, label):
+    """Run export_team_calendar in a background thread"""
+    return run_in_background(export_team_calendar, leaves, user_id, label)
+
+
+def export_notice_block():
+    return {
+        "type": "context",
+        "elements": [{
+            "type": "mrkdwn",
+            "text": "📤 Full export requested - CSV and iCalendar files will arrive in your DM shortly."
+        }]
+    }
@@ -0,0 +1,122 @@
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Count, Max, Sum
+from django.http import Http404, HttpResponse
+from django.urls import reverse
+from django.utils import timezone
+from django.utils.crypto import constant_time_compare, salted_hmac
+from django.views.decorators.http import condition, require_GET
+from datetime import timedelta
+import hashlib
+import logging
+
+from .calendar_export import iter_export_rows, ics_header, ics_events, ics_footer
+from .occupancy import ACTIVE_STATUSES
+
+logger = logging.getLogger(__name__)
+
+FEED_SCOPES = ('department', 'team')
+
+
+def feed_token(scope, scope_id):
+    """Per-feed subscription token (HMAC of the scope with SECRET_KEY)"""
+    return salted_hmac('leave.calendar_feed', f'{scope}:{scope_id}').hexdigest()[:32]
+
+
+def feed_url(scope, scope_id):
+    """Relative subscription URL for a department/team feed, token included"""
+    return f"{reverse(f'{scope}_calendar_feed', args=[scope_id])}?token={feed_token(scope, scope_id)}"
+
+
+def _scope_name(scope, scope_id):
+    from .models import Department, Team
+    model = Department if scope == 'department' else Team
+    name = model.objects.filter(id=scope_id).values_list('name', flat=True).first()
+    if name is None:
+        raise Http404(f"Unknown {scope}")
+    return name
+
+
+def _scope_leaves(scope, scope_id):
+    """All leaves of the scope's members inside the feed window (any status)"""
+    from .models import LeaveRequest, Team
+    since = timezone.now().date() - timedelta(days=getattr(settings, 'LEAVE_CALENDAR_FEED_PAST_DAYS', 90))
+    leaves = LeaveRequest.objects.filter(end_date__gte=since)
+    if scope == 'department':
+        return leaves.filter(employee__userrole__department_id=scope_id)
+    member_ids = Team.members.through.objects.filter(team_id=scope_id).values('user_id')
+    admin_ids = Team.admins.through.objects.filter(team_id=scope_id).values('user_id')
+    return leaves.filter(employee_id__in=member_ids) | leaves.filter(employee_id__in=admin_ids)
+
+
+def _feed_version(request, scope, scope_id):
+    """
+    (etag, last_modified) for a feed, computed once per request
+
+    Max updated_at catches edits and status changes (including leaves
+    dropping out as cancelled/rejected); count and id sum catch deletions
+    and membership changes, which do not touch updated_at.
+    """
+    cached = getattr(request, '_leave_feed_version', None)
+    if cached is not None:
+        return cached
+    if scope not in FEED_SCOPES:
+        raise Http404("Unknown feed")
+    if not constant_time_compare(request.GET.get('token', ''), feed_token(scope, scope_id)):
+        raise Http404("Unknown feed")
+
+    version = _scope_leaves(scope, scope_id).aggregate(last=Max('updated_at'), rows=Count('id'), ids=Sum('id'))
+    since = timezone.now().date() - timedelta(days=getattr(settings, 'LEAVE_CALENDAR_FEED_PAST_DAYS', 90))
+    raw = f"{scope}:{scope_id}:{since}:{version['last']}:{version['rows']}:{version['ids']}"
+    request._leave_feed_version = (hashlib.md5(raw.encode()).hexdigest(), version['last'])
+    return request._leave_feed_version
+
+
+def _feed_etag(request, scope, scope_id):
+    return _feed_version(request, scope, scope_id)[0]
+
+
+def _feed_last_modified(request, scope, scope_id):
+    return _feed_version(request, scope, scope_id)[1]
+
+
+def render_feed(scope, scope_id):
+    """ICS text for the approved/pending leaves of a department or team"""
+    name = _scope_name(scope, scope_id)
+    leaves = _scope_leaves(scope, scope_id).filter(status__in=ACTIVE_STATUSES).order_by('start_date', 'id')
+    parts = [ics_header(f"{name} - Leave Calendar")]
+    parts += [ics_events(chunk) for chunk in iter_export_rows(leaves)]
+    parts.append(ics_footer())
+    return ''.join(parts)
+
+
+@require_GET
+@condition(etag_func=_feed_etag, last_modified_func=_feed_last_modified)
+def calendar_feed(request, scope, scope_id):
+    """
+    Subscribable iCalendar feed for a department or team
+
+    Unchanged feeds answer 304 from one aggregate query; changed ones are
+    rendered once per version and served from the cache until a leave in
+    the scope changes again.
+    """
+    etag = _feed_etag(request, scope, scope_id)
+    cache_key = f'leave_feed:{scope}:{scope_id}:{etag}'
+    body = cache.get(cache_key)
+    if body is None:
+        body = render_feed(scope, scope_id)
+        cache.set(cache_key, body, getattr(settings, 'LEAVE_CALENDAR_FEED_CACHE_TTL', 86400))
+        logger.info(f"Rendered {scope} {scope_id} calendar feed ({len(body)} bytes)")
+
+    response = HttpResponse(body, content_type='text/calendar; charset=utf-8')
+    response['Content-Disposition'] = f'inline; filename="{scope}-{scope_id}.ics"'
+    response['Cache-Control'] = 'private, no-cache'
+    return response
+
+
+def department_calendar_feed(request, department_id):
+    return calendar_feed(request, 'department', department_id)
+
+
+def team_calendar_feed(request, team_id):
+    return calendar_feed(request, 'team', team_id)
@@ -0,0 +1,112 @@
+from django.contrib.auth.models import User
+from django.db.models import Case, DurationField, ExpressionWrapper, F, IntegerField, Q, Subquery, Value, When
+from datetime import datetime
+
+# Calendar status filter -> stored statuses
+STATUS_GROUPS = {
+    'PENDING': ['PENDING', 'PENDING_DOCS', 'DOCS_SUBMITTED', 'DOCS_PENDING_LATER'],
+    'APPROVED': ['APPROVED', 'APPROVED_UNPAID', 'APPROVED_COMPENSATORY'],
+    'REJECTED': ['REJECTED'],
+}
+LEAVE_TYPE_FILTERS = {'CASUAL', 'SICK', 'MATERNITY', 'PATERNITY'}
+
+SORT_ORDERS = {
+    'DATE_ASC': ('start_date', 'employee__username'),
+    'DATE_DESC': ('-start_date', 'employee__username'),
+    'EMPLOYEE_ASC': ('employee__username', 'start_date'),
+    'EMPLOYEE_DESC': ('-employee__username', 'start_date'),
+    'TYPE': ('leave_type', 'start_date'),
+}
+
+
+def _as_date(value):
+    return datetime.strptime(value, '%Y-%m-%d').date() if isinstance(value, str) else value
+
+
+def department_subquery(department_filter):
+    """First department whose name contains the filter, as a single-value subquery"""
+    from .models import Department
+    return Subquery(Department.objects.filter(name__icontains=department_filter).order_by('id').values('id')[:1])
+
+
+def team_user_subqueries(team_filter):
+    """Member and admin user ids of the first team whose name contains the filter"""
+    from .models import Team
+    team_id = Subquery(Team.objects.filter(name__icontains=team_filter).order_by('id').values('id')[:1])
+    members = Team.members.through.objects.filter(team_id=team_id).values('user_id')
+    admins = Team.admins.through.objects.filter(team_id=team_id).values('user_id')
+    return members, admins
+
+
+def compile_calendar_query(query_params):
+    """
+    Turn team calendar query_params into one queryset plus its scope
+
+    Department and team names are resolved inside the query as subqueries
+    instead of separate lookups, and employee/role/department are joined
+    with select_related, so rendering the result needs no per-row queries.
+
+    The filter modal passes already-expanded lists for 'status' and
+    'leave_type' (stored values; an empty leave type list means all types)
+    and a 'department_id' instead of a department name.
+
+    Returns (leaves, scope). scope has 'department' (a subquery for the
+    resolved department id, or None) and 'team_user_ids' (a user id
+    queryset, or None) for occupancy lookups and heatmap headcounts.
+    """
+    from .models import LeaveRequest
+
+    start_date = _as_date(query_params.get('start_date'))
+    end_date = _as_date(query_params.get('end_date'))
+    query = LeaveRequest.objects.filter(start_date__lte=end_date, end_date__gte=start_date)
+    scope = {'department': None, 'team_user_ids': None}
+
+    leave_type = query_params.get('leave_type', 'ALL')
+    if isinstance(leave_type, (list, tuple)):
+        if leave_type:
+            query = query.filter(leave_type__in=leave_type)
+    elif leave_type in LEAVE_TYPE_FILTERS:
+        query = query.filter(leave_type=leave_type)
+
+    status = query_params.get('status', 'ALL')
+    if isinstance(status, (list, tuple)):
+        query = query.filter(status__in=status)
+    elif status != 'ALL':
+        query = query.filter(status__in=STATUS_GROUPS.get(status, [status]))
+
+    department_id = query_params.get('department_id')
+    department_filter = query_params.get('department_filter')
+    if department_id:
+        scope['department'] = department_id
+        query = query.filter(employee__userrole__department_id=department_id)
+    elif department_filter and department_filter != 'ALL':
+        scope['department'] = department_subquery(department_filter)
+        query = query.filter(employee__userrole__department_id=scope['department'])
+
+    employee_filter = query_params.get('employee_filter')
+    if employee_filter:
+        query = query.filter(employee__username__icontains=employee_filter)
+
+    team_filter = query_params.get('team_filter')
+    if team_filter:
+        members, admins = team_user_subqueries(team_filter)
+        query = query.filter(Q(employee_id__in=members) | Q(employee_id__in=admins))
+        scope['team_user_ids'] = User.objects.filter(Q(id__in=members) | Q(id__in=admins)).values('id')
+
+    query = query.select_related('employee__userrole__department')
+
+    sort_option = query_params.get('sort_option', 'DATE_ASC')
+    if sort_option == 'STATUS_PENDING':
+        # Put pending statuses first
+        return query.annotate(status_priority=Case(
+            When(status__startswith='PENDING', then=Value(1)),
+            When(status__startswith='DOCS', then=Value(2)),
+            When(status__startswith='APPROVED', then=Value(3)),
+            default=Value(4),
+            output_field=IntegerField()
+        )).order_by('status_priority', 'start_date'), scope
+    if sort_option == 'DURATION_DESC':
+        return query.annotate(
+            duration=ExpressionWrapper(F('end_date') - F('start_date'), output_field=DurationField())
+        ).order_by('-duration', 'start_date'), scope
+    return query.order_by(*SORT_ORDERS.get(sort_option, SORT_ORDERS['DATE_ASC'])), scope
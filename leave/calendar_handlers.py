@@ -1,6 +1,7 @@
 # from django.http import JsonResponse
 # from .slack_utils import slack_client, get_or_create_user, is_manager, is_in_manager_channel
 # from .models import Department
+from .working_days import total_working_days, leave_working_days
 # from datetime import datetime, timedelta
 # from slack_sdk.errors import SlackApiError
 # import threading
@@ -221,16 +222,19 @@
 
 
 
-from django.http import JsonResponse
-from .slack_utils import slack_client, get_or_create_user, is_manager, is_in_manager_channel
-from .models import Department
+from .json_codec import JsonResponse
+from .slack_utils import slack_client, get_or_create_user, is_manager, is_in_manager_channel, post_blocks_in_chunks
+from .models import Department, LeaveRequest
+from .query_budget import query_budget
 from datetime import datetime, timedelta
 from slack_sdk.errors import SlackApiError
-import threading
+import itertools
+from .background import run_in_background
 import logging
 
 logger = logging.getLogger(__name__)
 
+@query_budget(2)
 def handle_team_calendar(request):
     """Handle team calendar display - supports both AI text and traditional form"""
     try:
@@ -242,6 +246,7 @@ def handle_team_calendar(request):
         if text:
             logger.info(f"AI_TEAM_CALENDAR: Processing AI request for user {user_id}: '{text}'")
             
+            @query_budget(15)
             def process_ai_calendar_request():
                 """Background function to process AI calendar request"""
                 try:
@@ -292,12 +297,13 @@ def handle_team_calendar(request):
                             }
                         }
                         
-                        blocks = [ai_header] + result.get('blocks', [])
+                        blocks = itertools.chain([ai_header], result.get('blocks', []))
                         
                         # FIXED: Send to user's DM instead of a channel that might not exist
-                        slack_client.chat_postMessage(
-                            channel=user_id,
-                            blocks=blocks,
+                        # (pages of up to 50 blocks; extra pages go in the thread)
+                        post_blocks_in_chunks(
+                            user_id,
+                            blocks,
                             text=f"🤖 AI Calendar Results: {ai_response.get('query_description', text)}"
                         )
                     else:
@@ -314,14 +320,13 @@ def handle_team_calendar(request):
                     )
             
             # Start background processing
-            thread = threading.Thread(target=process_ai_calendar_request)
-            thread.daemon = True
-            thread.start()
+            run_in_background(process_ai_calendar_request)
             
             return JsonResponse({'text': '🤖 Processing your calendar request with AI...'})
         
         # TRADITIONAL FORM PATH - IMMEDIATE MODAL OPENING (CRITICAL FIX)
         else:
+            @query_budget(5)
             def open_calendar_modal_background():
                 """Background function to open calendar modal"""
                 try:
@@ -488,7 +493,10 @@ def handle_team_calendar(request):
                                 {"text": {"type": "plain_text", "text": "Show employee details"}, "value": "SHOW_DETAILS"},
                                 {"text": {"type": "plain_text", "text": "Show leave reasons"}, "value": "SHOW_REASONS"},
                                 {"text": {"type": "plain_text", "text": "Show conflict analysis"}, "value": "SHOW_CONFLICTS"},
-                                {"text": {"type": "plain_text", "text": "Group by department"}, "value": "GROUP_DEPT"}
+                                {"text": {"type": "plain_text", "text": "Group by department"}, "value": "GROUP_DEPT"},
+                                {"text": {"type": "plain_text", "text": "Coverage heatmap"}, "value": "HEATMAP"},
+                                {"text": {"type": "plain_text", "text": "Export all results (CSV + iCal)"}, "value": "EXPORT"},
+                                {"text": {"type": "plain_text", "text": "Send all results (threaded pages)"}, "value": "STREAM"}
                             ]
                         },
                         "label": {"type": "plain_text", "text": "⚙️ Display Options (Optional)"}
@@ -551,9 +559,7 @@ def handle_team_calendar(request):
                         pass
 
         # Start background thread for modal opening
-        thread = threading.Thread(target=open_calendar_modal_background)
-        thread.daemon = True
-        thread.start()
+        run_in_background(open_calendar_modal_background)
 
         # Return immediate response (prevents timeout)
         return JsonResponse({'text': '⏳ Opening team calendar form...'})
@@ -561,120 +567,84 @@ def handle_team_calendar(request):
         logger.error(f"Error in handle_team_calendar: {e}")
         return JsonResponse({'text': 'Error processing team calendar request'}, status=200)
 
+# Calendar rows are read with values_list into these slotted records rather than
+# as LeaveRequest instances (each with a __dict__, _state and the select_related
+# employee, role and department objects) - a year of leaves for a large org
+# otherwise holds every model instance in memory while the blocks are built.
+_LEAVE_TYPE_LABELS = dict(LeaveRequest.LEAVE_TYPES)
+_CALENDAR_COLUMNS = (
+    'employee__username', 'employee__userrole__department__name',
+    'id', 'employee_id', 'leave_type', 'status', 'start_date', 'end_date',
+)
+
+class CalendarLeave:
+    """The columns of a leave the calendar renders (reason only with SHOW_REASONS)"""
+    __slots__ = ('id', 'employee_id', 'leave_type', 'status', 'start_date', 'end_date', 'reason')
+
+    def __init__(self, id, employee_id, leave_type, status, start_date, end_date, reason=None):
+        self.id = id
+        self.employee_id = employee_id
+        self.leave_type = leave_type
+        self.status = status
+        self.start_date = start_date
+        self.end_date = end_date
+        self.reason = reason
+
+    def get_leave_type_display(self):
+        return _LEAVE_TYPE_LABELS.get(self.leave_type, self.leave_type)
+
+class EmployeeLeaves:
+    """One employee's leaves in a calendar result"""
+    __slots__ = ('username', 'department', 'leaves')
+
+    def __init__(self, username, department, leaves=None):
+        self.username = username
+        self.department = department
+        self.leaves = leaves if leaves is not None else []
+
+def iter_calendar_rows(leaves, display_options):
+    """(username, department name or None, CalendarLeave) for every leave in a queryset, in its order"""
+    columns = _CALENDAR_COLUMNS + (('reason',) if 'SHOW_REASONS' in display_options else ())
+    choices = {}  # One str object per distinct status/type instead of one per row
+    for username, dept_name, leave_id, employee_id, leave_type, status, *rest in (
+        leaves.values_list(*columns).iterator(chunk_size=2000)
+    ):
+        yield username, dept_name, CalendarLeave(
+            leave_id, employee_id, choices.setdefault(leave_type, leave_type),
+            choices.setdefault(status, status), *rest
+        )
+
+@query_budget(10)
 def process_team_calendar_query(query_params):
     """Process team calendar query and return formatted results"""
     try:
-        from .models import LeaveRequest, UserRole, Department, Team
-        from .leave_utils import create_leave_block
+        from .calendar_filters import compile_calendar_query
         
         # Extract parameters
         start_date = query_params.get('start_date')
         end_date = query_params.get('end_date')
-        
-        # Build base query for date range
-        query = LeaveRequest.objects.filter(
-            start_date__lte=end_date,
-            end_date__gte=start_date
-        )
-        
-        # Apply leave type filter
         leave_type = query_params.get('leave_type', 'ALL')
-        if leave_type != 'ALL':
-            if leave_type == 'CASUAL':
-                query = query.filter(leave_type='CASUAL')
-            elif leave_type == 'SICK':
-                query = query.filter(leave_type='SICK')
-            elif leave_type == 'MATERNITY':
-                query = query.filter(leave_type='MATERNITY')
-            elif leave_type == 'PATERNITY':
-                query = query.filter(leave_type='PATERNITY')
-        
-        # Apply status filter - FIXED to handle all status variations
         status = query_params.get('status', 'ALL')
-        if status != 'ALL':
-            if status == 'PENDING':
-                query = query.filter(status__in=['PENDING', 'PENDING_DOCS', 'DOCS_SUBMITTED', 'DOCS_PENDING_LATER'])
-            elif status == 'APPROVED':
-                query = query.filter(status__in=['APPROVED', 'APPROVED_UNPAID', 'APPROVED_COMPENSATORY'])
-            elif status == 'REJECTED':
-                query = query.filter(status='REJECTED')
-            else:
-                query = query.filter(status=status)
-        
-        # Apply department filter - FIXED to handle department name properly
         department_filter = query_params.get('department_filter')
-        if department_filter and department_filter != 'ALL':
-            try:
-                # Try to find department by name (case-insensitive)
-                dept = Department.objects.filter(name__icontains=department_filter).first()
-                if dept:
-                    query = query.filter(employee__userrole__department=dept)
-                else:
-                    # If no department found, try exact match
-                    query = query.filter(employee__userrole__department__name__iexact=department_filter)
-            except Department.DoesNotExist:
-                # If department doesn't exist, return empty result
-                query = query.none()
-        
-        # Apply employee filter - NEWLY ADDED
         employee_filter = query_params.get('employee_filter')
-        if employee_filter:
-            # Filter by employee name (partial match)
-            query = query.filter(employee__username__icontains=employee_filter)
-        
-        # Apply team filter - FIXED to use correct relationship
         team_filter = query_params.get('team_filter')
-        if team_filter:
-            try:
-                # Find team by name (case-insensitive)
-                team = Team.objects.filter(name__icontains=team_filter).first()
-                if team:
-                    # Filter by users who are members OR admins of this team
-                    team_user_ids = list(team.members.values_list('id', flat=True)) + list(team.admins.values_list('id', flat=True))
-                    query = query.filter(employee_id__in=team_user_ids)
-                else:
-                    # If no team found, return empty result
-                    query = query.none()
-            except Team.DoesNotExist:
-                # If team doesn't exist, return empty result
-                query = query.none()
         
-        # Apply sorting
-        sort_option = query_params.get('sort_option', 'DATE_ASC')
-        if sort_option == 'DATE_ASC':
-            leaves = query.order_by('start_date', 'employee__username')
-        elif sort_option == 'DATE_DESC':
-            leaves = query.order_by('-start_date', 'employee__username')
-        elif sort_option == 'EMPLOYEE_ASC':
-            leaves = query.order_by('employee__username', 'start_date')
-        elif sort_option == 'EMPLOYEE_DESC':
-            leaves = query.order_by('-employee__username', 'start_date')
-        elif sort_option == 'TYPE':
-            leaves = query.order_by('leave_type', 'start_date')
-        elif sort_option == 'STATUS_PENDING':
-            # Put pending statuses first
-            leaves = query.extra(
-                select={
-                    'status_priority': """
-                        CASE 
-                            WHEN status LIKE 'PENDING%' THEN 1 
-                            WHEN status LIKE 'DOCS%' THEN 2 
-                            WHEN status LIKE 'APPROVED%' THEN 3
-                            ELSE 4 
-                        END
-                    """
-                }
-            ).order_by('status_priority', 'start_date')
-        elif sort_option == 'DURATION_DESC':
-            leaves = query.extra(
-                select={'duration': '(end_date - start_date + 1)'}
-            ).order_by('-duration', 'start_date')
-        else:
-            leaves = query.order_by('start_date', 'employee__username')
+        # All filters compiled into one queryset (name lookups are subqueries)
+        leaves, scope = compile_calendar_query(query_params)
+        
+        # Nobody approved/pending in scope for the period - skip the overlap scan
+        # (team filter also counts admins, which DailyOccupancy does not track)
+        if status in ('APPROVED', 'PENDING') and not team_filter:
+            from .occupancy import has_occupancy
+            occupancy_scope = {'department': scope['department']} if scope['department'] is not None else {}
+            bucket = 'approved_count' if status == 'APPROVED' else 'pending_count'
+            if not has_occupancy(start_date, end_date, bucket=bucket, **occupancy_scope):
+                leaves = leaves.none()
         
         # Build response blocks
         blocks = []
         display_options = query_params.get('display_options', ['SHOW_DETAILS'])
+        streamed_blocks = None  # Lazy employee blocks for chunked delivery (STREAM)
         
         if not leaves.exists():
             # No results found
@@ -697,25 +667,33 @@ def process_team_calendar_query(query_params):
                     "text": no_results_text
                 }
             })
+        elif 'HEATMAP' in display_options:
+            # Coverage heatmap instead of the per-leave list (no block limit on headcount)
+            from .coverage_heatmap import calendar_heatmap_blocks
+            heatmap_start = datetime.strptime(start_date, '%Y-%m-%d').date() if isinstance(start_date, str) else start_date
+            heatmap_end = datetime.strptime(end_date, '%Y-%m-%d').date() if isinstance(end_date, str) else end_date
+            blocks.extend(calendar_heatmap_blocks(
+                leaves, heatmap_start, heatmap_end,
+                department_id=scope['department'],
+                user_ids=scope['team_user_ids'],
+                leave_employees_only=bool(employee_filter)
+            ))
+        elif 'STREAM' in display_options:
+            # Every employee, rendered lazily - the sender splits it into threaded pages
+            stream_at = len(blocks)
+            streamed_blocks = iter_employee_leave_blocks(leaves, display_options)
         else:
             # FIXED: Implement pagination to respect Slack's 50-block limit
             MAX_BLOCKS = 45  # Leave room for header and summary blocks
             
             # Group leaves by employee for cleaner display
+            # (only the rendered columns, department name joined in - no query per employee)
             employee_groups = {}
-            for leave in leaves:
-                employee_key = leave.employee.username
-                if employee_key not in employee_groups:
-                    employee_groups[employee_key] = {
-                        'employee': leave.employee,
-                        'leaves': [],
-                        'department': None
-                    }
-                    # Get department info
-                    user_role = UserRole.objects.filter(user=leave.employee).first()
-                    employee_groups[employee_key]['department'] = user_role.department.name if user_role and user_role.department else 'No Department'
-                
-                employee_groups[employee_key]['leaves'].append(leave)
+            for username, dept_name, leave in iter_calendar_rows(leaves, display_options):
+                group = employee_groups.get(username)
+                if group is None:
+                    group = employee_groups[username] = EmployeeLeaves(username, dept_name or 'No Department')
+                group.leaves.append(leave)
             
             # Calculate how many entries we can show
             total_employees = len(employee_groups)
@@ -727,7 +705,7 @@ def process_team_calendar_query(query_params):
                 # Group by department first, then by employee
                 dept_groups = {}
                 for emp_key, emp_data in employee_groups.items():
-                    dept_name = emp_data['department']
+                    dept_name = emp_data.department
                     if dept_name not in dept_groups:
                         dept_groups[dept_name] = {}
                     dept_groups[dept_name][emp_key] = emp_data
@@ -740,7 +718,7 @@ def process_team_calendar_query(query_params):
                         "type": "section",
                         "text": {
                             "type": "mrkdwn",
-                            "text": f"🏢 *{dept_name}* ({sum(len(emp['leaves']) for emp in dept_employees.values())} leaves)"
+                            "text": f"🏢 *{dept_name}* ({sum(len(emp.leaves) for emp in dept_employees.values())} leaves)"
                         }
                     }
                     blocks.append(dept_header)
@@ -783,19 +761,32 @@ def process_team_calendar_query(query_params):
                     "type": "section",
                     "text": {
                         "type": "mrkdwn",
-                        "text": f"📄 *Showing {employees_shown} of {total_employees} employees ({remaining} more not shown)*\n💡 Use more specific filters to see all results."
+                        "text": f"📄 *Showing {employees_shown} of {total_employees} employees ({remaining} more not shown)*\n💡 Use more specific filters, the Export option or threaded pages to see all results."
                     }
                 }
                 blocks.append(pagination_block)
         
-        # Add comprehensive summary (always include this)
-        total_leaves = leaves.count()
-        total_days = sum((leave.end_date - leave.start_date).days + 1 for leave in leaves)
+        # Full result set as CSV/ICS files in the requester's DM
+        if 'EXPORT' in display_options and query_params.get('user_id') and leaves.exists():
+            from .calendar_export import start_export, export_notice_block
+            start_export(leaves, query_params['user_id'], f"{start_date} to {end_date}")
+            blocks.append(export_notice_block())
+        
+        # Add comprehensive summary (always include this) - all counts in one aggregate
+        from django.db.models import Count, Q
+        counts = leaves.order_by().aggregate(
+            total=Count('id'),
+            pending=Count('id', filter=Q(status__in=['PENDING', 'PENDING_DOCS', 'DOCS_SUBMITTED'])),
+            approved=Count('id', filter=Q(status__in=['APPROVED', 'APPROVED_UNPAID', 'APPROVED_COMPENSATORY'])),
+            rejected=Count('id', filter=Q(status='REJECTED'))
+        )
+        total_leaves = counts['total']
+        total_days = total_working_days(leaves)
         
         # Additional statistics
-        pending_count = leaves.filter(status__in=['PENDING', 'PENDING_DOCS', 'DOCS_SUBMITTED']).count()
-        approved_count = leaves.filter(status__in=['APPROVED', 'APPROVED_UNPAID', 'APPROVED_COMPENSATORY']).count()
-        rejected_count = leaves.filter(status='REJECTED').count()
+        pending_count = counts['pending']
+        approved_count = counts['approved']
+        rejected_count = counts['rejected']
         
         summary_text = f"📊 *Complete Summary:*\n"
         summary_text += f"• *Total Records:* {total_leaves} leaves\n"
@@ -803,7 +794,7 @@ def process_team_calendar_query(query_params):
         summary_text += f"• *Pending:* {pending_count} | *Approved:* {approved_count} | *Rejected:* {rejected_count}\n"
         
         if total_leaves > 50:
-            summary_text += f"\n💡 *Tip: Large dataset ({total_leaves} records). Use more specific filters to see all results.*"
+            summary_text += f"\n💡 *Tip: Large dataset ({total_leaves} records). Use more specific filters, the Export option or threaded pages to see all results.*"
         
         blocks.append({
             "type": "section",
@@ -813,13 +804,16 @@ def process_team_calendar_query(query_params):
             }
         })
         
+        if streamed_blocks is not None:
+            blocks = itertools.chain(blocks[:stream_at], streamed_blocks, blocks[stream_at:])
+        
         return {
             'success': True,
             'blocks': blocks,
-            'count': leaves.count() if leaves.exists() else 0,
+            'count': total_leaves,
             'summary': {
-                'total_leaves': leaves.count() if leaves.exists() else 0,
-                'total_days': sum((leave.end_date - leave.start_date).days + 1 for leave in leaves) if leaves.exists() else 0,
+                'total_leaves': total_leaves,
+                'total_days': total_days,
                 'filters_applied': {
                     'department': department_filter,
                     'leave_type': leave_type,
@@ -845,16 +839,15 @@ def process_team_calendar_query(query_params):
         }
 
 def create_employee_leave_blocks_limited(emp_data, display_options, max_leaves=3):
-    """Create limited blocks for a single employee's leaves to respect Slack limits"""
-    employee = emp_data['employee']
-    leaves = emp_data['leaves']
-    department = emp_data['department']
+    """Create limited blocks for an EmployeeLeaves group to respect Slack limits (max_leaves=None shows all)"""
+    leaves = emp_data.leaves
+    department = emp_data.department
     
     blocks = []
     
     # Employee header with summary
     total_leaves = len(leaves)
-    total_days = sum((leave.end_date - leave.start_date).days + 1 for leave in leaves)
+    total_days = total_working_days(leaves)
     
     # Count by status for this employee
     pending_count = sum(1 for leave in leaves if leave.status in ['PENDING', 'PENDING_DOCS', 'DOCS_SUBMITTED'])
@@ -872,7 +865,7 @@ def create_employee_leave_blocks_limited(emp_data, display_options, max_leaves=3
     
     status_text = " | ".join(status_summary) if status_summary else "No leaves"
     
-    header_text = f"👤 *<@{employee.username}>*"
+    header_text = f"👤 *<@{emp_data.username}>*"
     if 'SHOW_DETAILS' in display_options:
         header_text += f" ({department})"
     header_text += f"\n📊 *Summary:* {total_leaves} leaves, {total_days} days total\n📈 *Status:* {status_text}"
@@ -897,7 +890,7 @@ def create_employee_leave_blocks_limited(emp_data, display_options, max_leaves=3
         blocks.append(leave_block)
     
     # Add info if there are more leaves
-    if len(sorted_leaves) > max_leaves:
+    if max_leaves is not None and len(sorted_leaves) > max_leaves:
         remaining = len(sorted_leaves) - max_leaves
         more_block = {
             "type": "section",
@@ -913,9 +906,78 @@ def create_employee_leave_blocks_limited(emp_data, display_options, max_leaves=3
     
     return blocks
 
+def iter_employee_leave_blocks(leaves, display_options):
+    """
+    Yield employee blocks for every leave in a queryset (chunked delivery, no block cap)
+
+    Rows are read in chunks ordered by (department,) employee so each
+    employee's blocks are yielded as soon as their rows have been read.
+    """
+    from django.db.models import Count, F
+    from itertools import groupby
+    from operator import itemgetter
+    
+    group_dept = 'GROUP_DEPT' in display_options
+    ordering = ['employee__username', 'start_date', 'id']
+    if group_dept:
+        ordering = ['employee__userrole__department__name'] + ordering
+        dept_counts = {
+            row['dept_name']: row['total']
+            for row in leaves.order_by().values(dept_name=F('employee__userrole__department__name')).annotate(total=Count('id'))
+        }
+    
+    current_dept = object()  # Sentinel - the first department name may be None
+    rows = iter_calendar_rows(leaves.order_by(*ordering), display_options)
+    for username, employee_rows in groupby(rows, key=itemgetter(0)):
+        employee_rows = list(employee_rows)
+        dept_name = employee_rows[0][1]
+        if group_dept and dept_name != current_dept:
+            current_dept = dept_name
+            yield {
+                "type": "section",
+                "text": {
+                    "type": "mrkdwn",
+                    "text": f"🏢 *{dept_name or 'No Department'}* ({dept_counts.get(dept_name, 0)} leaves)"
+                }
+            }
+        yield from create_employee_leave_blocks_limited(
+            EmployeeLeaves(username, dept_name or 'No Department', [leave for _, _, leave in employee_rows]),
+            display_options,
+            max_leaves=None
+        )
+
+def iter_leave_blocks(leaves, display_options):
+    """Yield a create_leave_block for every leave in a queryset, with department headers for GROUP_DEPT"""
+    from django.db.models import Count, F
+    from .leave_utils import create_leave_block
+    
+    rows = leaves.select_related('employee')
+    if 'GROUP_DEPT' not in display_options:
+        for leave in rows.iterator(chunk_size=500):
+            yield create_leave_block(leave, display_options)
+        return
+    
+    dept_counts = {
+        row['dept_name']: row['total']
+        for row in leaves.order_by().values(dept_name=F('employee__userrole__department__name')).annotate(total=Count('id'))
+    }
+    current_dept = object()  # Sentinel - the first department name may be None
+    ordering = ['employee__userrole__department__name'] + list(leaves.query.order_by)
+    for leave in rows.annotate(dept_name=F('employee__userrole__department__name')).order_by(*ordering).iterator(chunk_size=500):
+        if leave.dept_name != current_dept:
+            current_dept = leave.dept_name
+            yield {
+                "type": "section",
+                "text": {
+                    "type": "mrkdwn",
+                    "text": f"🏢 *{current_dept or 'No Department'}* ({dept_counts.get(current_dept, 0)} leaves)"
+                }
+            }
+        yield create_leave_block(leave, display_options)
+
 def create_individual_leave_block(leave, display_options, show_employee=True):
-    """Create a formatted block for a single leave entry"""
-    days = (leave.end_date - leave.start_date).days + 1
+    """Create a formatted block for a single leave entry (a CalendarLeave; show_employee needs a LeaveRequest)"""
+    days = leave_working_days(leave)
     
     # Status emoji mapping
     status_emoji_map = {
@@ -943,11 +1005,15 @@ def create_individual_leave_block(leave, display_options, show_employee=True):
         text += f"\n  💬 Reason: {reason_preview}"
     
     if 'SHOW_CONFLICTS' in display_options:
-        from .leave_utils import get_conflicts_details
-        # Check for conflicts with this leave
-        conflicts = get_conflicts_details(leave.start_date, leave.end_date, leave.employee)
-        if conflicts['approved_count'] > 0 or conflicts['pending_count'] > 0:
-            text += f"\n  ⚠️ Conflicts with {conflicts['approved_count'] + conflicts['pending_count']} other leave(s)"
+        from .leave_index import leave_index
+        # Check for conflicts with this leave (interval index, no query)
+        conflicts = leave_index.overlapping(
+            leave.start_date, leave.end_date,
+            statuses={'APPROVED', 'PENDING'},
+            exclude_employee_id=leave.employee_id
+        )
+        if conflicts:
+            text += f"\n  ⚠️ Conflicts with {len(conflicts)} other leave(s)"
     
     return {
         "type": "section",
@@ -957,36 +1023,25 @@ def create_individual_leave_block(leave, display_options, show_employee=True):
         }
     }
 
+@query_budget(2)
 def handle_team_calendar_filter_submission(payload):
     """Process team calendar filter form submission and generate customized calendar"""
     try:
         # IMMEDIATE RESPONSE - Return success first to avoid timeout
+        @query_budget(10)
         def build_and_send_filtered_calendar():
             """Background function to build and send filtered calendar"""
             try:
-                from .models import LeaveRequest, UserRole
-                from .leave_utils import create_leave_block
+                from .calendar_filters import compile_calendar_query
+                from .leave_utils import create_leave_block, get_user_department_name
                 from .slack_utils import SLACK_MANAGER_CHANNEL
                 
                 # Extract form values
-                values = payload['view']['state']['values']
+                custom_start = payload.date('custom_start_date', 'start_date_select')
+                custom_end = payload.date('custom_end_date', 'end_date_select')
                 
-                # Check if custom dates are provided
-                custom_start = None
-                custom_end = None
-                
-                if ('custom_start_date' in values and values['custom_start_date']['start_date_select'].get('selected_date') and
-                    'custom_end_date' in values and values['custom_end_date']['end_date_select'].get('selected_date')):
+                if custom_start and custom_end:
                     # Use custom date range
-                    custom_start = datetime.strptime(
-                        values['custom_start_date']['start_date_select']['selected_date'],
-                        '%Y-%m-%d'
-                    ).date()
-                    custom_end = datetime.strptime(
-                        values['custom_end_date']['end_date_select']['selected_date'],
-                        '%Y-%m-%d'
-                    ).date()
-                    
                     # Ensure start date is not after end date
                     if custom_start > custom_end:
                         custom_start, custom_end = custom_end, custom_start
@@ -995,42 +1050,32 @@ def handle_team_calendar_filter_submission(payload):
                     end_of_month = custom_end
                     date_source = "custom"
                     
-                elif 'custom_start_date' in values and values['custom_start_date']['start_date_select'].get('selected_date'):
+                elif custom_start:
                     # Only start date provided - use start date to end of that month
-                    custom_start = datetime.strptime(
-                        values['custom_start_date']['start_date_select']['selected_date'],
-                        '%Y-%m-%d'
-                    ).date()
                     start_of_month = custom_start
                     end_of_month = (start_of_month.replace(day=1) + timedelta(days=32)).replace(day=1) - timedelta(days=1)
                     date_source = "start_only"
                     
-                elif 'custom_end_date' in values and values['custom_end_date']['end_date_select'].get('selected_date'):
+                elif custom_end:
                     # Only end date provided - use start of that month to end date
-                    custom_end = datetime.strptime(
-                        values['custom_end_date']['end_date_select']['selected_date'],
-                        '%Y-%m-%d'
-                    ).date()
                     start_of_month = custom_end.replace(day=1)
                     end_of_month = custom_end
                     date_source = "end_only"
                     
                 else:
                     # Use selected month from dropdown
-                    selected_month_value = values['calendar_month']['month_select']['selected_option']['value']
+                    selected_month_value = payload.required('calendar_month', 'month_select')
                     year, month = selected_month_value.split('-')
                     start_of_month = datetime(int(year), int(month), 1).date()
                     end_of_month = (start_of_month + timedelta(days=32)).replace(day=1) - timedelta(days=1)
                     date_source = "month"
                 
                 # Get department filter
-                dept_filter = values['department_filter']['department_select']['selected_option']['value']
+                dept_filter = payload.required('department_filter', 'department_select')
                 
                 # Get status filters
-                status_options = values['status_filter']['status_select']['selected_options']
                 status_filters = []
-                for option in status_options:
-                    status_value = option['value']
+                for status_value in payload.value('status_filter', 'status_select', []):
                     if status_value == 'PENDING':
                         status_filters.extend(['PENDING', 'PENDING_DOCS', 'DOCS_SUBMITTED'])
                     elif status_value == 'APPROVED':
@@ -1041,64 +1086,23 @@ def handle_team_calendar_filter_submission(payload):
                         status_filters.append(status_value)
                 
                 # Get leave type filters (optional)
-                leave_type_filters = []
-                if 'leave_type_filter' in values and values['leave_type_filter']['leave_type_select'].get('selected_options'):
-                    leave_type_options = values['leave_type_filter']['leave_type_select']['selected_options']
-                    leave_type_filters = [option['value'] for option in leave_type_options]
+                leave_type_filters = payload.value('leave_type_filter', 'leave_type_select', [])
                 
                 # Get display options (optional)
-                display_options = []
-                if 'display_options' in values and values['display_options']['display_select'].get('selected_options'):
-                    display_opts = values['display_options']['display_select']['selected_options']
-                    display_options = [option['value'] for option in display_opts]
+                display_options = payload.value('display_options', 'display_select', [])
                 
                 # Get sort option (optional)
-                sort_option = "DATE_ASC"  # Default
-                if 'sort_option' in values and values['sort_option']['sort_select'].get('selected_option'):
-                    sort_option = values['sort_option']['sort_select']['selected_option']['value']
+                sort_option = payload.value('sort_option', 'sort_select', "DATE_ASC")
                 
-                # Build query
-                query = LeaveRequest.objects.filter(
-                    start_date__lte=end_of_month,
-                    end_date__gte=start_of_month,
-                    status__in=status_filters
-                )
-                
-                # Apply department filter
-                if dept_filter != 'ALL':
-                    query = query.filter(employee__userrole__department_id=dept_filter)
-                
-                # Apply leave type filter
-                if leave_type_filters:
-                    query = query.filter(leave_type__in=leave_type_filters)
-                
-                # Apply sorting
-                if sort_option == "DATE_ASC":
-                    leaves = query.order_by('start_date', 'employee__username')
-                elif sort_option == "DATE_DESC":
-                    leaves = query.order_by('-start_date', 'employee__username')
-                elif sort_option == "EMPLOYEE_ASC":
-                    leaves = query.order_by('employee__username', 'start_date')
-                elif sort_option == "EMPLOYEE_DESC":
-                    leaves = query.order_by('-employee__username', 'start_date')
-                elif sort_option == "TYPE":
-                    leaves = query.order_by('leave_type', 'start_date', 'employee__username')
-                elif sort_option == "STATUS_PENDING":
-                    # Custom sorting to put PENDING statuses first
-                    leaves = query.extra(
-                        select={
-                            'status_priority': "CASE WHEN status LIKE 'PENDING%' THEN 1 WHEN status LIKE 'DOCS%' THEN 2 ELSE 3 END"
-                        }
-                    ).order_by('status_priority', 'start_date', 'employee__username')
-                elif sort_option == "DURATION_DESC":
-                    # Sort by duration (longest first)
-                    leaves = query.extra(
-                        select={
-                            'duration': '(end_date - start_date + 1)'
-                        }
-                    ).order_by('-duration', 'start_date', 'employee__username')
-                else:
-                    leaves = query.order_by('start_date', 'employee__username')
+                # Same compiled query and sorts as /team-calendar (statuses are already expanded)
+                leaves, _ = compile_calendar_query({
+                    'start_date': start_of_month,
+                    'end_date': end_of_month,
+                    'status': status_filters,
+                    'leave_type': leave_type_filters,
+                    'department_id': dept_filter if dept_filter != 'ALL' else None,
+                    'sort_option': sort_option,
+                })
                 
                 # Build calendar blocks with dynamic header
                 if date_source == "custom":
@@ -1124,8 +1128,8 @@ def handle_team_calendar_filter_submission(payload):
                 
                 # Add filter summary
                 dept_name = "All Departments" if dept_filter == 'ALL' else Department.objects.get(id=dept_filter).name if dept_filter != 'ALL' else "All"
-                status_names = [opt['text']['text'] for opt in status_options]
-                leave_type_names = [opt['text']['text'] for opt in values.get('leave_type_filter', {}).get('leave_type_select', {}).get('selected_options', [])]
+                status_names = [opt['text']['text'] for opt in payload.options('status_filter', 'status_select')]
+                leave_type_names = [opt['text']['text'] for opt in payload.options('leave_type_filter', 'leave_type_select')]
                 
                 filter_text = f"🔍 *Applied Filters:*\n"
                 filter_text += f"• *Department:* {dept_name}\n"
@@ -1153,6 +1157,7 @@ def handle_team_calendar_filter_submission(payload):
                 })
                 blocks.append({"type": "divider"})
                 
+                streamed_blocks = None
                 if not leaves.exists():
                     blocks.append({
                         "type": "section",
@@ -1161,6 +1166,16 @@ def handle_team_calendar_filter_submission(payload):
                             "text": f"🔍 *No leaves found matching your filters*"
                         }
                     })
+                elif 'HEATMAP' in display_options:
+                    from .coverage_heatmap import calendar_heatmap_blocks
+                    blocks.extend(calendar_heatmap_blocks(
+                        leaves, start_of_month, end_of_month,
+                        department_id=dept_filter if dept_filter != 'ALL' else None
+                    ))
+                elif 'STREAM' in display_options:
+                    # Every leave, rendered lazily and sent as threaded pages below
+                    stream_at = len(blocks)
+                    streamed_blocks = iter_leave_blocks(leaves, display_options)
                 else:
                     # PAGINATION FOR FILTER RESULTS TOO
                     MAX_LEAVE_BLOCKS = 40  # Leave room for headers and summary
@@ -1169,8 +1184,7 @@ def handle_team_calendar_filter_submission(payload):
                         # Group leaves by department with limits
                         dept_groups = {}
                         for leave in leaves:
-                            user_role = UserRole.objects.filter(user=leave.employee).first()
-                            dept_name = user_role.department.name if user_role and user_role.department else 'No Department'
+                            dept_name = get_user_department_name(leave.employee)
                             if dept_name not in dept_groups:
                                 dept_groups[dept_name] = []
                             dept_groups[dept_name].append(leave)
@@ -1219,7 +1233,7 @@ def handle_team_calendar_filter_submission(payload):
                                     "type": "section",
                                     "text": {
                                         "type": "mrkdwn",
-                                        "text": f"📋 *... and {remaining} more leave(s) not shown. Use more specific filters to see all results.*"
+                                        "text": f"📋 *... and {remaining} more leave(s) not shown. Use more specific filters, the Export option or threaded pages to see all results.*"
                                     }
                                 })
                                 break
@@ -1227,9 +1241,15 @@ def handle_team_calendar_filter_submission(payload):
                             blocks.append(create_leave_block(leave, display_options))
                             leaves_shown += 1
                 
+                # Full result set as CSV/ICS files in the requester's DM
+                if 'EXPORT' in display_options and leaves.exists():
+                    from .calendar_export import start_export, export_notice_block
+                    start_export(leaves, payload.user_id, header_text.replace('📅 ', ''))
+                    blocks.append(export_notice_block())
+                
                 # Add comprehensive summary
                 total_leaves = leaves.count()
-                total_days = sum((leave.end_date - leave.start_date).days + 1 for leave in leaves)
+                total_days = total_working_days(leaves)
                 
                 # Additional statistics
                 pending_count = leaves.filter(status__in=['PENDING', 'PENDING_DOCS', 'DOCS_SUBMITTED']).count()
@@ -1242,7 +1262,7 @@ def handle_team_calendar_filter_submission(payload):
                 summary_text += f"• *Pending:* {pending_count} | *Approved:* {approved_count} | *Rejected:* {rejected_count}\n"
                 
                 if total_leaves > 50:
-                    summary_text += f"\n💡 *Tip: Large dataset ({total_leaves} records). Use more specific filters to see all results.*"
+                    summary_text += f"\n💡 *Tip: Large dataset ({total_leaves} records). Use more specific filters, the Export option or threaded pages to see all results.*"
                 
                 blocks.append({
                     "type": "section",
@@ -1253,14 +1273,14 @@ def handle_team_calendar_filter_submission(payload):
                 })
                 
                 # Send to the leave_app channel instead of leave_app channel
-                user_id = payload['user']['id']
+                user_id = payload.user_id
+                
+                if streamed_blocks is not None:
+                    blocks = itertools.chain(blocks[:stream_at], streamed_blocks, blocks[stream_at:])
                 
                 try:
-                    slack_client.chat_postMessage(
-                        channel=user_id,
-                        blocks=blocks,
-                        text=header_text
-                    )
+                    # Pages of up to 50 blocks; extra pages go in the thread
+                    post_blocks_in_chunks(user_id, blocks, text=header_text)
                 except SlackApiError as e:
                     logger.error(f"Error sending filtered calendar: {e}")
                     # Send error message
@@ -1272,7 +1292,7 @@ def handle_team_calendar_filter_submission(payload):
             except Exception as e:
                 logger.error(f"Background error building filtered calendar: {e}")
                 try:
-                    user_id = payload['user']['id']
+                    user_id = payload.user_id
                     slack_client.chat_postMessage(
                         channel=user_id,
                         text=f"⚠️ Error loading filtered calendar: {str(e)}"
@@ -1281,9 +1301,7 @@ def handle_team_calendar_filter_submission(payload):
                     logger.error(f"Failed to send error message: {slack_error}")
         
         # Start background thread for processing
-        thread = threading.Thread(target=build_and_send_filtered_calendar)
-        thread.daemon = True
-        thread.start()
+        run_in_background(build_and_send_filtered_calendar)
         
         # Return immediate response to clear modal (prevents timeout)
         return JsonResponse({"response_action": "clear"})
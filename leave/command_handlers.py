@@ -1,12 +1,16 @@
-from django.http import JsonResponse
-from .slack_utils import slack_client, get_or_create_user
+from .json_codec import JsonResponse
+from .slack_utils import slack_client, get_or_create_user, post_blocks_in_chunks
 from .models import LeaveRequest, UserRole, Department
+from .working_days import leave_durations
+from .query_budget import query_budget
 from slack_sdk.errors import SlackApiError
-import threading
+import itertools
+from .background import run_in_background
 import logging
 
 logger = logging.getLogger(__name__)
 
+@query_budget(2)
 def handle_apply_leave(request):
     """
     Handle apply leave command - supports both AI text and email-style form
@@ -24,6 +28,7 @@ def handle_apply_leave(request):
         if text:
             logger.info(f"AI_APPLY_LEAVE: Processing AI request for user {user_id}: '{text}'")
             
+            @query_budget(9)
             def process_ai_leave_request():
                 """Background function to process AI leave request"""
                 try:
@@ -79,14 +84,13 @@ def handle_apply_leave(request):
                     )
             
             # Start background processing
-            thread = threading.Thread(target=process_ai_leave_request)
-            thread.daemon = True
-            thread.start()
+            run_in_background(process_ai_leave_request)
             
             return JsonResponse({'text': '🤖 Processing your leave request with AI...'})
         
         # EMAIL-STYLE FORM PATH - NEW FORMAT
         else:
+            @query_budget(6)
             def get_balance_and_open_email_modal():
                 """Background function to get balance and open email-style modal"""
                 try:
@@ -259,9 +263,7 @@ def handle_apply_leave(request):
                         pass
         
             # Start background thread
-            thread = threading.Thread(target=get_balance_and_open_email_modal)
-            thread.daemon = True
-            thread.start()
+            run_in_background(get_balance_and_open_email_modal)
             
             # Return immediate response
             return JsonResponse({'text': '⏳ Loading leave request email form...'})
@@ -270,17 +272,20 @@ def handle_apply_leave(request):
         logger.error(f"Error opening form: {e}")
         return JsonResponse({'text': 'Error opening form'}, status=200)
 
+@query_budget(2)
 def handle_my_leaves(request):
     """Handle my leaves command - show user's leave history"""
     try:
         slack_user_id = request.POST.get('user_id')
         
         # IMMEDIATE RESPONSE - Return success first to avoid timeout
+        @query_budget(6)
         def get_leaves_and_respond():
             """Background function to get leaves and send response"""
             try:
                 user = get_or_create_user(slack_user_id)
-                leaves = LeaveRequest.objects.filter(employee=user).order_by('-start_date')
+                # Read once - durations are computed from these rows, not a second (differently tied) query
+                leaves = list(LeaveRequest.objects.filter(employee=user).order_by('-start_date'))
                 
                 if not leaves:
                     # Send follow-up message
@@ -307,8 +312,7 @@ def handle_my_leaves(request):
                     }
                 ]
                 
-                for leave in leaves:
-                    days = (leave.end_date - leave.start_date).days + 1
+                for leave, days in zip(leaves, leave_durations(leaves)):
                     status_emoji = "✅" if leave.status == 'APPROVED' else "❌" if leave.status == 'REJECTED' else "⏳"
                     
                     blocks.append({
@@ -324,18 +328,14 @@ def handle_my_leaves(request):
                         }
                     })
                 
-                # Send follow-up message with results
+                # Send follow-up message with results (pages of up to 50 blocks; extra pages go in the thread)
                 try:
-                    slack_client.chat_postMessage(
-                        channel=slack_user_id,
-                        blocks=blocks,
-                        text="Your leave history"
-                    )
+                    post_blocks_in_chunks(slack_user_id, blocks, text="Your leave history")
                 except SlackApiError:
                     # Fallback to leave_app channel
-                    slack_client.chat_postMessage(
-                        channel='leave_app',
-                        blocks=[{
+                    post_blocks_in_chunks(
+                        'leave_app',
+                        [{
                             "type": "section",
                             "text": {
                                 "type": "mrkdwn",
@@ -359,9 +359,7 @@ def handle_my_leaves(request):
                     )
         
         # Start background thread
-        thread = threading.Thread(target=get_leaves_and_respond)
-        thread.daemon = True
-        thread.start()
+        run_in_background(get_leaves_and_respond)
         
         # Return immediate response
         return JsonResponse({'text': '⏳ Fetching your leave history...'})
@@ -370,12 +368,14 @@ def handle_my_leaves(request):
         logger.error(f"Error fetching leave history: {e}")
         return JsonResponse({'text': 'Error fetching leave history'}, status=200)
 
+@query_budget(2)
 def handle_leave_balance(request):
     """Handle leave balance command - show user's current balance"""
     try:
         slack_user_id = request.POST.get('user_id')
         
         # IMMEDIATE RESPONSE - Return success first to avoid timeout
+        @query_budget(6)
         def get_balance_and_respond():
             """Background function to get balance and send response"""
             try:
@@ -415,9 +415,7 @@ def handle_leave_balance(request):
                     )
         
         # Start background thread
-        thread = threading.Thread(target=get_balance_and_respond)
-        thread.daemon = True
-        thread.start()
+        run_in_background(get_balance_and_respond)
         
         # Return immediate response
         return JsonResponse({'text': '⏳ Fetching your leave balance...'})
@@ -426,6 +424,7 @@ def handle_leave_balance(request):
         logger.error(f"Error fetching balance: {e}")
         return JsonResponse({'text': 'Error fetching balance'}, status=200)
 
+@query_budget(1)
 def handle_leave_policy(request):
     """Handle leave policy command - show company leave policy"""
     # This is static content, so we can return immediately
@@ -440,6 +439,7 @@ def handle_leave_policy(request):
         )
     })
 
+@query_budget(2)
 def handle_department_command(request):
     """Handle department assignment command with predefined departments"""
     try:
@@ -470,6 +470,7 @@ def handle_department_command(request):
         
         if not text:
             # IMMEDIATE RESPONSE - Return success first to avoid timeout
+            @query_budget(2)
             def open_department_modal():
                 """Background function to open department modal"""
                 try:
@@ -555,15 +556,14 @@ def handle_department_command(request):
                         )
             
             # Start background thread
-            thread = threading.Thread(target=open_department_modal)
-            thread.daemon = True
-            thread.start()
+            run_in_background(open_department_modal)
             
             # Return immediate response
             return JsonResponse({'text': '⏳ Opening department selection...'})
         
         # User specified a department name
         # IMMEDIATE RESPONSE for department assignment
+        @query_budget(42)
         def assign_department():
             """Background function to assign department"""
             try:
@@ -650,9 +650,7 @@ def handle_department_command(request):
                     )
         
         # Start background thread
-        thread = threading.Thread(target=assign_department)
-        thread.daemon = True
-        thread.start()
+        run_in_background(assign_department)
         # Return immediate response
         return JsonResponse({'text': '⏳ Opening team calendar form...'})
         
@@ -660,6 +658,7 @@ def handle_department_command(request):
         logger.error(f"Error handling team calendar: {e}")
         return JsonResponse({'text': 'Error opening team calendar'}, status=200) 
 
+@query_budget(2)
 def handle_team_calendar(request):
     """
     Handle team calendar command - supports both AI text and traditional form
@@ -684,6 +683,7 @@ def handle_team_calendar(request):
         if text:
             logger.info(f"AI_TEAM_CALENDAR: Processing AI request for user {user_id}: '{text}'")
             
+            @query_budget(15)
             def process_ai_calendar_request():
                 """Background function to process AI calendar request"""
                 try:
@@ -740,12 +740,13 @@ def handle_team_calendar(request):
                             }
                         }
                         
-                        blocks = [ai_header] + result.get('blocks', [])
+                        blocks = itertools.chain([ai_header], result.get('blocks', []))
                         
                         # FIXED: Send to user's DM instead of a channel
-                        slack_client.chat_postMessage(
-                            channel=user_id,
-                            blocks=blocks,
+                        # (pages of up to 50 blocks; extra pages go in the thread)
+                        post_blocks_in_chunks(
+                            user_id,
+                            blocks,
                             text=f"🤖 AI Calendar Results: {ai_response.get('query_description', text)}"
                         )
                     else:
@@ -764,15 +765,14 @@ def handle_team_calendar(request):
                     )
             
             # Start background processing
-            thread = threading.Thread(target=process_ai_calendar_request)
-            thread.daemon = True
-            thread.start()
+            run_in_background(process_ai_calendar_request)
             
             return JsonResponse({'text': '🤖 Processing your calendar request with AI...'})
         
         # TRADITIONAL FORM PATH - existing code continues
         else:
             # IMMEDIATE RESPONSE - Return success first to avoid timeout
+            @query_budget(5)
             def open_calendar_modal():
                 """Background function to open calendar modal"""
                 try:
@@ -883,9 +883,7 @@ def handle_team_calendar(request):
                     logger.error(f"Background error opening calendar modal: {e}")
             
             # Start background thread
-            thread = threading.Thread(target=open_calendar_modal)
-            thread.daemon = True
-            thread.start()
+            run_in_background(open_calendar_modal)
             
             # Return immediate response
             return JsonResponse({'text': '⏳ Opening team calendar form...'})
@@ -0,0 +1,180 @@
+from datetime import timedelta
+import numpy as np
+import logging
+
+from .working_days import get_busdaycalendar
+
+logger = logging.getLogger(__name__)
+
+# Share of the headcount off on a day -> heat cell
+HEAT_LEVELS = [(0.0, '🟩'), (0.10, '🟨'), (0.25, '🟧'), (1.01, '🟥')]
+NON_WORKING_CELL = '⬜'
+
+# Slack section text limit is 3000 chars - keep headroom for the code fence
+SECTION_TEXT_LIMIT = 2900
+MAX_EMPLOYEE_ROWS = 25
+
+
+def coverage_matrix(employee_ids, spans, start_date, end_date):
+    """
+    Boolean matrix employees x days, True where the employee is on leave
+
+    spans is a sequence of (employee_id, start_date, end_date). Each span is
+    clipped to the range and written as +1/-1 into a difference matrix with
+    np.add.at; a cumulative sum along the day axis fills the days in between,
+    so there is no per-day or per-employee Python loop.
+    """
+    days = (end_date - start_date).days + 1
+    matrix = np.zeros((len(employee_ids), days + 1), dtype=np.int32)
+    if not spans or days <= 0:
+        return matrix[:, :max(days, 0)].astype(bool)
+
+    row_of = {employee_id: row for row, employee_id in enumerate(employee_ids)}
+    kept = [(row_of[e], s, t) for e, s, t in spans if e in row_of and s and t]
+    if not kept:
+        return matrix[:, :days].astype(bool)
+
+    rows, starts, ends = zip(*kept)
+    rows = np.array(rows, dtype=np.int64)
+    origin = np.datetime64(start_date, 'D')
+    first = (np.array(starts, dtype='datetime64[D]') - origin).astype(np.int64)
+    last = (np.array(ends, dtype='datetime64[D]') - origin).astype(np.int64)
+    first = np.clip(first, 0, days)
+    last = np.clip(last + 1, 0, days)
+    valid = first < last
+
+    np.add.at(matrix, (rows[valid], first[valid]), 1)
+    np.add.at(matrix, (rows[valid], last[valid]), -1)
+    return np.cumsum(matrix[:, :days], axis=1) > 0
+
+
+def _heat_cell(share):
+    for threshold, cell in HEAT_LEVELS:
+        if share <= threshold:
+            return cell
+    return HEAT_LEVELS[-1][1]
+
+
+def heatmap_blocks(spans, employees, start_date, end_date):
+    """
+    Block Kit coverage heatmap for a date range
+
+    employees is a list of (user_id, username) defining the headcount (people
+    without leave still count towards coverage). Returns a list of blocks:
+    a weekly day-by-day heat grid, then the most-absent employees as rows.
+    """
+    employee_ids = [employee_id for employee_id, _ in employees]
+    matrix = coverage_matrix(employee_ids, spans, start_date, end_date)
+    headcount = len(employee_ids)
+    days = matrix.shape[1]
+    if not headcount or not days:
+        return []
+
+    dates = np.arange(np.datetime64(start_date, 'D'), np.datetime64(end_date, 'D') + 1)
+    working = np.is_busday(dates, busdaycal=get_busdaycalendar())
+    off_per_day = matrix.sum(axis=0)
+    share_off = off_per_day / headcount
+
+    # Weekly rows aligned Mon..Sun
+    lead = start_date.weekday()
+    lines = []
+    week_start = start_date - timedelta(days=lead)
+    while week_start <= end_date:
+        cells = []
+        peak = 0
+        for offset in range(7):
+            index = (week_start - start_date).days + offset
+            if index < 0 or index >= days:
+                cells.append('▫️')
+            elif not working[index]:
+                cells.append(NON_WORKING_CELL)
+            else:
+                cells.append(_heat_cell(share_off[index]))
+                peak = max(peak, int(off_per_day[index]))
+        lines.append(f"`{week_start.strftime('%b %d')}` {''.join(cells)}  peak {peak} off")
+        week_start += timedelta(days=7)
+
+    working_off = np.where(working, off_per_day, 0)
+    busiest = int(working_off.argmax())
+    min_coverage = 1 - share_off[working].max() if working.any() else 1.0
+
+    blocks = [
+        {
+            "type": "section",
+            "text": {
+                "type": "mrkdwn",
+                "text": (
+                    f"🗺️ *Coverage Heatmap* - {headcount} people, {days} days\n"
+                    f"Lowest coverage: *{min_coverage:.0%}* on {(start_date + timedelta(days=busiest)).strftime('%a %b %d')} "
+                    f"({int(working_off[busiest])} off)"
+                )
+            }
+        },
+        {
+            "type": "section",
+            "text": {"type": "mrkdwn", "text": "`Week  ` Mo Tu We Th Fr Sa Su\n" + "\n".join(lines)}
+        },
+        {
+            "type": "context",
+            "elements": [{
+                "type": "mrkdwn",
+                "text": "🟩 nobody off  🟨 under 10%  🟧 under 25%  🟥 25%+ off  ⬜ weekend/holiday"
+            }]
+        }
+    ]
+
+    # Most-absent employees, one row each: █ on leave, · working, space non-working
+    days_off = (matrix & working).sum(axis=1)
+    absent_rows = np.flatnonzero(days_off)
+    if absent_rows.size:
+        order = absent_rows[np.argsort(-days_off[absent_rows], kind='stable')][:MAX_EMPLOYEE_ROWS]
+        pattern = np.where(working, '·', ' ')
+        names = {employee_id: username for employee_id, username in employees}
+        width = min(12, max(len(names[employee_ids[row]]) for row in order))
+        grid_lines = []
+        length = 0
+        for row in order:
+            cells = ''.join(np.where(matrix[row], '█', pattern))
+            line = f"{names[employee_ids[row]][:width]:<{width}} {cells} {int(days_off[row])}d"
+            if length + len(line) + 1 > SECTION_TEXT_LIMIT:
+                break
+            grid_lines.append(line)
+            length += len(line) + 1
+        blocks.append({
+            "type": "section",
+            "text": {
+                "type": "mrkdwn",
+                "text": f"*Most days off* ({len(grid_lines)} of {absent_rows.size})\n```" + "\n".join(grid_lines) + "```"
+            }
+        })
+
+    return blocks
+
+
+def calendar_heatmap_blocks(leaves, start_date, end_date, department_id=None, user_ids=None, leave_employees_only=False):
+    """
+    Heatmap blocks for a filtered team calendar queryset
+
+    The headcount is the department / user set in scope (everyone with a role
+    by default) plus anyone with a matching leave; leave_employees_only limits
+    it to the latter (e.g. when filtering by employee name). Only approved and
+    pending leaves count as absences - rejected and cancelled ones in an 'ALL'
+    status query are left out.
+    """
+    from .models import UserRole
+    from .occupancy import ACTIVE_STATUSES
+    leaves = leaves.filter(status__in=ACTIVE_STATUSES)
+    rows = list(leaves.order_by().values_list('employee_id', 'employee__username', 'start_date', 'end_date'))
+    spans = [(employee_id, start, end) for employee_id, _, start, end in rows]
+
+    employees = {}
+    if not leave_employees_only:
+        roles = UserRole.objects.all()
+        if department_id:
+            roles = roles.filter(department_id=department_id)
+        if user_ids is not None:
+            roles = roles.filter(user_id__in=user_ids)
+        employees.update(roles.values_list('user_id', 'user__username'))
+    employees.update((employee_id, username) for employee_id, username, _, _ in rows)
+
+    return heatmap_blocks(spans, sorted(employees.items(), key=lambda item: item[1]), start_date, end_date)
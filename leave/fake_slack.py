@@ -0,0 +1,316 @@
+"""
+Offline stand-in for the Slack Web API
+
+Serves the methods this app calls (chat.*, views.*, users.*, conversations.*,
+files.*, auth.test) with plausible responses, so the app can be exercised at
+high request rates without touching Slack. Latency, HTTP 429 rate limiting
+and error responses can be injected. Point the app at it with
+SLACK_API_BASE_URL=http://127.0.0.1:<port>/api/.
+"""
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+from collections import Counter
+import itertools
+import threading
+import hashlib
+import random
+import json
+import time
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+class FakeSlackState:
+    """Behaviour knobs plus everything the fake has recorded (thread-safe)"""
+
+    def __init__(self, latency_ms=0, jitter_ms=0, rate_limit_rate=0.0, retry_after=1,
+                 failure_rate=0.0, channel_members=None, seed=None):
+        self.latency_ms = latency_ms
+        self.jitter_ms = jitter_ms
+        self.rate_limit_rate = rate_limit_rate
+        self.retry_after = retry_after
+        self.failure_rate = failure_rate
+        self.channel_members = list(channel_members or [])
+        self.random = random.Random(seed)
+        self.lock = threading.Lock()
+        self.calls = Counter()
+        self.rate_limited = Counter()
+        self.failed = Counter()
+        self.messages = {}  # (channel, ts) -> message
+        self._ts = itertools.count(1)
+        self._ids = itertools.count(1)
+
+    def next_ts(self):
+        with self.lock:
+            return f"{int(time.time())}.{next(self._ts):06d}"
+
+    def next_id(self, prefix):
+        with self.lock:
+            return f"{prefix}{next(self._ids):010d}"
+
+    def roll(self, method):
+        """'rate_limited' / 'failed' / None for one call, and count it"""
+        with self.lock:
+            self.calls[method] += 1
+            draw = self.random.random()
+            if draw < self.rate_limit_rate:
+                self.rate_limited[method] += 1
+                return 'rate_limited'
+            if draw < self.rate_limit_rate + self.failure_rate:
+                self.failed[method] += 1
+                return 'failed'
+        return None
+
+    def delay(self):
+        if self.latency_ms or self.jitter_ms:
+            with self.lock:
+                jitter = self.random.uniform(-self.jitter_ms, self.jitter_ms) if self.jitter_ms else 0
+            time.sleep(max(0.0, self.latency_ms + jitter) / 1000.0)
+
+    def stats(self):
+        with self.lock:
+            return {
+                'calls': dict(self.calls),
+                'rate_limited': dict(self.rate_limited),
+                'failed': dict(self.failed),
+                'total_calls': sum(self.calls.values()),
+                'messages': len(self.messages),
+            }
+
+    def reset(self):
+        with self.lock:
+            self.calls.clear()
+            self.rate_limited.clear()
+            self.failed.clear()
+            self.messages.clear()
+
+
+def _channel_id(name):
+    """Stable fake channel id for a channel name or user id"""
+    name = (name or '').lstrip('#')
+    if name[:1] in ('C', 'D', 'G') and name[1:].isalnum() and name.upper() == name:
+        return name
+    if name.startswith('U'):
+        return 'D' + name[1:]
+    return 'C' + hashlib.md5(name.encode()).hexdigest()[:10].upper()
+
+
+def _user(user_id):
+    return {
+        'id': user_id,
+        'name': user_id.lower(),
+        'real_name': f"User {user_id}",
+        'is_bot': False,
+        'profile': {
+            'real_name': f"User {user_id}",
+            'display_name': user_id.lower(),
+            'email': f"{user_id.lower()}@example.com",
+        },
+    }
+
+
+def _file(state, file_id, base_url, name=None):
+    return {
+        'id': file_id,
+        'name': name or f"{file_id}.pdf",
+        'title': name or f"{file_id}.pdf",
+        'mimetype': 'application/pdf',
+        'filetype': 'pdf',
+        'size': 1024,
+        'url_private': f"{base_url}files/{file_id}",
+        'url_private_download': f"{base_url}files/{file_id}/download",
+        'permalink': f"{base_url}files/{file_id}/permalink",
+        'permalink_public': f"{base_url}files/{file_id}/public",
+    }
+
+
+def handle_method(state, method, params, base_url):
+    """JSON body for a Web API method call"""
+    if method == 'auth.test':
+        return {'ok': True, 'url': base_url, 'team': 'Fake', 'team_id': 'T00000000', 'user_id': 'U0000000BOT', 'bot_id': 'B00000000'}
+
+    if method in ('chat.postMessage', 'chat.postEphemeral', 'chat.update'):
+        channel = _channel_id(params.get('channel'))
+        ts = params.get('ts') if method == 'chat.update' else state.next_ts()
+        message = {'type': 'message', 'ts': ts, 'text': params.get('text', ''), 'user': 'U0000000BOT'}
+        if params.get('thread_ts'):
+            message['thread_ts'] = params['thread_ts']
+        if params.get('blocks'):
+            blocks = params['blocks']
+            message['blocks'] = json.loads(blocks) if isinstance(blocks, str) else blocks
+            if len(message['blocks']) > 50:
+                return {'ok': False, 'error': 'invalid_blocks', 'errors': ['must be less than 51 items']}
+        with state.lock:
+            state.messages[(channel, ts)] = message
+        if method == 'chat.postEphemeral':
+            return {'ok': True, 'message_ts': ts}
+        return {'ok': True, 'channel': channel, 'ts': ts, 'message': message}
+
+    if method == 'chat.delete':
+        return {'ok': True, 'channel': _channel_id(params.get('channel')), 'ts': params.get('ts')}
+
+    if method in ('views.open', 'views.push', 'views.update', 'views.publish'):
+        view = params.get('view')
+        view = json.loads(view) if isinstance(view, str) else (view or {})
+        return {'ok': True, 'view': dict(view, id=params.get('view_id') or state.next_id('V'))}
+
+    if method == 'users.info':
+        return {'ok': True, 'user': _user(params.get('user', 'U0000000000'))}
+
+    if method == 'users.list':
+        members = [_user(user_id) for user_id in state.channel_members]
+        return {'ok': True, 'members': members, 'response_metadata': {'next_cursor': ''}}
+
+    if method == 'conversations.open':
+        users = params.get('users') or ''
+        users = users if isinstance(users, list) else users.split(',')
+        return {'ok': True, 'channel': {'id': _channel_id(users[0] if users else ''), 'is_im': True}}
+
+    if method == 'conversations.info':
+        name = (params.get('channel') or '').lstrip('#')
+        return {'ok': True, 'channel': {'id': _channel_id(name), 'name': name.lower()}}
+
+    if method == 'conversations.list':
+        return {'ok': True, 'channels': [], 'response_metadata': {'next_cursor': ''}}
+
+    if method == 'conversations.members':
+        return {'ok': True, 'members': list(state.channel_members), 'response_metadata': {'next_cursor': ''}}
+
+    if method in ('conversations.history', 'conversations.replies'):
+        channel = _channel_id(params.get('channel'))
+        with state.lock:
+            messages = [m for (c, _), m in state.messages.items() if c == channel][-100:]
+        return {'ok': True, 'messages': messages, 'has_more': False}
+
+    if method == 'files.info':
+        return {'ok': True, 'file': _file(state, params.get('file', 'F0000000000'), base_url)}
+
+    if method == 'files.sharedPublicURL':
+        return {'ok': True, 'file': _file(state, params.get('file', 'F0000000000'), base_url)}
+
+    if method == 'files.getUploadURLExternal':
+        file_id = state.next_id('F')
+        return {'ok': True, 'file_id': file_id, 'upload_url': f"{base_url}upload/{file_id}"}
+
+    if method == 'files.completeUploadExternal':
+        files = params.get('files')
+        files = json.loads(files) if isinstance(files, str) else (files or [])
+        return {'ok': True, 'files': [dict(_file(state, f['id'], base_url, f.get('title')), title=f.get('title')) for f in files]}
+
+    # Anything else succeeds with an empty payload so new call sites do not break load tests
+    logger.debug(f"Fake Slack: unhandled method {method}")
+    return {'ok': True}
+
+
+class FakeSlackHandler(BaseHTTPRequestHandler):
+    server_version = 'FakeSlack/1.0'
+    protocol_version = 'HTTP/1.1'
+
+    @property
+    def state(self):
+        return self.server.state
+
+    @property
+    def base_url(self):
+        host, port = self.server.server_address[:2]
+        return f"http://{host}:{port}/"
+
+    def log_message(self, format, *args):
+        logger.debug(f"Fake Slack: {format % args}")
+
+    def _send_json(self, status, body, headers=None):
+        payload = json.dumps(body).encode()
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json; charset=utf-8')
+        self.send_header('Content-Length', str(len(payload)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def _read_params(self):
+        length = int(self.headers.get('Content-Length') or 0)
+        raw = self.rfile.read(length) if length else b''
+        content_type = self.headers.get('Content-Type', '')
+        params = {key: values[-1] for key, values in parse_qs(urlparse(self.path).query).items()}
+        if 'application/json' in content_type and raw:
+            params.update(json.loads(raw))
+        elif 'application/x-www-form-urlencoded' in content_type and raw:
+            params.update({key: values[-1] for key, values in parse_qs(raw.decode()).items()})
+        return params, raw
+
+    def do_GET(self):
+        path = urlparse(self.path).path
+        if path == '/stats':
+            return self._send_json(200, self.state.stats())
+        if path.startswith('/files/'):
+            self.state.delay()
+            body = b'%PDF-1.4 fake slack file\n'
+            self.send_response(200)
+            self.send_header('Content-Type', 'application/pdf')
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+            return
+        if path.startswith('/api/'):
+            return self.do_POST()
+        self._send_json(404, {'ok': False, 'error': 'not_found'})
+
+    def do_POST(self):
+        path = urlparse(self.path).path
+        params, raw = self._read_params()
+
+        if path == '/reset':
+            self.state.reset()
+            return self._send_json(200, {'ok': True})
+        if path.startswith('/upload/'):
+            self.state.delay()
+            return self._send_json(200, {'ok': True})
+        if not path.startswith('/api/'):
+            return self._send_json(404, {'ok': False, 'error': 'not_found'})
+
+        method = path[len('/api/'):].strip('/')
+        self.state.delay()
+        outcome = self.state.roll(method)
+        if outcome == 'rate_limited':
+            return self._send_json(429, {'ok': False, 'error': 'ratelimited'}, {'Retry-After': str(self.state.retry_after)})
+        if outcome == 'failed':
+            return self._send_json(200, {'ok': False, 'error': 'internal_error'})
+        try:
+            body = handle_method(self.state, method, params, self.base_url)
+        except Exception as e:
+            logger.error(f"Fake Slack: error handling {method}: {e}")
+            body = {'ok': False, 'error': 'fatal_error'}
+        self._send_json(200, body)
+
+
+class FakeSlackServer:
+    """Threaded fake Slack HTTP server; start() runs it in a daemon thread"""
+
+    def __init__(self, host='127.0.0.1', port=0, **state_options):
+        self.httpd = ThreadingHTTPServer((host, port), FakeSlackHandler)
+        self.httpd.daemon_threads = True
+        self.httpd.state = FakeSlackState(**state_options)
+        self.thread = None
+
+    @property
+    def state(self):
+        return self.httpd.state
+
+    @property
+    def base_url(self):
+        host, port = self.httpd.server_address[:2]
+        return f"http://{host}:{port}/api/"
+
+    def start(self):
+        self.thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+        self.thread.start()
+        return self
+
+    def serve_forever(self):
+        self.httpd.serve_forever()
+
+    def stop(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
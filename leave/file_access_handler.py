@@ -1,36 +1,81 @@
-from django.http import JsonResponse
+from .json_codec import JsonResponse
 from .slack_utils import slack_client
-from .models import LeaveRequest
+from .models import LeaveRequest, LeaveDocument
+from .file_cache import get_file_links, get_best_link
 import logging
 
 logger = logging.getLogger(__name__)
 
+def get_leave_document(leave_id):
+    """
+    Get the latest uploaded document for a leave request
+    
+    Single indexed lookup on LeaveDocument (leave + employee joined in).
+    Requests uploaded before LeaveDocument existed only have the file details
+    in document_notes text - those are parsed ONCE and stored as a LeaveDocument.
+    Returns None if the leave has no document; raises LeaveRequest.DoesNotExist
+    if the leave itself does not exist.
+    """
+    document = LeaveDocument.objects.select_related('leave__employee').filter(leave_id=leave_id).first()
+    if document:
+        return document
+    
+    leave_request = LeaveRequest.objects.select_related('employee').get(id=leave_id)
+    return backfill_document_from_notes(leave_request)
+
+def backfill_document_from_notes(leave_request):
+    """Create a LeaveDocument from legacy document_notes text (File ID / File Name lines)"""
+    if not leave_request.document_notes:
+        return None
+    
+    details = {}
+    for line in leave_request.document_notes.split('\n'):
+        if ': ' in line:
+            key, value = line.split(': ', 1)
+            details[key.strip()] = value.strip()
+    
+    file_id = details.get('File ID')
+    if not file_id:
+        return None
+    
+    file_size = details.get('File Size', '0').replace('bytes', '').strip()
+    document = LeaveDocument.objects.create(
+        leave=leave_request,
+        file_id=file_id,
+        file_name=details.get('File Name') or 'document',
+        file_type=details.get('File Type') or 'unknown',
+        file_size=int(file_size) if file_size.isdigit() else 0,
+        employee_notes=details.get('Employee Notes')
+    )
+    logger.info(f"Backfilled LeaveDocument {document.id} from document_notes for leave {leave_request.id}")
+    return document
+
 def handle_document_access_request(payload):
     """Simple solution: Ask employee to reshare file to manager"""
     try:
-        action_value = payload['actions'][0]['value']
+        action_value = payload.action_value
         leave_id = action_value.split('|')[0]
-        leave_request = LeaveRequest.objects.get(id=leave_id)
-        manager_id = payload['user']['id']
+        manager_id = payload.user_id
         
         logger.info(f"📄 DOCUMENT ACCESS: Manager {manager_id} requesting document for leave {leave_id}")
         
-        # Get file info from leave request
-        file_id = None
-        file_name = "document"
-        if leave_request.document_notes:
-            for line in leave_request.document_notes.split('\n'):
-                if line.startswith('File ID:'):
-                    file_id = line.split(': ')[1].strip()
-                elif line.startswith('File Name:'):
-                    file_name = line.split(': ', 1)[1].strip()
+        # Get file info from the stored document record
+        document = get_leave_document(leave_id)
         
-        if not file_id:
+        if not document:
             return JsonResponse({
                 "response_type": "ephemeral",
                 "text": "❌ Could not find document. Please ask employee to resubmit."
             })
         
+        leave_request = document.leave
+        file_id = document.file_id
+        file_name = document.file_name
+        
+        # Cached link (no Slack call when fresh) - lets the manager open the file while waiting
+        link_url, _ = get_best_link(get_file_links(file_id, document))
+        link_line = f"• Link: <{link_url}|Open {file_name}>\n" if link_url else ""
+        
         try:
             employee_id = leave_request.employee.username
             logger.info(f"📄 Requesting employee {employee_id} to reshare file {file_id} to manager {manager_id}")
@@ -87,6 +132,7 @@ def handle_document_access_request(payload):
                                     f"**File Details:**\n"
                                     f"• Name: `{file_name}`\n"
                                     f"• File ID: `{file_id}`\n"
+                                    f"{link_line}"
                                     f"• Employee: <@{leave_request.employee.username}>\n"
                                     f"• Leave: {leave_request.leave_type} ({leave_request.start_date} to {leave_request.end_date})\n\n"
                                     f"⏱️ *You should receive the file shortly in your DM.*"
@@ -168,6 +214,7 @@ def handle_document_access_request(payload):
                                 f"**File Details:**\n"
                                 f"• Name: `{file_name}`\n"
                                 f"• File ID: `{file_id}`\n"
+                                f"{link_line}"
                                 f"• Employee: <@{leave_request.employee.username}>\n\n"
                                 f"**Manual Steps:**\n"
                                 f"1. Ask <@{leave_request.employee.username}> to share the file to your DM\n"
@@ -0,0 +1,159 @@
+from django.conf import settings
+from django.utils import timezone
+from datetime import timedelta
+from .slack_utils import slack_client
+from .background import run_in_background
+import threading
+import logging
+
+logger = logging.getLogger(__name__)
+
+# In-process cache of Slack file links: {file_id: entry}
+# entry = {name, permalink, url_private, fetched_at, expires_at}
+# Public links are never created or cached here - see create_public_link
+_file_cache = {}
+_cache_lock = threading.Lock()
+_refreshing = set()
+
+def _ttl():
+    return timedelta(seconds=getattr(settings, 'SLACK_FILE_LINK_TTL', 3600))
+
+def _refresh_ahead():
+    return timedelta(seconds=getattr(settings, 'SLACK_FILE_LINK_REFRESH_AHEAD', 300))
+
+def _store(file_id, name, permalink, url_private, fetched_at=None):
+    """Put an entry in the cache and return it"""
+    fetched_at = fetched_at or timezone.now()
+    entry = {
+        'name': name,
+        'permalink': permalink,
+        'url_private': url_private,
+        'fetched_at': fetched_at,
+        'expires_at': fetched_at + _ttl()
+    }
+    with _cache_lock:
+        _file_cache[file_id] = entry
+    return entry
+
+def _fetch_from_slack(file_id, document=None):
+    """Fetch file links from Slack (files.info) and cache them"""
+    file_response = slack_client.files_info(file=file_id)
+    if not file_response['ok']:
+        logger.warning(f"📄 files.info failed for {file_id}: {file_response.get('error')}")
+        return None
+
+    file_data = file_response['file']
+    entry = _store(
+        file_id,
+        file_data.get('name', 'document'),
+        file_data.get('permalink'),
+        file_data.get('url_private_download') or file_data.get('url_private')
+    )
+
+    # Keep the stored document in step so a restart starts from fresh links
+    if document and (document.permalink != entry['permalink'] or document.url_private != entry['url_private']):
+        from .models import LeaveDocument
+        LeaveDocument.objects.filter(id=document.id).update(
+            permalink=entry['permalink'],
+            url_private=entry['url_private']
+        )
+        document.permalink = entry['permalink']
+        document.url_private = entry['url_private']
+
+    return entry
+
+def _refresh_in_background(file_id, document=None):
+    """Refresh an entry off the request path - at most one refresh per file at a time"""
+    with _cache_lock:
+        if file_id in _refreshing:
+            return
+        _refreshing.add(file_id)
+
+    def refresh():
+        try:
+            _fetch_from_slack(file_id, document)
+        except Exception as e:
+            logger.error(f"📄 Background refresh failed for {file_id}: {e}")
+        finally:
+            with _cache_lock:
+                _refreshing.discard(file_id)
+
+    run_in_background(refresh)
+
+def get_file_links(file_id, document=None):
+    """
+    Get cached links for a Slack file
+
+    Entries are seeded from the LeaveDocument when there is one, so the first
+    click does not need a Slack call. Entries close to expiry are served as-is
+    and refreshed in the background; only expired or missing entries are
+    fetched inline. Returns None if the file cannot be resolved.
+    """
+    now = timezone.now()
+    with _cache_lock:
+        entry = _file_cache.get(file_id)
+
+    if not entry and document and (document.permalink or document.url_private):
+        entry = _store(
+            file_id,
+            document.file_name,
+            document.permalink,
+            document.url_private,
+            fetched_at=document.uploaded_at
+        )
+
+    if entry and now < entry['expires_at']:
+        if now >= entry['expires_at'] - _refresh_ahead():
+            _refresh_in_background(file_id, document)
+        return entry
+
+    try:
+        return _fetch_from_slack(file_id, document) or entry
+    except Exception as e:
+        logger.error(f"📄 Error fetching file links for {file_id}: {e}")
+        # A stale link is better than none - the manager can still re-share
+        return entry
+
+def get_best_link(entry):
+    """Pick the most widely usable link from a cache entry: (url, link type)"""
+    if not entry:
+        return None, None
+    if entry.get('permalink'):
+        return entry['permalink'], "Document Link"
+    if entry.get('url_private'):
+        return entry['url_private'], "Private Link"
+    return None, None
+
+def update_from_file_data(file_id, file_data):
+    """Refresh a cached entry from a file object returned by another Slack call"""
+    if not file_data:
+        return
+    with _cache_lock:
+        entry = _file_cache.get(file_id)
+    _store(
+        file_id,
+        file_data.get('name') or (entry and entry['name']) or 'document',
+        file_data.get('permalink') or (entry and entry['permalink']),
+        file_data.get('url_private_download') or file_data.get('url_private') or (entry and entry['url_private'])
+    )
+
+def create_public_link(file_id):
+    """
+    Publish a file with files.sharedPublicURL and return its public link (or None)
+
+    This makes the document readable by anyone with the link, so it is only
+    called from the explicit "get fresh file link" action and never cached.
+    """
+    try:
+        share_response = slack_client.files_sharedPublicURL(file=file_id)
+        if share_response['ok']:
+            return share_response['file'].get('permalink_public')
+    except Exception as e:
+        # Public links are often disabled for the workspace - private links still work
+        logger.debug(f"📄 Public URL not available for {file_id}: {e}")
+    return None
+
+def invalidate_file(file_id):
+    """Drop a file from the cache (e.g. after it was deleted or revoked)"""
+    with _cache_lock:
+        _file_cache.pop(file_id, None)
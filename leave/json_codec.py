@@ -0,0 +1,91 @@
+"""
+JSON codec for Slack payloads and responses
+
+Interaction payloads (which echo the whole modal view) and Block Kit
+responses are parsed and serialized on every Slack request. This module
+uses orjson when it is installed and the stdlib json module otherwise;
+LEAVE_JSON_BACKEND='json' forces the stdlib.
+
+    loads(data)            str or bytes -> object
+    dumps(obj)             object -> bytes
+    dumps_str(obj)         object -> str
+    request_payload(req)   the parsed Slack payload of a request, parsed once
+    JsonResponse           drop-in for django.http.JsonResponse
+
+Both backends produce the same JSON for what this app sends. The one
+difference is datetimes: orjson writes full microseconds and '+00:00',
+where DjangoJSONEncoder writes milliseconds and 'Z'. Types neither
+backend knows (Decimal, lazy translations, timedelta) go through
+DjangoJSONEncoder. `manage.py bench_json_codec` compares the backends.
+"""
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+from django.http import HttpResponse
+import json
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+_django_encoder = DjangoJSONEncoder()
+
+
+def json_backend():
+    """'orjson' or 'json' - the backend in use with the current LEAVE_JSON_BACKEND"""
+    if orjson is None or getattr(settings, 'LEAVE_JSON_BACKEND', 'auto') == 'json':
+        return 'json'
+    return 'orjson'
+
+
+def _default(obj):
+    return _django_encoder.default(obj)
+
+
+def loads(data):
+    if json_backend() == 'orjson':
+        return orjson.loads(data)
+    return json.loads(data)
+
+
+def dumps(obj):
+    if json_backend() == 'orjson':
+        return orjson.dumps(obj, default=_default, option=orjson.OPT_NON_STR_KEYS)
+    return json.dumps(obj, cls=DjangoJSONEncoder, ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+
+
+def dumps_str(obj):
+    return dumps(obj).decode('utf-8')
+
+
+def request_payload(request):
+    """
+    The JSON a Slack request carries - the interaction `payload` form field
+    or the Events API body - or None. Parsed once per request and shared by
+    slack_events, metrics and profiling.
+    """
+    if not hasattr(request, '_leave_payload'):
+        payload = None
+        if request.content_type == 'application/x-www-form-urlencoded':
+            if request.POST.get('payload'):
+                payload = loads(request.POST['payload'])
+        elif request.content_type == 'application/json' and request.body:
+            payload = loads(request.body)
+        request._leave_payload = payload
+    return request._leave_payload
+
+
+class JsonResponse(HttpResponse):
+    """django.http.JsonResponse with the body encoded by this codec (json_dumps_params forces the stdlib encoder)"""
+
+    def __init__(self, data, encoder=DjangoJSONEncoder, safe=True, json_dumps_params=None, **kwargs):
+        if safe and not isinstance(data, dict):
+            raise TypeError(
+                "In order to allow non-dict objects to be serialized set the safe parameter to False."
+            )
+        kwargs.setdefault('content_type', 'application/json')
+        if encoder is DjangoJSONEncoder and not json_dumps_params:
+            content = dumps(data)
+        else:
+            content = json.dumps(data, cls=encoder, **(json_dumps_params or {}))
+        super().__init__(content=content, **kwargs)
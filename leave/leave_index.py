@@ -0,0 +1,338 @@
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+from bisect import bisect_right
+from datetime import timedelta
+import threading
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Leaves in these statuses are never indexed
+EXCLUDED_STATUSES = {'CANCELLED'}
+
+# Incremental syncs re-read rows saved this long before the last sync, so a write whose
+# transaction committed after that sync (with an earlier updated_at) is still picked up
+SYNC_OVERLAP = timedelta(minutes=5)
+
+# Entry layout: (leave_id, start_ordinal, end_ordinal, employee_id, status)
+ID, START, END, EMPLOYEE, STATUS = range(5)
+
+
+class _Node:
+    """Centered interval tree node - intervals containing center, sorted both ways"""
+    __slots__ = ('center', 'left', 'right', 'by_start', 'by_end', 'starts', 'neg_ends')
+
+    def __init__(self, center, entries, left, right):
+        self.center = center
+        self.left = left
+        self.right = right
+        self.by_start = sorted(entries, key=lambda e: e[START])
+        self.by_end = sorted(entries, key=lambda e: -e[END])
+        self.starts = [e[START] for e in self.by_start]
+        self.neg_ends = [-e[END] for e in self.by_end]
+
+
+def _build_tree(entries):
+    if not entries:
+        return None
+    endpoints = sorted(point for e in entries for point in (e[START], e[END]))
+    center = endpoints[len(endpoints) // 2]
+    left, here, right = [], [], []
+    for e in entries:
+        if e[END] < center:
+            left.append(e)
+        elif e[START] > center:
+            right.append(e)
+        else:
+            here.append(e)
+    return _Node(center, here, _build_tree(left), _build_tree(right))
+
+
+def _query_tree(node, start, end, out):
+    """Append every entry overlapping [start, end] - O(log n + k)"""
+    while node is not None:
+        if end < node.center:
+            # Node intervals all end at/after center > end: overlap iff they start <= end
+            out.extend(node.by_start[:bisect_right(node.starts, end)])
+            node = node.left
+        elif start > node.center:
+            # Node intervals all start at/before center < start: overlap iff they end >= start
+            out.extend(node.by_end[:bisect_right(node.neg_ends, -start)])
+            node = node.right
+        else:
+            out.extend(node.by_start)
+            _query_tree(node.left, start, end, out)
+            node = node.right
+
+
+class LeaveIntervalIndex:
+    """
+    Process-level index of non-cancelled leaves for overlap queries
+
+    A static centered interval tree answers stabbing/range queries in
+    O(log n + k). Saves and deletes go to a small overlay (added entries plus
+    a set of superseded ids) that is merged into the tree once it grows past
+    rebuild_threshold, so writes stay cheap and queries stay logarithmic.
+    The merged tree is built on a background thread and swapped in under
+    the lock, so queries never wait for a rebuild.
+    """
+
+    def __init__(self, rebuild_threshold=256):
+        self.rebuild_threshold = rebuild_threshold
+        self._lock = threading.RLock()
+        self._built = False
+        self._tree = None
+        self._entries = {}      # leave_id -> entry (the truth for this process)
+        self._tree_ids = set()  # ids present in the tree
+        self._overlay = {}      # leave_id -> entry added/changed since the tree was built
+        self._removed = set()   # tree ids that are stale (changed or deleted)
+        self._changed = None    # ids touched while a compaction is running (None when idle)
+        self._generation = 0    # bumped by build() and each compaction - a superseded compaction is dropped
+        self._synced_at = None  # updated_at watermark of the last load/sync
+
+    # ---- building ----
+
+    def _load_entries(self):
+        from .models import LeaveRequest
+        rows = LeaveRequest.objects.exclude(status__in=EXCLUDED_STATUSES).values_list(
+            'id', 'start_date', 'end_date', 'employee_id', 'status'
+        )
+        return {
+            leave_id: (leave_id, start.toordinal(), end.toordinal(), employee_id, status)
+            for leave_id, start, end, employee_id, status in rows.iterator()
+            if start and end
+        }
+
+    def build(self):
+        """(Re)load every indexed leave from the database"""
+        started = timezone.now()
+        entries = self._load_entries()
+        tree, tree_ids = _build_tree(list(entries.values())), set(entries)
+        with self._lock:
+            self._entries = entries
+            self._tree, self._tree_ids = tree, tree_ids
+            self._overlay = {}
+            self._removed = set()
+            self._changed = None
+            self._generation += 1
+            self._synced_at = started
+            self._built = True
+        logger.info(f"Leave index built with {len(entries)} leave(s)")
+        return len(entries)
+
+    def ensure_built(self):
+        if not self._built:
+            with self._lock:
+                if not self._built:
+                    self.build()
+
+    def _maybe_compact(self):
+        """Start merging the overlay into a new tree once it is large (called with the lock held)"""
+        if self._changed is not None or len(self._overlay) + len(self._removed) <= self.rebuild_threshold:
+            return
+        self._changed = set()
+        self._generation += 1
+        snapshot = dict(self._entries)
+        threading.Thread(
+            target=self._compact, args=(snapshot, self._generation), name='leave-index-compact', daemon=True
+        ).start()
+
+    def _compact(self, snapshot, generation):
+        """Build the tree for a snapshot outside the lock, then swap it in with the writes made meanwhile"""
+        tree = tree_ids = None
+        try:
+            tree, tree_ids = _build_tree(list(snapshot.values())), set(snapshot)
+        except Exception as e:
+            logger.error(f"Error compacting leave index: {e}")
+        with self._lock:
+            if generation != self._generation:
+                return  # build() replaced everything meanwhile
+            if tree_ids is not None:
+                self._tree, self._tree_ids = tree, tree_ids
+                self._overlay = {leave_id: self._entries[leave_id] for leave_id in self._changed if leave_id in self._entries}
+                self._removed = {leave_id for leave_id in self._changed if leave_id in tree_ids}
+            self._changed = None
+
+    # ---- incremental updates ----
+
+    def upsert(self, leave_id, start_date, end_date, employee_id, status):
+        """Add or replace one leave (removes it if it is no longer indexable)"""
+        if status in EXCLUDED_STATUSES or not start_date or not end_date:
+            self.remove(leave_id)
+            return
+        self._apply(leave_id, (leave_id, start_date.toordinal(), end_date.toordinal(), employee_id, status))
+
+    def _apply(self, leave_id, entry):
+        with self._lock:
+            if not self._built:
+                return  # The first query loads everything anyway
+            if self._entries.get(leave_id) == entry:
+                return
+            self._entries[leave_id] = entry
+            if leave_id in self._tree_ids:
+                self._removed.add(leave_id)
+            self._overlay[leave_id] = entry
+            if self._changed is not None:
+                self._changed.add(leave_id)
+            self._maybe_compact()
+
+    def upsert_leave(self, leave):
+        self.upsert(leave.id, leave.start_date, leave.end_date, leave.employee_id, leave.status)
+
+    def remove(self, leave_id):
+        with self._lock:
+            if not self._built or leave_id not in self._entries:
+                return
+            del self._entries[leave_id]
+            self._overlay.pop(leave_id, None)
+            if leave_id in self._tree_ids:
+                self._removed.add(leave_id)
+            if self._changed is not None:
+                self._changed.add(leave_id)
+            self._maybe_compact()
+
+    # ---- queries ----
+
+    def overlapping(self, start_date, end_date, statuses=None, exclude_leave_id=None, exclude_employee_id=None):
+        """Entries overlapping the inclusive date range, ordered by (start, id)"""
+        self.ensure_built()
+        start, end = start_date.toordinal(), end_date.toordinal()
+        found = []
+        with self._lock:
+            _query_tree(self._tree, start, end, found)
+            if self._removed:
+                found = [e for e in found if e[ID] not in self._removed]
+            found += [e for e in self._overlay.values() if e[START] <= end and e[END] >= start]
+        return sorted(
+            (
+                e for e in found
+                if (statuses is None or e[STATUS] in statuses)
+                and e[ID] != exclude_leave_id
+                and (exclude_employee_id is None or e[EMPLOYEE] != exclude_employee_id)
+            ),
+            key=lambda e: (e[START], e[ID])
+        )
+
+    def on_date(self, day, statuses=None):
+        """Stabbing query - entries covering a single day"""
+        return self.overlapping(day, day, statuses=statuses)
+
+    def __len__(self):
+        self.ensure_built()
+        return len(self._entries)
+
+    # ---- consistency ----
+
+    def sync_from_db(self):
+        """
+        Apply leaves saved (by any process) since the last sync - an index range scan on updated_at
+
+        Catches creates, edits, cancellations and bulk_update paths that set
+        updated_at. Deletes and writes that leave updated_at alone (raw SQL,
+        QuerySet.update) are only caught by verify_against_db.
+        """
+        from .models import LeaveRequest
+        self.ensure_built()
+        started = timezone.now()
+        rows = LeaveRequest.objects.filter(updated_at__gte=self._synced_at - SYNC_OVERLAP).values_list(
+            'id', 'start_date', 'end_date', 'employee_id', 'status'
+        )
+        count = 0
+        for leave_id, start, end, employee_id, status in rows.iterator():
+            self.upsert(leave_id, start, end, employee_id, status)
+            count += 1
+        self._synced_at = started
+        return count
+
+    def verify_against_db(self, repair=True):
+        """
+        Compare the index with the database (a full scan of the indexed leaves)
+
+        Returns a dict of missing/stale/extra leave ids. With repair=True the
+        differences are applied like any other write.
+        """
+        self.ensure_built()
+        started = timezone.now()
+        expected = self._load_entries()
+        with self._lock:
+            actual = self._entries
+            missing = sorted(expected.keys() - actual.keys())
+            extra = sorted(actual.keys() - expected.keys())
+            stale = sorted(leave_id for leave_id in expected.keys() & actual.keys() if expected[leave_id] != actual[leave_id])
+            if repair:
+                for leave_id in missing + stale:
+                    entry = expected[leave_id]
+                    self._apply(leave_id, entry)
+                for leave_id in extra:
+                    self.remove(leave_id)
+                self._synced_at = max(self._synced_at, started)
+        if missing or extra or stale:
+            logger.warning(
+                f"Leave index out of sync: {len(missing)} missing, {len(stale)} stale, {len(extra)} extra"
+                f"{' (rebuilt)' if repair else ''}"
+            )
+        return {'missing': missing, 'stale': stale, 'extra': extra, 'size': len(expected)}
+
+
+leave_index = LeaveIntervalIndex(rebuild_threshold=getattr(settings, 'LEAVE_INDEX_REBUILD_THRESHOLD', 256))
+
+_verifier_started = False
+
+
+def leave_changed(leave):
+    """Index a saved leave once its transaction commits (rolled back writes never land)"""
+    transaction.on_commit(lambda: leave_index.upsert_leave(leave))
+
+
+def leaves_changed(leaves):
+    """Explicit hook for bulk_update paths (signals do not fire there)"""
+    leaves = list(leaves)
+    transaction.on_commit(lambda: [leave_index.upsert_leave(leave) for leave in leaves])
+
+
+def leave_deleted(leave_id):
+    transaction.on_commit(lambda: leave_index.remove(leave_id))
+
+
+def _verify_periodically(interval, full_interval):
+    import time
+    from django.db import connection
+    last_full = time.monotonic()
+    while True:
+        time.sleep(interval)
+        try:
+            if full_interval and time.monotonic() - last_full >= full_interval:
+                leave_index.verify_against_db(repair=True)
+                last_full = time.monotonic()
+            else:
+                leave_index.sync_from_db()
+        except Exception as e:
+            logger.error(f"Error syncing leave index: {e}")
+        finally:
+            connection.close()
+
+
+def warm_up():
+    """
+    Build the index at process start and start the periodic sync
+
+    Writes from other worker processes only reach this process through the
+    sync. Every LEAVE_INDEX_VERIFY_INTERVAL seconds it reads the leaves saved
+    since the last sync (by updated_at), so other workers' saves and status
+    changes are at most that stale. Every LEAVE_INDEX_FULL_VERIFY_INTERVAL
+    seconds a full comparison with the database replaces the sync. That also
+    catches deletes and writes that leave updated_at alone (raw SQL,
+    QuerySet.update). 0 disables the sync / the full check.
+    """
+    global _verifier_started
+    try:
+        leave_index.build()
+    except Exception as e:
+        logger.error(f"Error building leave index: {e}")
+        return
+    interval = getattr(settings, 'LEAVE_INDEX_VERIFY_INTERVAL', 60)
+    full_interval = getattr(settings, 'LEAVE_INDEX_FULL_VERIFY_INTERVAL', 3600)
+    if interval and not _verifier_started:
+        _verifier_started = True
+        threading.Thread(target=_verify_periodically, args=(interval, full_interval), daemon=True).start()
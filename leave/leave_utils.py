@@ -1,7 +1,11 @@
 from django.contrib.auth.models import User
 from django.db.models import Q
 from .models import LeaveRequest, LeaveBalance, LeavePolicy, UserRole, Department
-from datetime import datetime, timedelta
+from .working_days import leave_working_days
+from .occupancy import APPROVED_STATUSES, ACTIVE_STATUSES, PENDING_STATUSES, has_occupancy
+from .leave_index import leave_index
+from .tracing import span
+from datetime import date, datetime, timedelta
 import logging
 
 logger = logging.getLogger(__name__)
@@ -67,12 +71,13 @@ def get_paternity_leave_info(user):
             'status_text': "First Paternity Leave"
         }
 
+@span()
 def get_leave_balance(slack_user_id):
     """
     Get leave balance for a user with dynamic maternity/paternity info
     
     FEATURES:
-    - Monthly reset for casual/sick leave
+    - Monthly reset for casual/sick leave (done by rollover_leave_balances, not on read)
     - Dynamic maternity leave calculation (182 days for 1st/2nd, 84 days for 3rd+)
     - Dynamic paternity leave calculation (16 days per occurrence)
     - Safe handling of missing balance records
@@ -80,13 +85,13 @@ def get_leave_balance(slack_user_id):
     from .slack_utils import get_or_create_user
     
     user = get_or_create_user(slack_user_id)
-    balance = LeaveBalance.objects.get_or_create(user=user)[0]
-    balance.reset_monthly_balance()
+    # Read-only: the monthly rollover job resets rows, stale rows are read as reset
+    balance = LeaveBalance.objects.filter(user=user).first() or LeaveBalance(user=user)
     
     # Safely get used days
-    casual_used = int(getattr(balance, 'casual_used', 0))
+    casual_used = int(balance.get_used_days('CASUAL'))
     casual_remaining = int(balance.get_remaining_days('CASUAL'))
-    sick_used = int(getattr(balance, 'sick_used', 0))
+    sick_used = int(balance.get_used_days('SICK'))
     sick_remaining = int(balance.get_remaining_days('SICK'))
     
     # Get dynamic maternity and paternity leave info
@@ -110,82 +115,125 @@ def get_leave_balance(slack_user_id):
     
     return leave_balances
 
+def rollover_leave_balances(period=None, user_ids=None):
+    """
+    Reset casual/sick balances for a new month as one set-based UPDATE
+    
+    Only rows not yet rolled over for the period are touched, so running it
+    again for the same month is a no-op. Returns the number of rows updated.
+    """
+    from django.utils import timezone
+    period = (period or timezone.now().date()).replace(day=1)
+    
+    balances = LeaveBalance.objects.filter(last_reset_date__lt=period)
+    if user_ids is not None:
+        balances = balances.filter(user_id__in=user_ids)
+    
+    return balances.update(
+        casual_leave=LeaveBalance.MONTHLY_CASUAL,
+        sick_leave=LeaveBalance.MONTHLY_SICK,
+        casual_used=0,
+        sick_used=0,
+        last_reset_date=period
+    )
+
 def update_leave_balance_on_approval(leave_request):
     """Update leave balance when a leave request is approved"""
     try:
         balance, created = LeaveBalance.objects.get_or_create(user=leave_request.employee)
+        # Don't add this month's usage on top of last month's counters
+        balance.reset_monthly_balance()
         
         if leave_request.leave_type == 'CASUAL':
-            balance.casual_used += (leave_request.end_date - leave_request.start_date).days + 1
+            balance.casual_used += leave_working_days(leave_request)
         elif leave_request.leave_type == 'SICK':
-            balance.sick_used += (leave_request.end_date - leave_request.start_date).days + 1
+            balance.sick_used += leave_working_days(leave_request)
         
         balance.save()
         logger.info(f"Updated leave balance for {leave_request.employee.username}")
     except Exception as e:
         logger.error(f"Error updating leave balance: {e}")
 
+def empty_conflicts():
+    """Conflict result with nobody off"""
+    return {
+        'approved_count': 0,
+        'pending_count': 0,
+        'approved_details': [],
+        'pending_details': [],
+        'approved_names': [],
+        'pending_names': []
+    }
+
+@span()
 def get_conflicts_details(start_date, end_date, exclude_user=None):
     """Get detailed conflicts with employee names, departments, and date ranges"""
-    conflicts = LeaveRequest.objects.filter(
-        Q(start_date__lte=end_date) & Q(end_date__gte=start_date),
-        status__in=['APPROVED', 'PENDING']
+    # Overlap lookup comes from the in-memory interval index - no DB scan
+    overlapping = leave_index.overlapping(
+        start_date, end_date,
+        statuses={'APPROVED', 'PENDING'},
+        exclude_employee_id=getattr(exclude_user, 'id', exclude_user)
     )
-    if exclude_user:
-        conflicts = conflicts.exclude(employee=exclude_user)
+    if not overlapping:
+        return empty_conflicts()
     
-    approved_leaves = conflicts.filter(status='APPROVED')
-    pending_leaves = conflicts.filter(status='PENDING')
+    # One query for the names/departments of the overlapping leaves
+    rows = {
+        leave_id: (username, department_name)
+        for leave_id, username, department_name in LeaveRequest.objects.filter(
+            id__in=[entry[0] for entry in overlapping]
+        ).values_list('id', 'employee__username', 'employee__userrole__department__name')
+    }
     
-    # Format approved leaves with detailed info
-    approved_details = []
-    for leave in approved_leaves:
-        user_role = UserRole.objects.filter(user=leave.employee).first()
-        department_name = user_role.department.name if user_role and user_role.department else 'No Department'
+    approved_details, pending_details = [], []
+    approved_names, pending_names = [], []
+    for leave_id, start, end, employee_id, status in overlapping:
+        if leave_id not in rows:
+            continue  # Deleted since the index last saw it
+        username, department_name = rows[leave_id]
+        leave_start, leave_end = date.fromordinal(start), date.fromordinal(end)
         
         # Format date range
-        if leave.start_date == leave.end_date:
-            date_str = leave.start_date.strftime('%Y-%m-%d')
+        if leave_start == leave_end:
+            date_str = leave_start.strftime('%Y-%m-%d')
         else:
-            date_str = f"{leave.start_date.strftime('%Y-%m-%d')} to {leave.end_date.strftime('%Y-%m-%d')}"
+            date_str = f"{leave_start.strftime('%Y-%m-%d')} to {leave_end.strftime('%Y-%m-%d')}"
         
-        approved_details.append(f"<@{leave.employee.username}> - {department_name} - {date_str}")
-    
-    # Format pending leaves with detailed info
-    pending_details = []
-    for leave in pending_leaves:
-        user_role = UserRole.objects.filter(user=leave.employee).first()
-        department_name = user_role.department.name if user_role and user_role.department else 'No Department'
-        
-        # Format date range
-        if leave.start_date == leave.end_date:
-            date_str = leave.start_date.strftime('%Y-%m-%d')
+        detail = f"<@{username}> - {department_name or 'No Department'} - {date_str}"
+        if status == 'APPROVED':
+            approved_details.append(detail)
+            approved_names.append(f"<@{username}>")
         else:
-            date_str = f"{leave.start_date.strftime('%Y-%m-%d')} to {leave.end_date.strftime('%Y-%m-%d')}"
-        
-        pending_details.append(f"<@{leave.employee.username}> - {department_name} - {date_str}")
+            pending_details.append(detail)
+            pending_names.append(f"<@{username}>")
     
     return {
         'approved_count': len(approved_details),
         'pending_count': len(pending_details),
         'approved_details': approved_details,
         'pending_details': pending_details,
-        'approved_names': [f"<@{leave.employee.username}>" for leave in approved_leaves],
-        'pending_names': [f"<@{leave.employee.username}>" for leave in pending_leaves]
+        'approved_names': approved_names,
+        'pending_names': pending_names
     }
 
+@span()
 def get_department_conflicts(start_date, end_date, department, exclude_user=None):
     """Get detailed department conflicts with employee names and date ranges"""
+    # Nobody else in the department is off in DailyOccupancy - no overlap scan
+    if not has_occupancy(start_date, end_date, department=department, exclude_user=exclude_user):
+        return empty_conflicts()
+    
+    # Same approved/pending status buckets as DailyOccupancy
     conflicts = LeaveRequest.objects.filter(
         Q(start_date__lte=end_date) & Q(end_date__gte=start_date),
-        status__in=['APPROVED', 'PENDING'],
+        status__in=ACTIVE_STATUSES,
         employee__userrole__department=department
-    )
+    ).select_related('employee')
     if exclude_user:
         conflicts = conflicts.exclude(employee=exclude_user)
     
-    approved_leaves = conflicts.filter(status='APPROVED')
-    pending_leaves = conflicts.filter(status='PENDING')
+    approved_leaves = conflicts.filter(status__in=APPROVED_STATUSES)
+    pending_leaves = conflicts.filter(status__in=PENDING_STATUSES)
     
     # Format approved leaves with detailed info
     approved_details = []
@@ -218,6 +266,7 @@ def get_department_conflicts(start_date, end_date, department, exclude_user=None
         'pending_names': [f"<@{leave.employee.username}>" for leave in pending_leaves]
     }
 
+@span()
 def get_team_conflicts(start_date, end_date, user, exclude_user=None):
     """Get detailed team conflicts with employee names, team names, and date ranges"""
     from .models import Team
@@ -232,19 +281,23 @@ def get_team_conflicts(start_date, end_date, user, exclude_user=None):
     team_conflicts_data = {}
     
     for team in user_teams:
-        # Get leave conflicts for this team's members
+        # Nobody else in the team is off in DailyOccupancy - no overlap scan
+        if not has_occupancy(start_date, end_date, team=team, exclude_user=exclude_user):
+            continue
+        
+        # Get leave conflicts for this team's members (DailyOccupancy status buckets)
         team_conflicts = LeaveRequest.objects.filter(
             Q(start_date__lte=end_date) & Q(end_date__gte=start_date),
-            status__in=['APPROVED', 'PENDING'],
+            status__in=ACTIVE_STATUSES,
             employee__in=team.members.all()
-        )
+        ).select_related('employee')
         
         if exclude_user:
             team_conflicts = team_conflicts.exclude(employee=exclude_user)
         
-        if team_conflicts.exists():
-            approved_leaves = team_conflicts.filter(status='APPROVED')
-            pending_leaves = team_conflicts.filter(status='PENDING')
+        approved_leaves = list(team_conflicts.filter(status__in=APPROVED_STATUSES))
+        pending_leaves = list(team_conflicts.filter(status__in=PENDING_STATUSES))
+        if approved_leaves or pending_leaves:
             
             # Format approved leaves with detailed info
             approved_details = []
@@ -279,11 +332,23 @@ def get_team_conflicts(start_date, end_date, user, exclude_user=None):
     
     return team_conflicts_data if team_conflicts_data else None
 
+def get_user_department_name(user, default='No Department'):
+    """
+    Department name for a user via the userrole relation
+
+    Free when the role/department were loaded with
+    select_related('employee__userrole__department'); one query otherwise.
+    """
+    try:
+        user_role = user.userrole
+    except UserRole.DoesNotExist:
+        return default
+    return user_role.department.name if user_role.department else default
+
 def create_leave_block(leave, display_options):
     """Create a formatted block for a single leave entry"""
-    days = (leave.end_date - leave.start_date).days + 1
-    user_role = UserRole.objects.filter(user=leave.employee).first()
-    department = user_role.department.name if user_role and user_role.department else 'No Dept'
+    days = leave_working_days(leave)
+    department = get_user_department_name(leave.employee, default='No Dept')
     
     # Status emoji
     status_emoji_map = {
@@ -313,15 +378,15 @@ def create_leave_block(leave, display_options):
         text += f"\n💬 Reason: {reason_preview}"
     
     if 'SHOW_CONFLICTS' in display_options:
-        # Check for conflicts with this leave
-        conflicts = LeaveRequest.objects.filter(
-            start_date__lte=leave.end_date,
-            end_date__gte=leave.start_date,
-            status__in=['APPROVED', 'PENDING']
-        ).exclude(id=leave.id)
+        # Check for conflicts with this leave (interval index, no query)
+        conflicts = leave_index.overlapping(
+            leave.start_date, leave.end_date,
+            statuses={'APPROVED', 'PENDING'},
+            exclude_leave_id=leave.id
+        )
         
-        if conflicts.exists():
-            text += f"\n⚠️ Conflicts with {conflicts.count()} other leave(s)"
+        if conflicts:
+            text += f"\n⚠️ Conflicts with {len(conflicts)} other leave(s)"
     
     return {
         "type": "section",
@@ -0,0 +1,202 @@
+import json
+import statistics
+import time
+from datetime import date, timedelta
+
+from django.core.management.base import BaseCommand, CommandError
+from django.test.utils import override_settings
+
+from leave import json_codec
+
+
+def _text(text):
+    return {'type': 'plain_text', 'text': text, 'emoji': True}
+
+
+def _leave_section(index, day):
+    return {
+        'type': 'section',
+        'block_id': f'leave_{index}',
+        'text': {'type': 'mrkdwn', 'text': (
+            f"📄 *Leave #{1000 + index}*\n*Employee:* <@U{index:08d}>\n*Department:* Engineering\n"
+            f"*Duration:* {day} to {day + timedelta(days=2)} (3 days)\n*Reason:* Family function — travel to Zürich\n"
+            f"*Status:* PENDING APPROVAL"
+        )},
+        'accessory': {
+            'type': 'overflow', 'action_id': f'leave_menu_{index}',
+            'options': [{'text': _text(label), 'value': f'{1000 + index}|{label.upper()}'} for label in ('Approve', 'Reject', 'Docs')],
+        },
+    }
+
+
+def _view_submission(blocks):
+    """A view_submission as Slack sends it - the whole modal view is echoed back along with its state"""
+    day = date(2025, 3, 3)
+    view_blocks = [{'type': 'header', 'text': _text('Bulk approval')}]
+    view_blocks += [_leave_section(index, day + timedelta(days=index)) for index in range(blocks)]
+    view_blocks.append({'type': 'input', 'block_id': 'comment', 'label': _text('Comment'), 'element': {
+        'type': 'plain_text_input', 'action_id': 'comment_input', 'multiline': True}})
+    return {
+        'type': 'view_submission',
+        'team': {'id': 'T0001', 'domain': 'example'},
+        'user': {'id': 'U00000001', 'username': 'manager', 'name': 'manager', 'team_id': 'T0001'},
+        'api_app_id': 'A0001',
+        'token': 'verification-token',
+        'trigger_id': '1234567890.1234567890.abcdef0123456789abcdef0123456789',
+        'view': {
+            'id': 'V0001', 'team_id': 'T0001', 'type': 'modal', 'callback_id': 'bulk_approval_modal',
+            'private_metadata': '', 'hash': '1700000000.abcdefgh', 'title': _text('Bulk approval'),
+            'submit': _text('Apply'), 'close': _text('Cancel'), 'blocks': view_blocks,
+            'state': {'values': {
+                'bulk_select': {'leave_select': {'type': 'checkboxes', 'selected_options': [
+                    {'text': _text(f'Leave #{1000 + index}'), 'value': str(1000 + index)} for index in range(blocks)
+                ]}},
+                'comment': {'comment_input': {'type': 'plain_text_input', 'value': 'Approved for the release week'}},
+            }},
+        },
+        'response_urls': [],
+        'is_enterprise_install': False,
+    }
+
+
+def _block_actions(blocks):
+    """A block_actions payload - carries the message the button sat in"""
+    day = date(2025, 3, 3)
+    return {
+        'type': 'block_actions',
+        'user': {'id': 'U00000001', 'username': 'manager', 'team_id': 'T0001'},
+        'api_app_id': 'A0001',
+        'container': {'type': 'message', 'message_ts': '1700000000.000100', 'channel_id': 'C0001'},
+        'trigger_id': '1234567890.1234567890.abcdef0123456789abcdef0123456789',
+        'channel': {'id': 'C0001', 'name': 'leave-approvals'},
+        'message': {
+            'type': 'message', 'user': 'B0001', 'ts': '1700000000.000100', 'text': 'New leave request',
+            'blocks': [_leave_section(index, day + timedelta(days=index)) for index in range(blocks)],
+        },
+        'state': {'values': {'supervisor_comment': {'comment_input': {'type': 'plain_text_input', 'value': 'OK'}}}},
+        'actions': [{'action_id': 'approve_leave', 'block_id': 'leave_0', 'value': '1000|APPROVE', 'type': 'button',
+                     'action_ts': '1700000001.000200'}],
+    }
+
+
+def _event_callback():
+    return {
+        'token': 'verification-token', 'team_id': 'T0001', 'api_app_id': 'A0001', 'type': 'event_callback',
+        'event_id': 'Ev0001', 'event_time': 1700000000,
+        'event': {'type': 'message', 'channel': 'D0001', 'user': 'U00000002', 'text': 'I need leave tomorrow',
+                  'ts': '1700000000.000300', 'channel_type': 'im'},
+    }
+
+
+def _block_kit_response(blocks):
+    """A response_action / message body as handlers build it (what JsonResponse encodes)"""
+    day = date(2025, 3, 3)
+    return {
+        'response_type': 'ephemeral',
+        'text': 'Your leave requests',
+        'blocks': [{'type': 'header', 'text': _text('📋 My leave requests')}] + [
+            _leave_section(index, day + timedelta(days=index)) for index in range(blocks)
+        ],
+    }
+
+
+def builtin_payloads():
+    """(name, payload) pairs shaped like the Slack traffic the app handles, from small to the 50/100-block limits"""
+    return [
+        ('event_callback', _event_callback()),
+        ('block_actions (1 block)', _block_actions(1)),
+        ('block_actions (50 blocks)', _block_actions(50)),
+        ('view_submission (10 blocks)', _view_submission(10)),
+        ('view_submission (100 blocks)', _view_submission(100)),
+        ('response (10 blocks)', _block_kit_response(10)),
+        ('response (50 blocks)', _block_kit_response(50)),
+    ]
+
+
+def _time_per_call(func, repeat, number):
+    """Median seconds per call over `repeat` rounds of `number` calls"""
+    rounds = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        for _ in range(number):
+            func()
+        rounds.append((time.perf_counter() - started) / number)
+    return statistics.median(rounds)
+
+
+class Command(BaseCommand):
+    help = (
+        "Micro-benchmark leave.json_codec: parse and encode Slack payloads and Block Kit responses with the "
+        "stdlib json backend and with orjson"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--payloads', help="JSON lines file of recorded payloads (default: built-in payload set)")
+        parser.add_argument('--repeat', type=int, default=7, help="Timing rounds per measurement (default 7)")
+        parser.add_argument('--min-time', type=float, default=0.05, help="Seconds per timing round (default 0.05)")
+        parser.add_argument('--json', dest='json_path', help="Also write the results to this file")
+
+    def handle(self, *args, **options):
+        if json_codec.orjson is None:
+            raise CommandError("orjson is not installed - nothing to compare the stdlib backend with")
+        payloads = self._load(options['payloads']) if options['payloads'] else builtin_payloads()
+
+        results = []
+        header = f"{'payload':<30} {'bytes':>7}  {'op':<13} {'json µs':>9} {'orjson µs':>10} {'speedup':>8}"
+        self.stdout.write(header)
+        self.stdout.write('-' * len(header))
+        for name, payload in payloads:
+            raw = json.dumps(payload)
+            for op, call in (
+                ('loads', lambda: json_codec.loads(raw)),
+                ('dumps', lambda: json_codec.dumps(payload)),
+                ('JsonResponse', lambda: json_codec.JsonResponse(payload)),
+            ):
+                timings = {}
+                for backend in ('json', 'orjson'):
+                    with override_settings(LEAVE_JSON_BACKEND=backend):
+                        number = self._calibrate(call, options['min_time'])
+                        timings[backend] = _time_per_call(call, options['repeat'], number)
+                speedup = timings['json'] / timings['orjson']
+                results.append({
+                    'payload': name, 'bytes': len(raw.encode()), 'op': op,
+                    'json_us': round(timings['json'] * 1e6, 2), 'orjson_us': round(timings['orjson'] * 1e6, 2),
+                    'speedup': round(speedup, 2),
+                })
+                self.stdout.write(
+                    f"{name[:30]:<30} {len(raw.encode()):>7}  {op:<13} {timings['json'] * 1e6:>9.1f} "
+                    f"{timings['orjson'] * 1e6:>10.1f} {speedup:>7.1f}x"
+                )
+
+        if options['json_path']:
+            with open(options['json_path'], 'w') as fh:
+                json.dump({'results': results}, fh, indent=2)
+        total_json = sum(entry['json_us'] for entry in results)
+        total_orjson = sum(entry['orjson_us'] for entry in results)
+        self.stdout.write(self.style.SUCCESS(
+            f"All payloads and ops: {total_json:.0f} µs with json, {total_orjson:.0f} µs with orjson "
+            f"({total_json / total_orjson:.1f}x)"
+        ))
+
+    def _load(self, path):
+        payloads = []
+        with open(path) as fh:
+            for number, line in enumerate(fh, 1):
+                if not line.strip():
+                    continue
+                payload = json.loads(line)
+                label = payload.get('type') or 'payload' if isinstance(payload, dict) else 'payload'
+                payloads.append((f"{number}: {label}", payload))
+        if not payloads:
+            raise CommandError(f"No payloads in {path}")
+        return payloads
+
+    def _calibrate(self, call, min_time):
+        number = 1
+        while True:
+            started = time.perf_counter()
+            for _ in range(number):
+                call()
+            if time.perf_counter() - started >= min_time:
+                return number
+            number *= 2
@@ -0,0 +1,468 @@
+import json
+import os
+import random
+import statistics
+import subprocess
+import tempfile
+import threading
+import time
+import logging
+from collections import Counter, defaultdict
+from datetime import timedelta
+from urllib.parse import urlencode
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test import Client
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+
+from leave.fake_slack import FakeSlackServer
+
+# Default payload mix (kind -> weight)
+DEFAULT_MIX = {
+    'command_my_leaves': 3,
+    'command_leave_balance': 3,
+    'command_apply_leave': 2,
+    'leave_request_modal': 3,
+    'approve_leave': 2,
+}
+
+
+def _percentile(values, pct):
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, int(round(pct / 100.0 * (len(ordered) - 1)))))
+    return ordered[index]
+
+
+class LogCounter(logging.Handler):
+    """Counts app log records by level so warnings/errors show up in the results"""
+
+    def __init__(self):
+        super().__init__(level=logging.WARNING)
+        self.counts = Counter()
+
+    def emit(self, record):
+        self.counts[record.levelname] += 1
+
+
+class ThreadTracker:
+    """Counts and remembers threads started while installed (fake Slack server threads excluded)"""
+
+    def __init__(self, ignore_owner):
+        self.ignore_owner = ignore_owner
+        self.lock = threading.Lock()
+        self.threads = []
+        self.by_spawner = defaultdict(int)
+        self.background_queries = 0
+        self._original_start = threading.Thread.start
+
+    def install(self):
+        tracker = self
+
+        def start(thread, *args, **kwargs):
+            target = getattr(thread, '_target', None)
+            if getattr(target, '__self__', None) is not tracker.ignore_owner:
+                with tracker.lock:
+                    tracker.threads.append(thread)
+                    tracker.by_spawner[threading.get_ident()] += 1
+                tracker._count_queries(thread)
+            return tracker._original_start(thread, *args, **kwargs)
+
+        threading.Thread.start = start
+
+    def uninstall(self):
+        threading.Thread.start = self._original_start
+
+    def _count_queries(self, thread):
+        run = thread.run
+        tracker = self
+
+        def counted_run():
+            from django.db import connection as thread_connection
+
+            def counter(execute, sql, params, many, context):
+                with tracker.lock:
+                    tracker.background_queries += 1
+                return execute(sql, params, many, context)
+
+            with thread_connection.execute_wrapper(counter):
+                run()
+
+        thread.run = counted_run
+
+    def spawned_by_current(self):
+        with self.lock:
+            return self.by_spawner[threading.get_ident()]
+
+    def drain(self, timeout):
+        deadline = time.perf_counter() + timeout
+        for thread in list(self.threads):
+            thread.join(max(0.0, deadline - time.perf_counter()))
+        return sum(1 for thread in self.threads if thread.is_alive())
+
+
+class Command(BaseCommand):
+    help = (
+        "Benchmark the Slack ingress (leave.views.slack_events) with a replayed payload mix against "
+        "a throwaway test database and the in-process fake Slack API. Reports throughput, latency "
+        "percentiles, DB queries per request and threads spawned, and writes the results as JSON."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=500, help="Requests to replay (default 500)")
+        parser.add_argument('--concurrency', type=int, default=1, help="Client threads (default 1)")
+        parser.add_argument('--employees', type=int, default=50, help="Seeded employees (default 50)")
+        parser.add_argument('--managers', type=int, default=5, help="Seeded managers (default 5)")
+        parser.add_argument('--pending', type=int, default=200, help="Seeded pending leaves to approve (default 200)")
+        parser.add_argument('--mix', default=None,
+                            help=f"Payload weights as kind=weight,... (default {','.join(f'{k}={v}' for k, v in DEFAULT_MIX.items())})")
+        parser.add_argument('--slack-latency', type=float, default=0, help="Fake Slack latency per call in ms")
+        parser.add_argument('--rate-limit-rate', type=float, default=0.0, help="Share of fake Slack calls answered with 429")
+        parser.add_argument('--failure-rate', type=float, default=0.0, help="Share of fake Slack calls answered with ok=false")
+        parser.add_argument('--drain-timeout', type=float, default=60, help="Seconds to wait for background threads (default 60)")
+        parser.add_argument('--seed', type=int, default=1)
+        parser.add_argument('--output', default=None,
+                            help="Where to write the JSON results (default benchmarks/bench_slack_ingress.json, gitignored)")
+        parser.add_argument('--compare', default=None, help="Previous results JSON to print deltas against")
+        parser.add_argument('--with-logging', action='store_true', help="Keep app INFO logging on (off by default)")
+
+    def handle(self, *args, **options):
+        mix = self._parse_mix(options['mix'])
+        if options['requests'] < 1 or options['concurrency'] < 1:
+            raise CommandError("--requests and --concurrency must be at least 1")
+        app_logger = logging.getLogger('leave')
+        log_counter = LogCounter()
+        app_logger.addHandler(log_counter)
+        propagate = app_logger.propagate
+        if not options['with_logging']:
+            app_logger.propagate = False
+
+        self.rng = random.Random(options['seed'])
+        test_db = self._create_test_db()
+        server = FakeSlackServer(
+            latency_ms=options['slack_latency'],
+            rate_limit_rate=options['rate_limit_rate'],
+            retry_after=0,
+            failure_rate=options['failure_rate'],
+            seed=options['seed'],
+        ).start()
+
+        from leave import slack_utils
+        original_base_url = slack_utils.slack_client.base_url
+        slack_utils.slack_client.base_url = server.base_url
+        tracker = ThreadTracker(ignore_owner=server.httpd)
+        try:
+            self._seed(options)
+            plan = [self._pick(mix) for _ in range(options['requests'])]
+            tracker.install()
+            results, wall = self._replay(plan, options['concurrency'], tracker)
+            still_running = tracker.drain(options['drain_timeout'])
+            drained_at = time.perf_counter()
+            report = self._report(results, wall, tracker, still_running, drained_at - self._started, server, options, mix)
+            report['log_records'] = dict(log_counter.counts)
+        finally:
+            tracker.uninstall()
+            slack_utils.slack_client.base_url = original_base_url
+            server.stop()
+            connection.creation.destroy_test_db(test_db, verbosity=0)
+            app_logger.removeHandler(log_counter)
+            app_logger.propagate = propagate
+
+        output = options['output'] or os.path.join(settings.BASE_DIR, 'benchmarks', 'bench_slack_ingress.json')
+        os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+        with open(output, 'w') as fh:
+            json.dump(report, fh, indent=2, sort_keys=True)
+        self._print(report, options['compare'])
+        self.stdout.write(self.style.SUCCESS(f"Results written to {output}"))
+
+    # ---- setup ----
+
+    def _parse_mix(self, raw):
+        if not raw:
+            return dict(DEFAULT_MIX)
+        mix = {}
+        for part in raw.split(','):
+            kind, _, weight = part.partition('=')
+            kind = kind.strip()
+            if kind not in DEFAULT_MIX:
+                raise CommandError(f"Unknown payload kind {kind!r}. Available: {', '.join(DEFAULT_MIX)}")
+            try:
+                mix[kind] = float(weight or 1)
+            except ValueError:
+                raise CommandError(f"Bad weight for {kind}: {weight!r}")
+        return mix
+
+    def _create_test_db(self):
+        """Throwaway database with tables created straight from the models"""
+        test_settings = settings.DATABASES['default'].setdefault('TEST', {})
+        test_settings['MIGRATE'] = False
+        if connection.vendor == 'sqlite' and not test_settings.get('NAME'):
+            # A file rather than shared-cache memory, so background writers wait on locks instead of failing
+            test_settings['NAME'] = os.path.join(tempfile.gettempdir(), f'bench_slack_ingress_{os.getpid()}.sqlite3')
+        return connection.creation.create_test_db(verbosity=0, autoclobber=True, serialize=False)
+
+    def _seed(self, options):
+        from django.contrib.auth.models import User
+        from leave.models import Department, LeaveApproverAssignment, LeaveBalance, LeaveRequest, UserRole
+
+        departments = [Department.objects.create(name=name) for name in ('Engineering', 'Operations', 'Sales')]
+        self.employees = [f"U{i:010d}" for i in range(1, options['employees'] + 1)]
+        self.managers = [f"UM{i:09d}" for i in range(1, options['managers'] + 1)]
+        for index, username in enumerate(self.employees + self.managers):
+            user = User.objects.create(username=username, email=f"{username.lower()}@example.com")
+            is_manager = username in self.managers
+            UserRole.objects.create(
+                user=user,
+                role='MANAGER' if is_manager else 'EMPLOYEE',
+                is_admin=is_manager,
+                department=departments[index % len(departments)]
+            )
+            LeaveBalance.objects.create(user=user)
+
+        today = timezone.now().date()
+        users = {user.username: user for user in User.objects.filter(username__in=self.employees)}
+        self.pending = []
+        self.approvers = {}  # leave id -> managers it was sent to
+        assignments = []
+        for _ in range(options['pending']):
+            start = today + timedelta(days=self.rng.randrange(1, 90))
+            # Sent to up to two managers, as the request modal does, so approving notifies the others in their threads
+            managers = self.rng.sample(self.managers, min(2, len(self.managers)))
+            leave = LeaveRequest.objects.create(
+                employee=users[self.rng.choice(self.employees)],
+                leave_type='CASUAL',
+                start_date=start,
+                end_date=start + timedelta(days=self.rng.randrange(0, 3)),
+                reason='Benchmark leave',
+                status='PENDING',
+                selected_managers=','.join(managers)
+            )
+            assignments.extend(
+                LeaveApproverAssignment(
+                    leave=leave, manager_slack_id=manager_id, channel=manager_id,
+                    thread_ts=f"{int(time.time())}.{leave.id:06d}"
+                )
+                for manager_id in managers
+            )
+            self.pending.append(leave.id)
+            self.approvers[leave.id] = managers
+        LeaveApproverAssignment.objects.bulk_create(assignments)
+        self.pending_lock = threading.Lock()
+
+    def _pick(self, mix):
+        kinds, weights = zip(*mix.items())
+        return self.rng.choices(kinds, weights=weights)[0]
+
+    # ---- payloads ----
+
+    def _command(self, command, user_id, text=''):
+        return urlencode({
+            'command': command,
+            'user_id': user_id,
+            'user_name': user_id.lower(),
+            'text': text,
+            'trigger_id': f"trigger.{self.rng.randrange(10 ** 9)}",
+            'channel_id': f"D{user_id[1:]}",
+        })
+
+    def _interaction(self, payload):
+        return urlencode({'payload': json.dumps(payload)})
+
+    def _payload(self, kind, rng):
+        employee = rng.choice(self.employees)
+        if kind == 'command_my_leaves':
+            return self._command('/my-leaves', employee)
+        if kind == 'command_leave_balance':
+            return self._command('/leave-balance', employee)
+        if kind == 'command_apply_leave':
+            return self._command('/apply-leave', employee)
+        if kind == 'leave_request_modal':
+            start = timezone.now().date() + timedelta(days=rng.randrange(1, 60))
+            end = start + timedelta(days=rng.randrange(0, 4))
+            return self._interaction({
+                'type': 'view_submission',
+                'user': {'id': employee},
+                'view': {
+                    'callback_id': 'leave_request_modal',
+                    'state': {'values': {
+                        'leave_type': {'leave_type_select': {'selected_option': {'value': rng.choice(['CASUAL', 'SICK'])}}},
+                        'start_date': {'start_date_select': {'selected_date': start.isoformat()}},
+                        'end_date': {'end_date_select': {'selected_date': end.isoformat()}},
+                        'reason': {'reason_input': {'value': 'Benchmark request'}},
+                        'backup_person': {'backup_person_input': {'value': None}},
+                    }}
+                }
+            })
+        if kind == 'approve_leave':
+            with self.pending_lock:
+                leave_id = self.pending.pop() if self.pending else None
+            if leave_id is None:
+                return self._command('/leave-balance', employee)
+            manager = rng.choice(self.approvers[leave_id])
+            return self._interaction({
+                'type': 'block_actions',
+                'user': {'id': manager},
+                'channel': {'id': f"D{manager[1:]}"},
+                'message': {'ts': f"{int(time.time())}.000100"},
+                'actions': [{'action_id': 'approve_leave', 'value': f"{leave_id}|APPROVE"}],
+                'state': {'values': {}},
+            })
+        raise CommandError(f"Unknown payload kind {kind}")
+
+    # ---- run ----
+
+    def _replay(self, plan, concurrency, tracker):
+        results = []
+        results_lock = threading.Lock()
+        chunks = [plan[i::concurrency] for i in range(concurrency)]
+
+        def worker(kinds, seed):
+            client = Client()
+            rng = random.Random(seed)
+            local = []
+            try:
+                for kind in kinds:
+                    body = self._payload(kind, rng)
+                    spawned_before = tracker.spawned_by_current()
+                    with CaptureQueriesContext(connection) as queries:
+                        started = time.perf_counter()
+                        try:
+                            response = client.post('/slack/events/', body, content_type='application/x-www-form-urlencoded')
+                            status = response.status_code
+                            error = status >= 400 or b'"Error' in response.content[:200]
+                        except Exception:
+                            status, error = 0, True
+                        elapsed = time.perf_counter() - started
+                    local.append({
+                        'kind': kind,
+                        'latency_ms': elapsed * 1000,
+                        'queries': len(queries.captured_queries),
+                        'threads': tracker.spawned_by_current() - spawned_before,
+                        'status': status,
+                        'error': error,
+                    })
+            finally:
+                with results_lock:
+                    results.extend(local)
+                if threading.current_thread() is not threading.main_thread():
+                    connection.close()
+
+        self._started = time.perf_counter()
+        if concurrency == 1:
+            worker(chunks[0], self.rng.random())
+        else:
+            workers = [
+                threading.Thread(target=worker, args=(chunk, self.rng.random()))
+                for chunk in chunks
+            ]
+            tracker.uninstall()  # Client threads are not app threads
+            for thread in workers:
+                thread.start()
+            tracker.install()
+            for thread in workers:
+                thread.join()
+        return results, time.perf_counter() - self._started
+
+    # ---- reporting ----
+
+    def _summary(self, rows, wall):
+        latencies = [row['latency_ms'] for row in rows]
+        queries = [row['queries'] for row in rows]
+        return {
+            'requests': len(rows),
+            'errors': sum(1 for row in rows if row['error']),
+            'throughput_rps': round(len(rows) / wall, 2) if wall else 0.0,
+            'latency_ms': {
+                'mean': round(statistics.fmean(latencies), 3) if latencies else 0.0,
+                'p50': round(_percentile(latencies, 50), 3),
+                'p90': round(_percentile(latencies, 90), 3),
+                'p99': round(_percentile(latencies, 99), 3),
+                'max': round(max(latencies), 3) if latencies else 0.0,
+            },
+            'queries_per_request': {
+                'mean': round(statistics.fmean(queries), 2) if queries else 0.0,
+                'max': max(queries) if queries else 0,
+            },
+            'threads_spawned': sum(row['threads'] for row in rows),
+        }
+
+    def _git_commit(self):
+        try:
+            return subprocess.run(
+                ['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True, timeout=5, cwd=settings.BASE_DIR
+            ).stdout.strip() or None
+        except Exception:
+            return None
+
+    def _report(self, results, wall, tracker, still_running, drain_seconds, server, options, mix):
+        by_kind = defaultdict(list)
+        for row in results:
+            by_kind[row['kind']].append(row)
+        return {
+            'benchmark': 'slack_ingress',
+            'commit': self._git_commit(),
+            'timestamp': timezone.now().isoformat(),
+            'config': {
+                'requests': options['requests'],
+                'concurrency': options['concurrency'],
+                'employees': options['employees'],
+                'managers': options['managers'],
+                'pending': options['pending'],
+                'mix': mix,
+                'slack_latency_ms': options['slack_latency'],
+                'rate_limit_rate': options['rate_limit_rate'],
+                'failure_rate': options['failure_rate'],
+                'seed': options['seed'],
+                'database': connection.vendor,
+            },
+            'overall': self._summary(results, wall),
+            'by_kind': {kind: self._summary(rows, wall) for kind, rows in sorted(by_kind.items())},
+            'background': {
+                'threads_started': len(tracker.threads),
+                'threads_still_running': still_running,
+                'queries': tracker.background_queries,
+                'seconds_until_drained': round(drain_seconds, 3),
+            },
+            'slack': server.state.stats(),
+        }
+
+    def _print(self, report, compare_path):
+        previous = None
+        if compare_path:
+            with open(compare_path) as fh:
+                previous = json.load(fh)
+
+        def delta(current, path):
+            if not previous:
+                return ''
+            value = previous
+            for key in path:
+                value = value.get(key, {}) if isinstance(value, dict) else {}
+            if not isinstance(value, (int, float)) or not value:
+                return ''
+            return f" ({(current - value) / value:+.0%})"
+
+        self.stdout.write(f"{'kind':<24}{'reqs':>6}{'err':>5}{'rps':>9}{'p50ms':>9}{'p90ms':>9}{'p99ms':>9}{'q/req':>7}{'thr':>5}")
+        for name, summary in [('overall', report['overall'])] + list(report['by_kind'].items()):
+            path = ['overall'] if name == 'overall' else ['by_kind', name]
+            latency = summary['latency_ms']
+            self.stdout.write(
+                f"{name:<24}{summary['requests']:>6}{summary['errors']:>5}{summary['throughput_rps']:>9.1f}"
+                f"{latency['p50']:>9.2f}{latency['p90']:>9.2f}{latency['p99']:>9.2f}"
+                f"{summary['queries_per_request']['mean']:>7.1f}{summary['threads_spawned']:>5}"
+                f"{delta(latency['p90'], path + ['latency_ms', 'p90'])}"
+            )
+        background = report['background']
+        self.stdout.write(
+            f"Background: {background['threads_started']} thread(s), {background['queries']} queries, "
+            f"drained after {background['seconds_until_drained']}s ({background['threads_still_running']} still running)"
+        )
+        self.stdout.write(f"Fake Slack: {report['slack']['total_calls']} call(s), rate limited {sum(report['slack']['rate_limited'].values())}")
+        if report['log_records']:
+            self.stdout.write(self.style.WARNING(
+                f"App log records: {', '.join(f'{level} {count}' for level, count in sorted(report['log_records'].items()))}"
+            ))
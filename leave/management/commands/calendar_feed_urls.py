@@ -0,0 +1,26 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from leave.calendar_feeds import feed_url
+from leave.models import Department, Team
+
+
+class Command(BaseCommand):
+    help = "Print the iCalendar subscription URLs (with access tokens) for departments and teams"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--department', type=int, action='append', default=[], help="Department id (repeatable)")
+        parser.add_argument('--team', type=int, action='append', default=[], help="Team id (repeatable)")
+
+    def handle(self, *args, **options):
+        base = getattr(settings, 'LEAVE_CALENDAR_FEED_BASE_URL', '').rstrip('/')
+        departments = Department.objects.all()
+        teams = Team.objects.all()
+        if options['department'] or options['team']:
+            departments = departments.filter(id__in=options['department'])
+            teams = teams.filter(id__in=options['team'])
+
+        for department in departments.order_by('name'):
+            self.stdout.write(f"Department {department.name}: {base}{feed_url('department', department.id)}")
+        for team in teams.order_by('name'):
+            self.stdout.write(f"Team {team.name}: {base}{feed_url('team', team.id)}")
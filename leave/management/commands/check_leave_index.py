@@ -0,0 +1,65 @@
+import random
+import time
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db.models import Min, Max
+
+from leave.leave_index import LeaveIntervalIndex, EXCLUDED_STATUSES
+from leave.models import LeaveRequest
+
+
+class Command(BaseCommand):
+    help = (
+        "Build the in-memory leave interval index and check it against the database: "
+        "indexed rows, then random range-overlap queries compared with the equivalent ORM filter"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--queries', type=int, default=200, help="Random overlap queries to compare (default 200)")
+        parser.add_argument('--seed', type=int, default=None, help="Random seed for reproducible ranges")
+
+    def handle(self, *args, **options):
+        index = LeaveIntervalIndex()
+        started = time.perf_counter()
+        size = index.build()
+        self.stdout.write(f"Built index of {size} leave(s) in {time.perf_counter() - started:.3f}s")
+
+        result = index.verify_against_db(repair=False)
+        if result['missing'] or result['stale'] or result['extra']:
+            raise CommandError(f"Index rows differ from the database: {result}")
+
+        bounds = LeaveRequest.objects.aggregate(first=Min('start_date'), last=Max('end_date'))
+        if not bounds['first']:
+            self.stdout.write(self.style.SUCCESS("No leaves to query - index is consistent"))
+            return
+
+        rng = random.Random(options['seed'])
+        span = (bounds['last'] - bounds['first']).days + 1
+        mismatches = 0
+        index_time = db_time = 0.0
+        for _ in range(max(0, options['queries'])):
+            start = bounds['first'] + timedelta(days=rng.randrange(span))
+            end = start + timedelta(days=rng.randrange(31))
+
+            t0 = time.perf_counter()
+            from_index = [entry[0] for entry in index.overlapping(start, end)]
+            t1 = time.perf_counter()
+            from_db = list(
+                LeaveRequest.objects.filter(start_date__lte=end, end_date__gte=start)
+                .exclude(status__in=EXCLUDED_STATUSES)
+                .order_by('start_date', 'id')
+                .values_list('id', flat=True)
+            )
+            t2 = time.perf_counter()
+            index_time += t1 - t0
+            db_time += t2 - t1
+
+            if from_index != from_db:
+                mismatches += 1
+                self.stderr.write(f"  {start}..{end}: index {len(from_index)} vs db {len(from_db)}")
+
+        self.stdout.write(f"Queries: index {index_time * 1000:.1f}ms, database {db_time * 1000:.1f}ms")
+        if mismatches:
+            raise CommandError(f"{mismatches} of {options['queries']} overlap queries differ from the database")
+        self.stdout.write(self.style.SUCCESS(f"{options['queries']} overlap queries match the database"))
@@ -0,0 +1,281 @@
+import json
+import logging
+import os
+import tempfile
+import threading
+import time
+from datetime import timedelta
+from urllib.parse import urlencode
+
+from django.conf import settings
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test import Client
+from django.test.utils import override_settings
+from django.utils import timezone
+
+from leave.fake_slack import FakeSlackServer
+from leave.query_budget import BUDGETS, budget_stats, reset_budget_stats
+
+# Most managers a leave request can be sent to (max_selected_items of the managers select)
+MAX_APPROVERS = 5
+
+
+class _ErrorCollector(logging.Handler):
+    """Collects ERROR records logged by the app while a scenario runs"""
+
+    def __init__(self):
+        super().__init__(logging.ERROR)
+        self.errors = []
+
+    def emit(self, record):
+        self.errors.append(f"{record.name}: {record.getMessage()}")
+
+
+class Command(BaseCommand):
+    help = (
+        "Verify the declared per-handler query budgets (leave/query_budget.py): generate a synthetic org in a "
+        "throwaway database, drive every exercised handler through leave.views.slack_events with the fake "
+        "Slack API, and fail if any handler ran more queries than its budget or failed (an error response, "
+        "an ERROR log from the app or an uncaught exception in a background job)."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=1000, help="Synthetic users (default 1000)")
+        parser.add_argument('--teams', type=int, default=40, help="Synthetic teams (default 40)")
+        parser.add_argument('--leaves', type=int, default=50000, help="Synthetic leave requests (default 50000)")
+        parser.add_argument('--repeat', type=int, default=3, help="Runs per scenario (default 3)")
+        parser.add_argument('--seed', type=int, default=42)
+        parser.add_argument(
+            '--budget-mode', choices=['log', 'raise'], default='log',
+            help="QUERY_BUDGET_MODE while the handlers run - 'raise' also aborts a handler at its first overrun"
+        )
+        parser.add_argument('--json', dest='json_path', help="Also write the per-budget results to this file")
+        parser.add_argument(
+            '--current-db', action='store_true',
+            help="Generate the org in the current database instead of a throwaway one (for the test suite)"
+        )
+
+    def handle(self, *args, **options):
+        app_logger = logging.getLogger('leave')
+        propagate = app_logger.propagate
+        app_logger.propagate = False
+        self.collector = _ErrorCollector()
+        app_logger.addHandler(self.collector)
+        self.failures = {}
+
+        test_db = None if options['current_db'] else self._create_test_db()
+        server = FakeSlackServer(seed=options['seed']).start()
+        from leave import slack_utils
+        original_base_url = slack_utils.slack_client.base_url
+        slack_utils.slack_client.base_url = server.base_url
+        try:
+            self.stdout.write("Generating synthetic org...")
+            call_command(
+                'generate_synthetic_org', users=options['users'], teams=options['teams'],
+                leaves=options['leaves'], seed=options['seed'], stdout=open(os.devnull, 'w')
+            )
+            self._pick_actors()
+            reset_budget_stats()
+            with override_settings(QUERY_BUDGET_MODE=options['budget_mode']):
+                for name, build in self._scenarios():
+                    for run in range(options['repeat']):
+                        self._run(name, build(run))
+            stats = budget_stats()
+        finally:
+            slack_utils.slack_client.base_url = original_base_url
+            server.stop()
+            if test_db:
+                connection.creation.destroy_test_db(test_db, verbosity=0)
+            app_logger.removeHandler(self.collector)
+            app_logger.propagate = propagate
+
+        self._report(stats, options['json_path'])
+
+    def _create_test_db(self):
+        test_settings = settings.DATABASES['default'].setdefault('TEST', {})
+        test_settings['MIGRATE'] = False
+        if connection.vendor == 'sqlite' and not test_settings.get('NAME'):
+            test_settings['NAME'] = os.path.join(tempfile.gettempdir(), f'check_query_budgets_{os.getpid()}.sqlite3')
+        return connection.creation.create_test_db(verbosity=0, autoclobber=True, serialize=False)
+
+    def _pick_actors(self):
+        """The busiest employee, an admin manager and open leaves to act on"""
+        from django.db.models import Count
+        from leave.models import LeaveRequest, UserRole
+
+        self.employee = (
+            LeaveRequest.objects.values('employee__username').annotate(n=Count('id')).order_by('-n', 'employee__username')
+            .first()['employee__username']
+        )
+        self.manager = UserRole.objects.filter(role='MANAGER', is_admin=True).order_by('user__username').values_list(
+            'user__username', flat=True
+        ).first() or UserRole.objects.filter(role='MANAGER').order_by('user__username').values_list('user__username', flat=True)[0]
+        today = timezone.now().date()
+        self.open_leaves = list(
+            LeaveRequest.objects.filter(status='PENDING', start_date__gt=today).order_by('id').values_list('id', flat=True)
+        )
+        self._assign_approvers()
+
+    def _assign_approvers(self):
+        """Send every open leave to the most managers allowed, so decisions notify the others as in production"""
+        from leave.models import LeaveApproverAssignment, LeaveRequest, UserRole
+
+        others = UserRole.objects.filter(role='MANAGER').exclude(user__username=self.manager).order_by('user__username')
+        approvers = [self.manager] + list(others.values_list('user__username', flat=True)[:MAX_APPROVERS - 1])
+        LeaveRequest.objects.filter(id__in=self.open_leaves).update(selected_managers=','.join(approvers))
+        LeaveApproverAssignment.objects.bulk_create(
+            [
+                LeaveApproverAssignment(
+                    leave_id=leave_id, manager_slack_id=manager_id, channel=f'D{manager_id[1:]}',
+                    thread_ts=f'{int(time.time())}.{leave_id:06d}'
+                )
+                for leave_id in self.open_leaves
+                for manager_id in approvers
+            ],
+            batch_size=1000
+        )
+
+    def _next_leave(self):
+        if not self.open_leaves:
+            raise CommandError("Not enough pending leaves in the synthetic org - raise --leaves")
+        return self.open_leaves.pop()
+
+    # ---- payloads ----
+
+    def _command(self, command, user_id, text=''):
+        return urlencode({
+            'command': command, 'user_id': user_id, 'user_name': user_id.lower(), 'text': text,
+            'trigger_id': f'trigger.{time.time_ns()}', 'channel_id': f'D{user_id[1:]}',
+        })
+
+    def _interaction(self, payload):
+        payload.setdefault('trigger_id', f'trigger.{time.time_ns()}')
+        return urlencode({'payload': json.dumps(payload)})
+
+    def _action(self, user_id, action_id, value):
+        return self._interaction({
+            'type': 'block_actions',
+            'user': {'id': user_id},
+            'channel': {'id': f'D{user_id[1:]}'},
+            'message': {'ts': f'{int(time.time())}.000100'},
+            'actions': [{'action_id': action_id, 'value': value}],
+            'state': {'values': {'supervisor_comment': {'comment_input': {'value': 'Budget check'}}}},
+        })
+
+    def _leave_request_modal(self, run):
+        start = timezone.now().date() + timedelta(days=14 + run)
+        return self._interaction({
+            'type': 'view_submission',
+            'user': {'id': self.employee},
+            'view': {'callback_id': 'leave_request_modal', 'state': {'values': {
+                'leave_type': {'leave_type_select': {'selected_option': {'value': 'CASUAL'}}},
+                'start_date': {'start_date_select': {'selected_date': start.isoformat()}},
+                'end_date': {'end_date_select': {'selected_date': (start + timedelta(days=1)).isoformat()}},
+                'reason': {'reason_input': {'value': 'Budget check'}},
+                'backup_person': {'backup_person_input': {'value': None}},
+            }}},
+        })
+
+    def _calendar_filter(self, run):
+        month = timezone.now().date().replace(day=1)
+        options = lambda *values: [{'value': value, 'text': {'type': 'plain_text', 'text': value}} for value in values]
+        return self._interaction({
+            'type': 'view_submission',
+            'user': {'id': self.manager},
+            'view': {'callback_id': 'team_calendar_filter', 'state': {'values': {
+                'calendar_month': {'month_select': {'selected_option': {'value': month.strftime('%Y-%m')}}},
+                'department_filter': {'department_select': {'selected_option': {'value': 'ALL'}}},
+                'status_filter': {'status_select': {'selected_options': options('PENDING', 'APPROVED')}},
+                'leave_type_filter': {'leave_type_select': {'selected_options': []}},
+                'display_options': {'display_select': {'selected_options': options(
+                    'SHOW_DETAILS', 'SHOW_CONFLICTS', 'GROUP_DEPT', 'HEATMAP'
+                )[:2 + run]}},
+                'sort_option': {'sort_select': {'selected_option': {'value': ('STATUS_PENDING', 'DURATION_DESC', 'DATE_ASC')[run % 3]}}},
+            }}},
+        })
+
+    def _scenarios(self):
+        """(name, run -> request body) for every handler path that works offline (AI paths need the LLM)"""
+        return [
+            ('/my-leaves', lambda run: self._command('/my-leaves', self.employee)),
+            ('/leave-balance', lambda run: self._command('/leave-balance', self.employee)),
+            ('/leave-policy', lambda run: self._command('/leave-policy', self.employee)),
+            ('/apply-leave', lambda run: self._command('/apply-leave', self.employee)),
+            ('/department', lambda run: self._command('/department', self.manager)),
+            ('/department <name>', lambda run: self._command('/department', self.employee, 'Finance')),
+            ('/team-calendar', lambda run: self._command('/team-calendar', self.manager)),
+            ('leave_request_modal', self._leave_request_modal),
+            ('team_calendar_filter', self._calendar_filter),
+            ('approve_leave', lambda run: self._action(self.manager, 'approve_leave', f'{self._next_leave()}|APPROVE')),
+            ('reject_leave', lambda run: self._action(self.manager, 'reject_leave', f'{self._next_leave()}|REJECT')),
+            ('approve_unpaid', lambda run: self._action(self.manager, 'approve_unpaid', f'{self._next_leave()}|UNPAID')),
+            ('request_docs', lambda run: self._action(self.manager, 'request_docs', f'{self._next_leave()}|REQUEST_DOCS')),
+            ('submit_doc_later', lambda run: self._action(self.employee, 'submit_doc_later', f'{self._next_leave()}|LATER')),
+            ('cancel_request', lambda run: self._action(self.employee, 'cancel_request', f'{self._next_leave()}|CANCEL')),
+            ('employee_accept_unpaid', lambda run: self._action(self.employee, 'employee_accept_unpaid', f'{self._next_leave()}|ACCEPT_UNPAID')),
+            ('employee_reject_offer', lambda run: self._action(self.employee, 'employee_reject_offer', f'{self._next_leave()}|REJECT_OFFER')),
+            ('employee_accept_comp', lambda run: self._action(self.employee, 'employee_accept_comp', f'{self._next_leave()}|ACCEPT_COMP')),
+            ('verify_document', lambda run: self._action(self.manager, 'verify_document', f'{self._next_leave()}|VERIFY_DOC')),
+            ('reject_document', lambda run: self._action(self.manager, 'reject_document', f'{self._next_leave()}|REJECT_DOC')),
+        ]
+
+    # ---- run ----
+
+    def _run(self, name, body):
+        """Post one scenario and wait for its background jobs; anything that went wrong goes in self.failures"""
+        errors = []
+        self.collector.errors = errors
+        excepthook = threading.excepthook
+        threading.excepthook = lambda hook_args: errors.append(
+            f"{hook_args.thread.name}: {hook_args.exc_type.__name__}: {hook_args.exc_value}"
+        )
+        try:
+            before = set(threading.enumerate())
+            response = Client().post('/slack/events/', body, content_type='application/x-www-form-urlencoded')
+            # Wait for the handler's background work so its budget (and any failure) is recorded too
+            for thread in set(threading.enumerate()) - before:
+                while True:
+                    try:
+                        thread.join(30)
+                        break
+                    except RuntimeError:
+                        time.sleep(0.01)  # Listed by enumerate() but not running yet
+                if thread.is_alive():
+                    errors.append(f"{thread.name} still running after 30s")
+        finally:
+            threading.excepthook = excepthook
+        if response.status_code >= 400:
+            errors.append(f"HTTP {response.status_code}")
+        if errors:
+            self.failures.setdefault(name, []).extend(errors)
+            for error in errors:
+                self.stdout.write(self.style.ERROR(f"{name}: {error}"))
+
+    def _report(self, stats, json_path):
+        exceeded = {name: entry for name, entry in stats.items() if entry['max'] > entry['limit']}
+        width = max([len(name) for name in stats] + [10])
+        self.stdout.write(f"{'budget':<{width}}  {'limit':>5}  {'calls':>5}  {'max':>5}  {'mean':>6}")
+        for name, entry in sorted(stats.items()):
+            line = (
+                f"{name:<{width}}  {entry['limit']:>5}  {entry['calls']:>5}  {entry['max']:>5}  "
+                f"{entry['total'] / entry['calls']:>6.1f}"
+            )
+            self.stdout.write(self.style.ERROR(line) if name in exceeded else line)
+
+        unexercised = sorted(set(BUDGETS) - set(stats))
+        if unexercised:
+            self.stdout.write(f"Not exercised offline ({len(unexercised)}): {', '.join(unexercised)}")
+        if json_path:
+            with open(json_path, 'w') as fh:
+                json.dump({'budgets': stats, 'unexercised': unexercised, 'failures': self.failures}, fh, indent=2, sort_keys=True)
+
+        problems = []
+        if exceeded:
+            problems.append(f"{len(exceeded)} handler(s) exceeded their query budget: {', '.join(sorted(exceeded))}")
+        if self.failures:
+            problems.append(f"{len(self.failures)} scenario(s) failed: {', '.join(sorted(self.failures))}")
+        if problems:
+            raise CommandError('; '.join(problems))
+        self.stdout.write(self.style.SUCCESS(f"All {len(stats)} exercised budget(s) held, no scenario failed"))
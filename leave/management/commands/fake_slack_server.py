@@ -0,0 +1,47 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from leave.fake_slack import FakeSlackServer
+
+
+class Command(BaseCommand):
+    help = (
+        "Run an offline stand-in for the Slack Web API for load testing. "
+        "Point the app at it with SLACK_API_BASE_URL=http://<host>:<port>/api/"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--host', default='127.0.0.1')
+        parser.add_argument('--port', type=int, default=8765)
+        parser.add_argument('--latency', type=float, default=0, help="Added latency per call in ms (default 0)")
+        parser.add_argument('--jitter', type=float, default=0, help="Random +/- latency jitter in ms (default 0)")
+        parser.add_argument('--rate-limit-rate', type=float, default=0.0, help="Share of calls answered with HTTP 429 (0-1)")
+        parser.add_argument('--retry-after', type=int, default=1, help="Retry-After seconds sent with 429s (default 1)")
+        parser.add_argument('--failure-rate', type=float, default=0.0, help="Share of calls answered with ok=false (0-1)")
+        parser.add_argument('--channel-member', action='append', default=[], dest='channel_members',
+                            help="Slack user id returned as a manager channel member (repeatable)")
+        parser.add_argument('--seed', type=int, default=None, help="Random seed for reproducible injection")
+
+    def handle(self, *args, **options):
+        for rate in ('rate_limit_rate', 'failure_rate'):
+            if not 0 <= options[rate] <= 1:
+                raise CommandError(f"--{rate.replace('_', '-')} must be between 0 and 1")
+
+        server = FakeSlackServer(
+            host=options['host'],
+            port=options['port'],
+            latency_ms=options['latency'],
+            jitter_ms=options['jitter'],
+            rate_limit_rate=options['rate_limit_rate'],
+            retry_after=options['retry_after'],
+            failure_rate=options['failure_rate'],
+            channel_members=options['channel_members'],
+            seed=options['seed'],
+        )
+        self.stdout.write(self.style.SUCCESS(f"Fake Slack API on {server.base_url} (stats at /stats, POST /reset)"))
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            server.stop()
+            self.stdout.write(f"Calls served: {server.state.stats()['total_calls']}")
@@ -0,0 +1,252 @@
+import time
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+
+from leave.models import (
+    APPROVER_STATE_FOR_STATUS, LeaveApproverAssignment, LeaveBalance, LeaveDocument, LeaveRequest, SlackMessageRef,
+    UserRole
+)
+
+STEPS = ['analyze', 'reindex', 'orphans', 'missing', 'threads', 'vacuum']
+DEFAULT_STEPS = ['analyze', 'reindex', 'orphans', 'missing', 'threads']
+
+# Models whose indexes were added after 0001 - rebuilt by the reindex step
+INDEXED_MODELS = [LeaveDocument, LeaveApproverAssignment, SlackMessageRef]
+
+
+class Command(BaseCommand):
+    help = (
+        "Database maintenance: ANALYZE, rebuild indexes, repair orphaned/missing "
+        "UserRole and LeaveBalance rows, compact manager_threads JSON, optional VACUUM. "
+        "Row repairs run in small batches with short transactions."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--steps',
+            default=','.join(DEFAULT_STEPS),
+            help=f"Comma-separated steps to run, in order. Available: {', '.join(STEPS)}. "
+                 f"Default: {','.join(DEFAULT_STEPS)} (VACUUM is opt-in, it locks the whole database on SQLite)"
+        )
+        parser.add_argument('--batch-size', type=int, default=500, help="Rows per batch/transaction (default 500)")
+        parser.add_argument('--pause', type=float, default=0.05, help="Seconds to sleep between batches (default 0.05)")
+        parser.add_argument('--dry-run', action='store_true', help="Report what would change without writing")
+
+    def handle(self, *args, **options):
+        steps = [step.strip() for step in options['steps'].split(',') if step.strip()]
+        unknown = [step for step in steps if step not in STEPS]
+        if unknown:
+            raise CommandError(f"Unknown step(s): {', '.join(unknown)}. Available: {', '.join(STEPS)}")
+
+        self.batch_size = max(1, options['batch_size'])
+        self.pause = max(0.0, options['pause'])
+        self.dry_run = options['dry_run']
+        self.vendor = connection.vendor
+
+        self.stdout.write(f"fix_database on {self.vendor}{' (dry run)' if self.dry_run else ''}: {', '.join(steps)}")
+
+        total_start = time.perf_counter()
+        for step in steps:
+            start = time.perf_counter()
+            result = getattr(self, f'step_{step}')()
+            elapsed = time.perf_counter() - start
+            self.stdout.write(f"  {step:<8} {elapsed:8.2f}s  {result}")
+
+        self.stdout.write(self.style.SUCCESS(f"Done in {time.perf_counter() - total_start:.2f}s"))
+
+    # ---- helpers ----
+
+    def _leave_tables(self):
+        from django.apps import apps
+        return [model._meta.db_table for model in apps.get_app_config('leave').get_models()]
+
+    def _sleep(self):
+        if self.pause:
+            time.sleep(self.pause)
+
+    def _batched_delete(self, queryset):
+        """Delete rows matching queryset in pk batches - each batch is its own short transaction"""
+        deleted = 0
+        while True:
+            ids = list(queryset.order_by('pk').values_list('pk', flat=True)[:self.batch_size])
+            if not ids:
+                return deleted
+            if self.dry_run:
+                return queryset.count()
+            with transaction.atomic():
+                deleted += queryset.model.objects.filter(pk__in=ids).delete()[0]
+            self._sleep()
+
+    def _users_without(self, related_model):
+        """User ids in pk order with no row in related_model (keyset batches)"""
+        last_id = 0
+        while True:
+            ids = list(
+                User.objects.filter(id__gt=last_id)
+                .exclude(id__in=related_model.objects.values('user_id'))
+                .order_by('id')
+                .values_list('id', flat=True)[:self.batch_size]
+            )
+            if not ids:
+                return
+            yield ids
+            last_id = ids[-1]
+
+    # ---- steps ----
+
+    def step_analyze(self):
+        """Refresh planner statistics"""
+        with connection.cursor() as cursor:
+            if self.vendor == 'sqlite':
+                cursor.execute('ANALYZE')
+            elif self.vendor == 'postgresql':
+                for table in self._leave_tables():
+                    cursor.execute(f'ANALYZE {connection.ops.quote_name(table)}')
+            elif self.vendor == 'mysql':
+                tables = ', '.join(connection.ops.quote_name(t) for t in self._leave_tables())
+                cursor.execute(f'ANALYZE TABLE {tables}')
+            else:
+                return f"skipped (not supported on {self.vendor})"
+        return "statistics updated"
+
+    def step_reindex(self):
+        """Rebuild indexes declared on the newer models, one table/index at a time"""
+        if self.vendor == 'sqlite':
+            # Unique constraints are table-level autoindexes on SQLite - reindex per table
+            targets = [model._meta.db_table for model in INDEXED_MODELS]
+        elif self.vendor == 'postgresql':
+            targets = []
+            for model in INDEXED_MODELS:
+                targets += [index.name for index in model._meta.indexes]
+                targets += [constraint.name for constraint in model._meta.constraints]
+        else:
+            return f"skipped (not supported on {self.vendor})"
+
+        if self.dry_run:
+            return f"would rebuild {len(targets)} {'table(s)' if self.vendor == 'sqlite' else 'index(es)'}"
+
+        with connection.cursor() as cursor:
+            for target in targets:
+                quoted = connection.ops.quote_name(target)
+                if self.vendor == 'sqlite':
+                    cursor.execute(f'REINDEX {quoted}')
+                else:
+                    # CONCURRENTLY (PG12+) rebuilds without blocking writes
+                    concurrently = 'CONCURRENTLY ' if connection.pg_version >= 120000 else ''
+                    cursor.execute(f'REINDEX INDEX {concurrently}{quoted}')
+                self._sleep()
+        return f"rebuilt {len(targets)} {'table(s)' if self.vendor == 'sqlite' else 'index(es)'}"
+
+    def step_orphans(self):
+        """Delete UserRole/LeaveBalance rows pointing at users that no longer exist"""
+        existing_users = User.objects.values('id')
+        roles = self._batched_delete(UserRole.objects.exclude(user_id__in=existing_users))
+        balances = self._batched_delete(LeaveBalance.objects.exclude(user_id__in=existing_users))
+        verb = "would delete" if self.dry_run else "deleted"
+        return f"{verb} {roles} orphaned role(s), {balances} orphaned balance(s)"
+
+    def step_missing(self):
+        """Create default UserRole/LeaveBalance rows for users that have none"""
+        created_roles = created_balances = 0
+
+        for ids in self._users_without(UserRole):
+            created_roles += len(ids)
+            if not self.dry_run:
+                UserRole.objects.bulk_create(
+                    [UserRole(user_id=user_id, role='EMPLOYEE') for user_id in ids],
+                    ignore_conflicts=True
+                )
+                self._sleep()
+
+        for ids in self._users_without(LeaveBalance):
+            created_balances += len(ids)
+            if not self.dry_run:
+                LeaveBalance.objects.bulk_create(
+                    [LeaveBalance(user_id=user_id) for user_id in ids],
+                    ignore_conflicts=True
+                )
+                self._sleep()
+
+        verb = "would create" if self.dry_run else "created"
+        return f"{verb} {created_roles} role(s), {created_balances} balance(s)"
+
+    def step_threads(self):
+        """
+        Compact manager_threads JSON and backfill missing approver assignments
+
+        Drops blank keys/values and normalises NULL to {}. Threads that are only
+        in the JSON get a LeaveApproverAssignment row so lookups use the index.
+        """
+        last_id = 0
+        compacted = backfilled = 0
+
+        while True:
+            batch = list(
+                LeaveRequest.objects.filter(id__gt=last_id)
+                .order_by('id')
+                .only('id', 'status', 'manager_threads')[:self.batch_size]
+            )
+            if not batch:
+                break
+            last_id = batch[-1].id
+
+            changed = []
+            assignments = []
+            known = set(
+                LeaveApproverAssignment.objects.filter(leave_id__in=[leave.id for leave in batch])
+                .values_list('leave_id', 'manager_slack_id')
+            )
+            for leave in batch:
+                threads = leave.manager_threads if isinstance(leave.manager_threads, dict) else {}
+                compact = {
+                    str(manager).strip(): str(ts).strip()
+                    for manager, ts in threads.items()
+                    if manager and str(manager).strip() and ts and str(ts).strip()
+                }
+                if compact != leave.manager_threads:
+                    leave.manager_threads = compact
+                    changed.append(leave)
+                for manager_id, thread_ts in compact.items():
+                    if (leave.id, manager_id) not in known:
+                        assignments.append(LeaveApproverAssignment(
+                            leave_id=leave.id,
+                            manager_slack_id=manager_id,
+                            channel=manager_id,
+                            thread_ts=thread_ts,
+                            # Open statuses (PENDING_DOCS, DOCS_SUBMITTED, ...) stay pending, as in migration 0003
+                            state=APPROVER_STATE_FOR_STATUS.get(leave.status, 'PENDING')
+                        ))
+
+            compacted += len(changed)
+            backfilled += len(assignments)
+            if not self.dry_run and (changed or assignments):
+                with transaction.atomic():
+                    if changed:
+                        LeaveRequest.objects.bulk_update(changed, ['manager_threads'])
+                    if assignments:
+                        LeaveApproverAssignment.objects.bulk_create(assignments, ignore_conflicts=True)
+                self._sleep()
+
+        verb = "would compact" if self.dry_run else "compacted"
+        return f"{verb} {compacted} request(s), backfilled {backfilled} assignment(s)"
+
+    def step_vacuum(self):
+        """Reclaim space (opt-in: VACUUM locks the whole database on SQLite)"""
+        if self.dry_run:
+            return "would vacuum"
+        if connection.in_atomic_block:
+            return "skipped (cannot VACUUM inside a transaction)"
+        with connection.cursor() as cursor:
+            if self.vendor == 'sqlite':
+                cursor.execute('VACUUM')
+            elif self.vendor == 'postgresql':
+                for table in self._leave_tables():
+                    cursor.execute(f'VACUUM (ANALYZE) {connection.ops.quote_name(table)}')
+            elif self.vendor == 'mysql':
+                tables = ', '.join(connection.ops.quote_name(t) for t in self._leave_tables())
+                cursor.execute(f'OPTIMIZE TABLE {tables}')
+            else:
+                return f"skipped (not supported on {self.vendor})"
+        return "vacuumed"
@@ -0,0 +1,268 @@
+import time
+from datetime import datetime, timedelta
+
+import numpy as np
+from django.contrib.auth.hashers import UNUSABLE_PASSWORD_PREFIX
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.db.models.signals import post_delete
+from django.utils import timezone
+
+from leave import signals
+from leave.models import Department, LeaveBalance, LeaveRequest, Team, UserRole
+from leave.occupancy import rebuild_occupancy
+
+# Synthetic rows are recognisable by these markers so --clear only removes generated data
+USERNAME_PREFIX = 'UZ'  # Slack-like ids: 'U' + 10 characters
+EMAIL_DOMAIN = 'synthetic.invalid'
+DEPARTMENT_PREFIX = 'Synthetic Dept'
+TEAM_PREFIX = 'Synthetic Team'
+
+LEAVE_TYPES = np.array(['CASUAL', 'SICK', 'MATERNITY', 'PATERNITY'])
+LEAVE_TYPE_WEIGHTS = [0.56, 0.36, 0.02, 0.06]
+
+# Status mixes for leaves that already ended vs ongoing/upcoming ones
+PAST_STATUSES = np.array(['APPROVED', 'REJECTED', 'CANCELLED', 'APPROVED_UNPAID', 'APPROVED_COMP'])
+PAST_STATUS_WEIGHTS = [0.78, 0.10, 0.07, 0.03, 0.02]
+OPEN_STATUSES = np.array(['PENDING', 'APPROVED', 'REJECTED', 'CANCELLED', 'PENDING_DOCS', 'DOCS_SUBMITTED', 'APPROVED_UNPAID'])
+OPEN_STATUS_WEIGHTS = [0.35, 0.45, 0.06, 0.04, 0.05, 0.03, 0.02]
+DOCUMENT_STATUS_FOR = {'PENDING_DOCS': 'PENDING', 'DOCS_SUBMITTED': 'SUBMITTED'}
+
+REASONS = [
+    'Family event', 'Personal errand', 'Feeling unwell', 'Medical appointment', 'Travel',
+    'Moving house', 'Child care', 'Wedding', 'Rest and recovery', 'Exam preparation',
+]
+
+
+class Command(BaseCommand):
+    help = (
+        "Generate a deterministic synthetic organisation (users, roles, balances, departments, teams and "
+        "leave requests) for performance work. Defaults: 20k users, 18 departments, 500 teams, 2M leaves."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=20000)
+        parser.add_argument('--departments', type=int, default=18)
+        parser.add_argument('--teams', type=int, default=500)
+        parser.add_argument('--leaves', type=int, default=2000000)
+        parser.add_argument('--manager-ratio', type=float, default=0.05, help="Share of users with the MANAGER role")
+        parser.add_argument('--past-days', type=int, default=730, help="How far back leave start dates go")
+        parser.add_argument('--future-days', type=int, default=180, help="How far ahead leave start dates go")
+        parser.add_argument('--today', help="Reference date (YYYY-MM-DD) so runs on different days match")
+        parser.add_argument('--seed', type=int, default=42)
+        parser.add_argument('--batch-size', type=int, default=5000)
+        parser.add_argument('--clear', action='store_true', help="Delete previously generated synthetic data first")
+        parser.add_argument('--skip-occupancy', action='store_true', help="Do not rebuild DailyOccupancy afterwards")
+
+    def handle(self, *args, **options):
+        users, departments, teams = options['users'], options['departments'], options['teams']
+        if users < 1 or departments < 1 or teams < 0 or options['leaves'] < 0:
+            raise CommandError("--users and --departments must be at least 1, --teams and --leaves not negative")
+        if users >= 10 ** 9:
+            raise CommandError("--users must be below 1,000,000,000")
+        try:
+            today = datetime.strptime(options['today'], '%Y-%m-%d').date() if options['today'] else timezone.now().date()
+        except ValueError:
+            raise CommandError("--today must be in YYYY-MM-DD format")
+
+        if options['clear']:
+            self._clear()
+        elif User.objects.filter(email__endswith=f'@{EMAIL_DOMAIN}').exists():
+            raise CommandError("Synthetic data already exists - rerun with --clear to replace it")
+
+        self.rng = np.random.default_rng(options['seed'])
+        self.batch_size = options['batch_size']
+        started = time.perf_counter()
+
+        with transaction.atomic():
+            department_ids = self._create_departments(departments)
+            user_ids = self._create_users(users)
+            manager_mask = self._create_roles(user_ids, department_ids, options['manager_ratio'])
+            self._create_balances(user_ids)
+            self._create_teams(teams, user_ids, manager_mask)
+        self._create_leaves(options['leaves'], user_ids, today, options['past_days'], options['future_days'])
+
+        if not options['skip_occupancy']:
+            step = time.perf_counter()
+            rows = rebuild_occupancy()
+            self.stdout.write(f"Rebuilt {rows} occupancy row(s) in {time.perf_counter() - step:.1f}s")
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Generated {users} user(s), {departments} department(s), {teams} team(s) and "
+            f"{options['leaves']} leave request(s) in {time.perf_counter() - started:.1f}s (seed {options['seed']})"
+        ))
+        self.stdout.write(
+            "Bulk inserts skip signals: running web processes repair their leave index on the next "
+            "verification pass (or restart them)."
+        )
+
+    def _clear(self):
+        """Delete generated data; leaves go per user batch with the per-row signals off (occupancy is rebuilt after)"""
+        started = time.perf_counter()
+        user_ids = list(User.objects.filter(email__endswith=f'@{EMAIL_DOMAIN}').values_list('id', flat=True))
+        deleted = 0
+        post_delete.disconnect(signals.remove_leave_occupancy, sender=LeaveRequest)
+        try:
+            for offset in range(0, len(user_ids), 500):
+                with transaction.atomic():
+                    deleted += LeaveRequest.objects.filter(employee_id__in=user_ids[offset:offset + 500]).delete()[0]
+        finally:
+            post_delete.connect(signals.remove_leave_occupancy, sender=LeaveRequest)
+        with transaction.atomic():
+            deleted += User.objects.filter(id__in=user_ids).delete()[0]
+            deleted += Team.objects.filter(name__startswith=TEAM_PREFIX).delete()[0]
+            deleted += Department.objects.filter(name__startswith=DEPARTMENT_PREFIX).delete()[0]
+        self.stdout.write(f"Deleted {deleted} synthetic row(s) in {time.perf_counter() - started:.1f}s")
+
+    def _progress(self, label, done, total):
+        self.stdout.write(f"  {label}: {done}/{total}")
+
+    def _create_departments(self, count):
+        Department.objects.bulk_create(
+            [Department(name=f"{DEPARTMENT_PREFIX} {i:02d}") for i in range(1, count + 1)],
+            batch_size=self.batch_size
+        )
+        return list(Department.objects.filter(name__startswith=DEPARTMENT_PREFIX).order_by('name').values_list('id', flat=True))
+
+    def _create_users(self, count):
+        usernames = [f"{USERNAME_PREFIX}{i:09d}" for i in range(1, count + 1)]
+        for offset in range(0, count, self.batch_size):
+            User.objects.bulk_create([
+                User(
+                    username=username,
+                    email=f"{username.lower()}@{EMAIL_DOMAIN}",
+                    first_name='Synthetic',
+                    last_name=username[len(USERNAME_PREFIX):],
+                    password=UNUSABLE_PASSWORD_PREFIX,
+                )
+                for username in usernames[offset:offset + self.batch_size]
+            ])
+            self._progress('users', min(offset + self.batch_size, count), count)
+        # Fetch ids back in username order (bulk_create does not return ids on every backend)
+        return np.array(
+            User.objects.filter(email__endswith=f'@{EMAIL_DOMAIN}').order_by('username').values_list('id', flat=True)
+        )
+
+    def _create_roles(self, user_ids, department_ids, manager_ratio):
+        count = len(user_ids)
+        manager_mask = self.rng.random(count) < manager_ratio
+        manager_mask[0] = True  # At least one manager
+        admin_mask = manager_mask & (self.rng.random(count) < 0.2)
+        # Departments differ in size (a few large ones, a long tail)
+        sizes = self.rng.gamma(2.0, size=len(department_ids))
+        departments = self.rng.choice(department_ids, size=count, p=sizes / sizes.sum())
+        for offset in range(0, count, self.batch_size):
+            UserRole.objects.bulk_create([
+                UserRole(
+                    user_id=int(user_ids[i]),
+                    role='MANAGER' if manager_mask[i] else 'EMPLOYEE',
+                    is_admin=bool(admin_mask[i]),
+                    department_id=int(departments[i]),
+                )
+                for i in range(offset, min(offset + self.batch_size, count))
+            ])
+        self._progress('roles', count, count)
+        return manager_mask
+
+    def _create_balances(self, user_ids):
+        count = len(user_ids)
+        casual_used = self.rng.integers(0, LeaveBalance.MONTHLY_CASUAL + 1, size=count)
+        sick_used = self.rng.integers(0, LeaveBalance.MONTHLY_SICK + 1, size=count)
+        for offset in range(0, count, self.batch_size):
+            LeaveBalance.objects.bulk_create([
+                LeaveBalance(user_id=int(user_ids[i]), casual_used=int(casual_used[i]), sick_used=int(sick_used[i]))
+                for i in range(offset, min(offset + self.batch_size, count))
+            ])
+        self._progress('balances', count, count)
+
+    def _create_teams(self, count, user_ids, manager_mask):
+        if not count:
+            return
+        Team.objects.bulk_create(
+            [Team(name=f"{TEAM_PREFIX} {i:04d}") for i in range(1, count + 1)],
+            batch_size=self.batch_size
+        )
+        team_ids = np.array(Team.objects.filter(name__startswith=TEAM_PREFIX).order_by('name').values_list('id', flat=True))
+
+        # Everyone joins one team, a fifth of users join a second one
+        memberships = {(int(team), int(user)) for team, user in zip(self.rng.choice(team_ids, size=len(user_ids)), user_ids)}
+        extra = self.rng.random(len(user_ids)) < 0.2
+        memberships |= {
+            (int(team), int(user))
+            for team, user in zip(self.rng.choice(team_ids, size=int(extra.sum())), user_ids[extra])
+        }
+        # One or two managers administer each team
+        manager_ids = user_ids[manager_mask]
+        admins = {(int(team), int(self.rng.choice(manager_ids))) for team in team_ids}
+        admins |= {(int(team), int(self.rng.choice(manager_ids))) for team in team_ids[self.rng.random(len(team_ids)) < 0.5]}
+
+        Members, Admins = Team.members.through, Team.admins.through
+        Members.objects.bulk_create(
+            [Members(team_id=team, user_id=user) for team, user in sorted(memberships)], batch_size=self.batch_size
+        )
+        Admins.objects.bulk_create(
+            [Admins(team_id=team, user_id=user) for team, user in sorted(admins)], batch_size=self.batch_size
+        )
+        self._progress('team memberships', len(memberships) + len(admins), len(memberships) + len(admins))
+
+    def _start_offsets(self, count, today, past_days, future_days):
+        """Start dates as day offsets from today - weekday starts and holiday seasons are more likely"""
+        offsets = np.arange(-past_days, future_days + 1)
+        days = np.array([today + timedelta(days=int(offset)) for offset in offsets])
+        weights = np.ones(len(offsets))
+        weights[[day.weekday() >= 5 for day in days]] = 0.1
+        weights[[day.month in (7, 8, 12) for day in days]] *= 1.6
+        return self.rng.choice(offsets, size=count, p=weights / weights.sum())
+
+    def _durations(self, leave_types):
+        durations = np.empty(len(leave_types), dtype=np.int64)
+        for leave_type, low, high, p in (('CASUAL', 1, 5, 0.6), ('SICK', 1, 10, 0.45)):
+            mask = leave_types == leave_type
+            durations[mask] = np.clip(self.rng.geometric(p, size=int(mask.sum())), low, high)
+        mask = leave_types == 'MATERNITY'
+        durations[mask] = self.rng.integers(90, 181, size=int(mask.sum()))
+        mask = leave_types == 'PATERNITY'
+        durations[mask] = self.rng.integers(5, 31, size=int(mask.sum()))
+        return durations
+
+    def _create_leaves(self, count, user_ids, today, past_days, future_days):
+        if not count:
+            return
+        step = time.perf_counter()
+        # Some people take far more leave than others
+        activity = self.rng.gamma(2.0, size=len(user_ids))
+        employees = self.rng.choice(user_ids, size=count, p=activity / activity.sum())
+        leave_types = self.rng.choice(LEAVE_TYPES, size=count, p=LEAVE_TYPE_WEIGHTS)
+        starts = self._start_offsets(count, today, past_days, future_days)
+        ends = starts + self._durations(leave_types) - 1
+        past = ends < 0
+        statuses = np.where(
+            past,
+            self.rng.choice(PAST_STATUSES, size=count, p=PAST_STATUS_WEIGHTS),
+            self.rng.choice(OPEN_STATUSES, size=count, p=OPEN_STATUS_WEIGHTS),
+        ).astype(object)
+        reasons = self.rng.integers(0, len(REASONS), size=count)
+        with_backup = self.rng.random(count) < 0.3
+        backups = self.rng.choice(user_ids, size=count)
+        usernames = dict(User.objects.filter(id__in=user_ids.tolist()).values_list('id', 'username'))
+
+        for offset in range(0, count, self.batch_size):
+            with transaction.atomic():
+                LeaveRequest.objects.bulk_create([
+                    LeaveRequest(
+                        employee_id=int(employees[i]),
+                        leave_type=leave_types[i],
+                        start_date=today + timedelta(days=int(starts[i])),
+                        end_date=today + timedelta(days=int(ends[i])),
+                        reason=REASONS[reasons[i]],
+                        status=statuses[i],
+                        document_status=DOCUMENT_STATUS_FOR.get(statuses[i], 'NOT_REQUIRED'),
+                        backup_person=usernames[int(backups[i])] if with_backup[i] else None,
+                    )
+                    for i in range(offset, min(offset + self.batch_size, count))
+                ])
+            done = min(offset + self.batch_size, count)
+            if done == count or (offset // self.batch_size) % 20 == 0:
+                self._progress('leave requests', done, count)
+        self.stdout.write(f"Created {count} leave request(s) in {time.perf_counter() - step:.1f}s")
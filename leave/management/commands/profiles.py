@@ -0,0 +1,121 @@
+import io
+import json
+import os
+import pstats
+import shutil
+import time
+from collections import Counter
+
+from django.core.management.base import BaseCommand, CommandError
+
+from leave.profiling import profile_dir
+
+
+def _load_session(path):
+    meta_path = os.path.join(path, 'meta.json')
+    meta = {}
+    if os.path.exists(meta_path):
+        with open(meta_path) as fh:
+            meta = json.load(fh)
+    parts = []
+    for name in sorted(os.listdir(path)):
+        if name.endswith('.json') and name != 'meta.json':
+            with open(os.path.join(path, name)) as fh:
+                parts.append(json.load(fh))
+    meta.setdefault('id', os.path.basename(path))
+    return meta, parts
+
+
+class Command(BaseCommand):
+    help = "List, summarize or prune request profiles written by leave.profiling.ProfilingMiddleware"
+
+    def add_arguments(self, parser):
+        parser.add_argument('profile', nargs='?', help="Profile id (or unique prefix) to summarize")
+        parser.add_argument('--limit', type=int, default=20, help="Profiles to list (default 20, newest first)")
+        parser.add_argument('--part', help="Only summarize this part (e.g. request, job1-...)")
+        parser.add_argument('--sort', default='cumulative', help="pstats sort key for cProfile parts (default cumulative)")
+        parser.add_argument('--top', type=int, default=25, help="Rows per summary (default 25)")
+        parser.add_argument('--prune-days', type=float, help="Delete profiles older than this many days")
+
+    def handle(self, *args, **options):
+        root = profile_dir()
+        if not os.path.isdir(root):
+            self.stdout.write(f"No profiles in {root}")
+            return
+        sessions = sorted(
+            (os.path.join(root, name) for name in os.listdir(root) if os.path.isdir(os.path.join(root, name))),
+            reverse=True
+        )
+
+        if options['prune_days'] is not None:
+            cutoff = time.time() - options['prune_days'] * 86400
+            old = [path for path in sessions if os.path.getmtime(path) < cutoff]
+            for path in old:
+                shutil.rmtree(path, ignore_errors=True)
+            self.stdout.write(self.style.SUCCESS(f"Deleted {len(old)} profile(s) older than {options['prune_days']} day(s)"))
+            return
+
+        if options['profile']:
+            matches = [path for path in sessions if os.path.basename(path).startswith(options['profile'])]
+            if len(matches) != 1:
+                raise CommandError(f"{len(matches)} profiles match {options['profile']!r}")
+            return self._summarize(matches[0], options)
+
+        self.stdout.write(f"{'id':<64} {'reason':<13} {'user':<12} {'request ms':>10} {'jobs':>4} {'job ms':>9}")
+        for path in sessions[:options['limit']]:
+            meta, parts = _load_session(path)
+            jobs = [part for part in parts if part['name'] != 'request']
+            self.stdout.write(
+                f"{meta['id']:<64} {meta.get('reason') or '-':<13} {meta.get('user') or '-':<12} "
+                f"{meta.get('request_ms', 0):>10.1f} {len(jobs):>4} {sum(part['duration_ms'] for part in jobs):>9.1f}"
+            )
+        self.stdout.write(f"{len(sessions)} profile(s) in {root}")
+
+    def _summarize(self, path, options):
+        meta, parts = _load_session(path)
+        self.stdout.write(
+            f"{meta['id']}: {meta.get('label')} from {meta.get('user') or 'unknown user'} "
+            f"({meta.get('reason')}, {meta.get('mode')}), status {meta.get('status')}, started {meta.get('started_at')}"
+        )
+        for part in parts:
+            self.stdout.write(f"  {part['name']:<50} {part['duration_ms']:>10.1f} ms  [{part['thread']}]")
+        if options['part']:
+            parts = [part for part in parts if part['name'] == options['part']]
+            if not parts:
+                raise CommandError(f"No part {options['part']!r} in {meta['id']}")
+
+        prof_files = [os.path.join(path, f"{part['name']}.prof") for part in parts]
+        prof_files = [name for name in prof_files if os.path.exists(name)]
+        if prof_files:
+            stream = io.StringIO()
+            stats = pstats.Stats(*prof_files, stream=stream)
+            stats.strip_dirs().sort_stats(options['sort']).print_stats(options['top'])
+            self.stdout.write(stream.getvalue())
+
+        folded_files = [os.path.join(path, f"{part['name']}.folded") for part in parts]
+        folded_files = [name for name in folded_files if os.path.exists(name)]
+        if folded_files:
+            self._summarize_folded(folded_files, options['top'])
+
+    def _summarize_folded(self, paths, top):
+        own, inclusive = Counter(), Counter()
+        total = 0
+        for path in paths:
+            with open(path) as fh:
+                for line in fh:
+                    stack, _, count = line.rstrip('\n').rpartition(' ')
+                    count = int(count)
+                    frames = stack.split(';')
+                    total += count
+                    own[frames[-1]] += count
+                    for frame in set(frames):
+                        inclusive[frame] += count
+        if not total:
+            self.stdout.write("No samples (the parts finished faster than the sampling interval)")
+            return
+        self.stdout.write(f"\n{total} sample(s). Top frames by own samples:")
+        for frame, count in own.most_common(top):
+            self.stdout.write(f"  {count / total:>6.1%}  {frame}")
+        self.stdout.write("Top frames by inclusive samples:")
+        for frame, count in inclusive.most_common(top):
+            self.stdout.write(f"  {count / total:>6.1%}  {frame}")
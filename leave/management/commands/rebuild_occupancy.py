@@ -0,0 +1,30 @@
+import time
+from datetime import datetime
+
+from django.core.management.base import BaseCommand, CommandError
+
+from leave.occupancy import rebuild_occupancy
+
+
+class Command(BaseCommand):
+    help = "Recompute the DailyOccupancy table from leave requests (all dates, or a date range)"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--from', dest='start', help="First date to rebuild (YYYY-MM-DD)")
+        parser.add_argument('--to', dest='end', help="Last date to rebuild (YYYY-MM-DD)")
+
+    def handle(self, *args, **options):
+        try:
+            start = datetime.strptime(options['start'], '%Y-%m-%d').date() if options['start'] else None
+            end = datetime.strptime(options['end'], '%Y-%m-%d').date() if options['end'] else None
+        except ValueError:
+            raise CommandError("Dates must be in YYYY-MM-DD format")
+        if start and end and end < start:
+            raise CommandError("--to must not be before --from")
+
+        started = time.perf_counter()
+        rows = rebuild_occupancy(start, end)
+        self.stdout.write(self.style.SUCCESS(
+            f"Rebuilt {rows} occupancy row(s) for {start or 'beginning'} to {end or 'end'} "
+            f"in {time.perf_counter() - started:.2f}s"
+        ))
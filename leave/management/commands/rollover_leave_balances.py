@@ -0,0 +1,40 @@
+from datetime import datetime
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.utils import timezone
+
+from leave.leave_utils import rollover_leave_balances
+from leave.models import BalanceRollover
+
+
+class Command(BaseCommand):
+    help = "Reset monthly casual/sick leave balances for all users (safe to run repeatedly)"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--date',
+            help="Roll over for the month containing this date (YYYY-MM-DD). Defaults to today."
+        )
+
+    def handle(self, *args, **options):
+        if options['date']:
+            try:
+                day = datetime.strptime(options['date'], '%Y-%m-%d').date()
+            except ValueError:
+                raise CommandError("--date must be in YYYY-MM-DD format")
+        else:
+            day = timezone.now().date()
+        period = day.replace(day=1)
+
+        with transaction.atomic():
+            rows = rollover_leave_balances(period)
+            rollover, created = BalanceRollover.objects.select_for_update().get_or_create(period=period)
+            rollover.rows_updated += rows
+            rollover.save()
+
+        last = BalanceRollover.objects.first()
+        self.stdout.write(self.style.SUCCESS(
+            f"Rolled over {rows} balance(s) for {period:%Y-%m} "
+            f"(watermark: {last.period:%Y-%m}, {rollover.rows_updated} row(s) total this period)"
+        ))
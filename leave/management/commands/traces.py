@@ -0,0 +1,86 @@
+import json
+import os
+from collections import defaultdict
+from datetime import datetime
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+
+def _load_spans(path):
+    traces = defaultdict(list)
+    with open(path) as fh:
+        for line in fh:
+            try:
+                entry = json.loads(line)
+            except ValueError:
+                continue  # a line cut short by a crash mid-write
+            traces[entry['trace']].append(entry)
+    return traces
+
+
+def _bounds(spans):
+    start = min(entry['start'] for entry in spans)
+    end = max(entry['start'] + entry['duration_ms'] / 1000 for entry in spans)
+    return start, (end - start) * 1000
+
+
+class Command(BaseCommand):
+    help = "List traces written to LEAVE_TRACE_FILE by leave.tracing, or show one as a timed span tree"
+
+    def add_arguments(self, parser):
+        parser.add_argument('trace', nargs='?', help="Trace id (or unique prefix) to show")
+        parser.add_argument('--file', help="Span file (default LEAVE_TRACE_FILE)")
+        parser.add_argument('--limit', type=int, default=20, help="Traces to list (default 20, newest first)")
+        parser.add_argument('--min-ms', type=float, default=0, help="Hide spans shorter than this in the tree")
+
+    def handle(self, *args, **options):
+        path = options['file'] or getattr(settings, 'LEAVE_TRACE_FILE', '')
+        if not path:
+            raise CommandError("No span file - set LEAVE_TRACE_FILE or pass --file")
+        if not os.path.exists(path):
+            self.stdout.write(f"No spans in {path}")
+            return
+        traces = _load_spans(path)
+
+        if options['trace']:
+            matches = [trace_id for trace_id in traces if trace_id.startswith(options['trace'])]
+            if len(matches) != 1:
+                raise CommandError(f"{len(matches)} traces match {options['trace']!r}")
+            return self._show(matches[0], traces[matches[0]], options['min_ms'])
+
+        ordered = sorted(traces.items(), key=lambda item: _bounds(item[1])[0], reverse=True)
+        self.stdout.write(f"{'trace':<16}  {'started':<19}  {'total ms':>9}  {'spans':>5}  root")
+        for trace_id, spans in ordered[:options['limit']]:
+            start, total_ms = _bounds(spans)
+            roots = [entry for entry in spans if not entry['parent']]
+            root = min(roots or spans, key=lambda entry: entry['start'])
+            self.stdout.write(
+                f"{trace_id:<16}  {datetime.fromtimestamp(start):%Y-%m-%d %H:%M:%S}  {total_ms:>9.1f}  "
+                f"{len(spans):>5}  {root['name']}"
+            )
+        self.stdout.write(f"{len(traces)} trace(s) in {path}")
+
+    def _show(self, trace_id, spans, min_ms):
+        start, total_ms = _bounds(spans)
+        self.stdout.write(f"Trace {trace_id}: {len(spans)} span(s), {total_ms:.1f} ms end to end")
+        self.stdout.write(f"{'offset ms':>10}  {'ms':>9}  span")
+
+        children = defaultdict(list)
+        ids = {entry['span'] for entry in spans}
+        for entry in spans:
+            # Spans whose parent is missing (still running, or written by another process) show as roots
+            children[entry['parent'] if entry['parent'] in ids else None].append(entry)
+
+        def walk(parent, depth):
+            for entry in sorted(children[parent], key=lambda entry: entry['start']):
+                if entry['duration_ms'] >= min_ms:
+                    attrs = ''.join(f" {key}={value}" for key, value in entry['attrs'].items())
+                    error = f" error={entry['error']}" if entry['error'] else ''
+                    self.stdout.write(
+                        f"{(entry['start'] - start) * 1000:>10.1f}  {entry['duration_ms']:>9.1f}  "
+                        f"{'  ' * depth}{entry['name']}  [{entry['thread']}]{attrs}{error}"
+                    )
+                walk(entry['span'], depth + 1)
+
+        walk(None, 0)
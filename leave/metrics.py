@@ -0,0 +1,383 @@
+"""
+Application metrics in Prometheus text format
+
+Counters and histograms live in this process and are served at /metrics
+by metrics_view, to LEAVE_METRICS_ALLOWED_IPS or to scrapers sending
+`Authorization: Bearer <LEAVE_METRICS_TOKEN>`. They cover:
+
+    leave_http_request*           request latency and count by route (and Slack command/interaction)
+    leave_db_queries*             queries per request and per background job
+    leave_slack_api*              Slack Web API latency, outcome and HTTP 429s by method
+    leave_llm_call*               LLM latency and outcome by call
+    leave_background_jobs*        background jobs: started, running, oldest running age, duration
+
+Recording is a dict lookup, a bisect and a few additions under a per-metric
+lock (about 2 microseconds, the lock held for a fraction of that), so it
+stays on in production. Each metric keeps at most MAX_SERIES label combinations - any
+more are folded into an 'other' series so unverified input (a made-up
+slash command, say) cannot grow memory. Values are per process: with
+several workers, scrape each one. LEAVE_METRICS_ENABLED=False turns
+collection and the endpoint off.
+"""
+from bisect import bisect_left
+from contextlib import contextmanager
+from functools import wraps
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connection
+from django.http import Http404, HttpResponse
+from django.utils.crypto import constant_time_compare
+from django.views.decorators.http import require_GET
+from urllib.parse import urlparse
+import threading
+import time
+import logging
+
+logger = logging.getLogger(__name__)
+
+MAX_SERIES = 500
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+JOB_BUCKETS = (0.01, 0.05, 0.1, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 300.0)
+QUERY_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100, 200, 500)
+
+_registry = []
+
+
+def metrics_enabled():
+    return getattr(settings, 'LEAVE_METRICS_ENABLED', True)
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+
+def _labels(names, values, extra=''):
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return '{' + ','.join(pairs) + '}' if pairs else ''
+
+
+def _number(value):
+    if value == float('inf'):
+        return '+Inf'
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class _Metric:
+    kind = None
+
+    def __init__(self, name, help_text, labelnames=()):
+        self.name = name
+        self.help = help_text
+        self.labelnames = tuple(labelnames)
+        self.lock = threading.Lock()
+        self.series = {}
+        _registry.append(self)
+
+    def _key(self, labels):
+        key = tuple(str(labels.get(name, '')) for name in self.labelnames)
+        if key not in self.series and len(self.series) >= MAX_SERIES:
+            return ('other',) * len(self.labelnames)
+        return key
+
+    def render(self):
+        lines = [f'# HELP {self.name} {self.help}', f'# TYPE {self.name} {self.kind}']
+        with self.lock:
+            snapshot = {key: self._copy(value) for key, value in self.series.items()}
+        for key, value in sorted(snapshot.items()):
+            lines.extend(self._render_series(key, value))
+        return lines
+
+    def reset(self):
+        with self.lock:
+            self.series.clear()
+
+
+class Counter(_Metric):
+    kind = 'counter'
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self.lock:
+            self.series[key] = self.series.get(key, 0) + amount
+
+    def value(self, **labels):
+        return self.series.get(tuple(str(labels.get(name, '')) for name in self.labelnames), 0)
+
+    def _copy(self, value):
+        return value
+
+    def _render_series(self, key, value):
+        return [f'{self.name}{_labels(self.labelnames, key)} {_number(value)}']
+
+
+class Histogram(_Metric):
+    kind = 'histogram'
+
+    def __init__(self, name, help_text, labelnames=(), buckets=LATENCY_BUCKETS):
+        super().__init__(name, help_text, labelnames)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value, **labels):
+        key = self._key(labels)
+        index = bisect_left(self.buckets, value)
+        with self.lock:
+            entry = self.series.get(key)
+            if entry is None:
+                # per-bucket (non-cumulative) counts + the +Inf bucket, then sum
+                entry = self.series[key] = [0] * (len(self.buckets) + 1) + [0.0]
+            entry[index] += 1
+            entry[-1] += value
+
+    @contextmanager
+    def time(self, **labels):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - started, **labels)
+
+    def _copy(self, value):
+        return list(value)
+
+    def _render_series(self, key, entry):
+        lines = []
+        cumulative = 0
+        for bound, count in zip(self.buckets + (float('inf'),), entry):
+            cumulative += count
+            le = 'le="%s"' % _number(bound)
+            lines.append(f'{self.name}_bucket{_labels(self.labelnames, key, le)} {cumulative}')
+        lines.append(f'{self.name}_sum{_labels(self.labelnames, key)} {_number(entry[-1])}')
+        lines.append(f'{self.name}_count{_labels(self.labelnames, key)} {cumulative}')
+        return lines
+
+
+class Gauge(_Metric):
+    """Computed at scrape time by fn, which returns a number or a list of (labels dict, number)"""
+    kind = 'gauge'
+
+    def __init__(self, name, help_text, fn, labelnames=()):
+        super().__init__(name, help_text, labelnames)
+        self.fn = fn
+
+    def render(self):
+        lines = [f'# HELP {self.name} {self.help}', f'# TYPE {self.name} gauge']
+        try:
+            values = self.fn()
+        except Exception as e:
+            logger.error(f"Error computing metric {self.name}: {e}")
+            return lines
+        if not isinstance(values, list):
+            values = [({}, values)]
+        for labels, value in values:
+            key = tuple(labels.get(name, '') for name in self.labelnames)
+            lines.append(f'{self.name}{_labels(self.labelnames, key)} {_number(value)}')
+        return lines
+
+
+def render():
+    """All metrics in Prometheus text exposition format (version 0.0.4)"""
+    lines = []
+    for metric in _registry:
+        lines.extend(metric.render())
+    return '\n'.join(lines) + '\n'
+
+
+def reset_metrics():
+    """Clear recorded values (benchmarks and checks start from zero)"""
+    for metric in _registry:
+        metric.reset()
+
+
+@require_GET
+def metrics_view(request):
+    """Prometheus scrape endpoint - 404 unless metrics are on and the caller is allowed"""
+    if not metrics_enabled():
+        raise Http404
+    token = getattr(settings, 'LEAVE_METRICS_TOKEN', '')
+    if token:
+        if not constant_time_compare(request.headers.get('Authorization', ''), f'Bearer {token}'):
+            raise Http404
+    elif request.META.get('REMOTE_ADDR') not in getattr(settings, 'LEAVE_METRICS_ALLOWED_IPS', ['127.0.0.1', '::1']):
+        raise Http404
+    return HttpResponse(render(), content_type='text/plain; version=0.0.4; charset=utf-8')
+
+
+# ---- HTTP requests and DB queries ----
+
+http_request_seconds = Histogram(
+    'leave_http_request_duration_seconds', 'Request latency by route and Slack command/interaction',
+    ('route', 'slack')
+)
+http_requests = Counter(
+    'leave_http_requests_total', 'Requests by route, Slack command/interaction and status class',
+    ('route', 'slack', 'status')
+)
+db_queries_per_request = Histogram(
+    'leave_db_queries_per_request', 'Database queries run on the request thread, by route',
+    ('route',), buckets=QUERY_BUCKETS
+)
+db_queries = Counter('leave_db_queries_total', 'Database queries by where they ran (request or job)', ('source',))
+
+
+def request_labels(request):
+    """(route name, Slack command/interaction or '') for a handled request, worked out once per request"""
+    labels = getattr(request, '_leave_route_labels', None)
+    if labels is None:
+        match = getattr(request, 'resolver_match', None)
+        route = (match.url_name or match.view_name) if match else 'unmatched'
+        slack = ''
+        if route == 'slack_events':
+            from .profiling import slack_request_info
+            slack = slack_request_info(request)[0]
+        labels = request._leave_route_labels = (route, slack)
+    return labels
+
+
+class _QueryCounter:
+    __slots__ = ('count',)
+
+    def __init__(self):
+        self.count = 0
+
+    def __call__(self, execute, sql, params, many, context):
+        self.count += 1
+        return execute(sql, params, many, context)
+
+
+class MetricsMiddleware:
+    """Records latency, status and query count for every request; removed at startup when metrics are off"""
+
+    def __init__(self, get_response):
+        if not metrics_enabled():
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+
+    def __call__(self, request):
+        queries = _QueryCounter()
+        started = time.perf_counter()
+        status = 500
+        try:
+            with connection.execute_wrapper(queries):
+                response = self.get_response(request)
+            status = response.status_code
+            return response
+        finally:
+            duration = time.perf_counter() - started
+            route, slack = request_labels(request)
+            http_request_seconds.observe(duration, route=route, slack=slack)
+            http_requests.inc(route=route, slack=slack, status=f'{status // 100}xx')
+            db_queries_per_request.observe(queries.count, route=route)
+            db_queries.inc(queries.count, source='request')
+
+
+# ---- Slack Web API ----
+
+slack_api_seconds = Histogram(
+    'leave_slack_api_duration_seconds', 'Slack Web API call latency by method, including rate-limit retries',
+    ('method',)
+)
+slack_api_calls = Counter('leave_slack_api_calls_total', 'Slack Web API calls by method and outcome', ('method', 'outcome'))
+slack_rate_limited = Counter(
+    'leave_slack_api_rate_limited_total', 'HTTP 429 responses from the Slack Web API by method (retried or not)',
+    ('method',)
+)
+
+
+def observe_slack_call(method, duration, outcome):
+    slack_api_seconds.observe(duration, method=method)
+    slack_api_calls.inc(method=method, outcome=outcome)
+
+
+def record_slack_rate_limit(url):
+    slack_rate_limited.inc(method=urlparse(url).path.rsplit('/', 1)[-1] or 'unknown')
+
+
+# ---- LLM calls ----
+
+llm_call_seconds = Histogram('leave_llm_call_duration_seconds', 'LLM call latency by call', ('call',))
+llm_calls = Counter('leave_llm_calls_total', 'LLM calls by call and outcome', ('call', 'outcome'))
+
+
+def observe_llm(call):
+    """Decorator for LLM entry points - results carrying an 'error' key count as errors"""
+    def decorator(func):
+        @wraps(func)
+        def wrapper(*args, **kwargs):
+            if not metrics_enabled():
+                return func(*args, **kwargs)
+            started = time.perf_counter()
+            outcome = 'exception'
+            try:
+                result = func(*args, **kwargs)
+                outcome = 'error' if isinstance(result, dict) and result.get('error') else 'ok'
+                return result
+            finally:
+                llm_call_seconds.observe(time.perf_counter() - started, call=call)
+                llm_calls.inc(call=call, outcome=outcome)
+        return wrapper
+    return decorator
+
+
+# ---- Background jobs ----
+
+_jobs_lock = threading.Lock()
+_running_jobs = {}  # id -> (job name, start time)
+
+background_jobs = Counter('leave_background_jobs_total', 'Background jobs by job and outcome', ('job', 'outcome'))
+background_job_seconds = Histogram(
+    'leave_background_job_duration_seconds', 'Background job run time by job', ('job',), buckets=JOB_BUCKETS
+)
+
+
+def _running_by_job():
+    with _jobs_lock:
+        running = list(_running_jobs.values())
+    counts = {}
+    for name, _ in running:
+        counts[name] = counts.get(name, 0) + 1
+    return [({'job': name}, count) for name, count in sorted(counts.items())]
+
+
+def _oldest_job_age():
+    with _jobs_lock:
+        starts = [started for _, started in _running_jobs.values()]
+    return time.monotonic() - min(starts) if starts else 0
+
+
+Gauge('leave_background_jobs_in_flight', 'Background jobs currently running (the job queue depth)', lambda: len(_running_jobs))
+Gauge('leave_background_jobs_running', 'Background jobs currently running, by job', _running_by_job, ('job',))
+Gauge('leave_background_oldest_job_age_seconds', 'Age of the oldest running background job', _oldest_job_age)
+
+
+@contextmanager
+def track_job(name):
+    """Count a background job as running for the duration of the block, with its queries and run time"""
+    if not metrics_enabled():
+        yield
+        return
+    job_id = object()
+    started = time.monotonic()
+    with _jobs_lock:
+        _running_jobs[job_id] = (name, started)
+    queries = _QueryCounter()
+    outcome = 'error'
+    try:
+        with connection.execute_wrapper(queries):
+            yield
+        outcome = 'ok'
+    finally:
+        with _jobs_lock:
+            del _running_jobs[job_id]
+        background_job_seconds.observe(time.monotonic() - started, job=name)
+        background_jobs.inc(job=name, outcome=outcome)
+        db_queries.inc(queries.count, source='job')
+
+
+# ---- Process ----
+
+_process_started = time.time()
+Gauge('leave_process_start_time_seconds', 'Start time of the process since the epoch', lambda: _process_started)
+Gauge('leave_threads', 'Live threads in the process', threading.active_count)
@@ -0,0 +1,33 @@
+from django.db import migrations, models
+import django.db.models.deletion
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('leave', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='LeaveDocument',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('file_id', models.CharField(db_index=True, max_length=50)),
+                ('file_name', models.CharField(default='document', max_length=255)),
+                ('file_type', models.CharField(default='unknown', max_length=50)),
+                ('file_size', models.BigIntegerField(default=0)),
+                ('permalink', models.URLField(blank=True, max_length=500, null=True)),
+                ('url_private', models.URLField(blank=True, max_length=500, null=True)),
+                ('employee_notes', models.TextField(blank=True, null=True)),
+                ('shared_with', models.JSONField(blank=True, default=dict)),
+                ('uploaded_at', models.DateTimeField(default=django.utils.timezone.now)),
+                ('leave', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='documents', to='leave.leaverequest')),
+            ],
+            options={
+                'ordering': ['-uploaded_at'],
+                'indexes': [models.Index(fields=['leave', '-uploaded_at'], name='leave_doc_leave_uploaded_idx')],
+            },
+        ),
+    ]
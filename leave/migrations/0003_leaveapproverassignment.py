@@ -0,0 +1,83 @@
+import json
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+FINAL_STATES = {
+    'APPROVED': 'APPROVED',
+    'APPROVED_UNPAID': 'APPROVED',
+    'APPROVED_COMP': 'APPROVED',
+    'APPROVED_COMPENSATORY': 'APPROVED',
+    'REJECTED': 'REJECTED',
+    'CANCELLED': 'CANCELLED',
+}
+
+
+def copy_legacy_manager_columns(apps, schema_editor):
+    """Create assignments from selected_managers (CSV) and manager_threads (JSON)"""
+    connection = schema_editor.connection
+    table = 'leave_leaverequest'
+    with connection.cursor() as cursor:
+        columns = {col.name for col in connection.introspection.get_table_description(cursor, table)}
+        if 'selected_managers' not in columns and 'manager_threads' not in columns:
+            return
+        selected_col = 'selected_managers' if 'selected_managers' in columns else 'NULL'
+        threads_col = 'manager_threads' if 'manager_threads' in columns else 'NULL'
+        cursor.execute(f"SELECT id, status, {selected_col}, {threads_col} FROM {table}")
+        rows = cursor.fetchall()
+
+    LeaveApproverAssignment = apps.get_model('leave', 'LeaveApproverAssignment')
+    assignments = []
+    for leave_id, status, selected, threads in rows:
+        if isinstance(threads, str):
+            try:
+                threads = json.loads(threads)
+            except ValueError:
+                threads = {}
+        threads = threads if isinstance(threads, dict) else {}
+
+        managers = [m.strip() for m in (selected or '').split(',') if m.strip()]
+        managers += [m for m in threads if m not in managers]
+        for manager_id in managers:
+            assignments.append(LeaveApproverAssignment(
+                leave_id=leave_id,
+                manager_slack_id=manager_id,
+                channel=manager_id,
+                thread_ts=threads.get(manager_id),
+                state=FINAL_STATES.get(status, 'PENDING'),
+            ))
+
+    LeaveApproverAssignment.objects.bulk_create(assignments, batch_size=500, ignore_conflicts=True)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('leave', '0002_leavedocument'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='LeaveApproverAssignment',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('manager_slack_id', models.CharField(max_length=50)),
+                ('channel', models.CharField(blank=True, max_length=50, null=True)),
+                ('thread_ts', models.CharField(blank=True, max_length=50, null=True)),
+                ('state', models.CharField(choices=[('PENDING', 'Pending'), ('APPROVED', 'Approved'), ('REJECTED', 'Rejected'), ('CANCELLED', 'Cancelled')], default='PENDING', max_length=20)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('leave', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='approver_assignments', to='leave.leaverequest')),
+            ],
+            options={
+                'ordering': ['id'],
+                'indexes': [models.Index(fields=['manager_slack_id', 'state'], name='leave_approver_mgr_state_idx'), models.Index(fields=['state'], name='leave_approver_state_idx')],
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='leaveapproverassignment',
+            constraint=models.UniqueConstraint(fields=('leave', 'manager_slack_id'), name='leave_approver_unique'),
+        ),
+        migrations.RunPython(copy_legacy_manager_columns, migrations.RunPython.noop),
+    ]
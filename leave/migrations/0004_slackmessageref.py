@@ -0,0 +1,33 @@
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('leave', '0003_leaveapproverassignment'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SlackMessageRef',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('channel', models.CharField(max_length=50)),
+                ('ts', models.CharField(max_length=50)),
+                ('thread_ts', models.CharField(blank=True, max_length=50, null=True)),
+                ('role', models.CharField(choices=[('EMPLOYEE', 'Employee'), ('MANAGER', 'Manager'), ('MANAGER_CHANNEL', 'Manager Channel'), ('DOCUMENT', 'Document')], max_length=20)),
+                ('manager_slack_id', models.CharField(blank=True, max_length=50, null=True)),
+                ('notification_type', models.CharField(blank=True, max_length=50, null=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('leave', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='slack_messages', to='leave.leaverequest')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['channel', 'thread_ts'], name='slack_msg_channel_thread_idx')],
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='slackmessageref',
+            constraint=models.UniqueConstraint(fields=('channel', 'ts'), name='slack_msg_channel_ts_unique'),
+        ),
+    ]
@@ -0,0 +1,23 @@
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('leave', '0004_slackmessageref'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='BalanceRollover',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('period', models.DateField(unique=True)),
+                ('rows_updated', models.IntegerField(default=0)),
+                ('rolled_at', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'ordering': ['-period'],
+            },
+        ),
+    ]
@@ -0,0 +1,77 @@
+from collections import defaultdict
+from datetime import timedelta
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+APPROVED = {'APPROVED', 'APPROVED_UNPAID', 'APPROVED_COMP', 'APPROVED_COMPENSATORY'}
+PENDING = {'PENDING', 'PENDING_DOCS', 'DOCS_SUBMITTED', 'DOCS_PENDING_LATER', 'PENDING_UNPAID', 'PENDING_COMP', 'PENDING_COMP_DATE'}
+
+
+def build_occupancy(apps, schema_editor):
+    """Seed DailyOccupancy from existing leave requests"""
+    LeaveRequest = apps.get_model('leave', 'LeaveRequest')
+    UserRole = apps.get_model('leave', 'UserRole')
+    Team = apps.get_model('leave', 'Team')
+    DailyOccupancy = apps.get_model('leave', 'DailyOccupancy')
+
+    departments = dict(UserRole.objects.exclude(department__isnull=True).values_list('user_id', 'department_id'))
+    teams = defaultdict(list)
+    for user_id, team_id in Team.members.through.objects.values_list('user_id', 'team_id'):
+        teams[user_id].append(team_id)
+
+    counts = defaultdict(lambda: {'approved_count': 0, 'pending_count': 0})
+    rows = LeaveRequest.objects.filter(status__in=APPROVED | PENDING).values_list('employee_id', 'status', 'start_date', 'end_date')
+    for user_id, status, start_date, end_date in rows.iterator():
+        bucket = 'approved_count' if status in APPROVED else 'pending_count'
+        scopes = [(None, None)]
+        if user_id in departments:
+            scopes.append((departments[user_id], None))
+        scopes += [(None, team_id) for team_id in teams.get(user_id, [])]
+        for offset in range(max((end_date - start_date).days + 1, 0)):
+            day = start_date + timedelta(days=offset)
+            for department_id, team_id in scopes:
+                counts[(day, department_id, team_id)][bucket] += 1
+
+    DailyOccupancy.objects.bulk_create(
+        [
+            DailyOccupancy(date=day, department_id=department_id, team_id=team_id, **values)
+            for (day, department_id, team_id), values in counts.items()
+        ],
+        batch_size=1000
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('leave', '0006_holiday'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DailyOccupancy',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField()),
+                ('approved_count', models.IntegerField(default=0)),
+                ('pending_count', models.IntegerField(default=0)),
+                ('department', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, to='leave.department')),
+                ('team', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, to='leave.team')),
+            ],
+        ),
+        migrations.AddConstraint(
+            model_name='dailyoccupancy',
+            constraint=models.UniqueConstraint(condition=models.Q(('department__isnull', False)), fields=('department', 'date'), name='occupancy_department_date_unique'),
+        ),
+        migrations.AddConstraint(
+            model_name='dailyoccupancy',
+            constraint=models.UniqueConstraint(condition=models.Q(('team__isnull', False)), fields=('team', 'date'), name='occupancy_team_date_unique'),
+        ),
+        migrations.AddConstraint(
+            model_name='dailyoccupancy',
+            constraint=models.UniqueConstraint(condition=models.Q(('department__isnull', True), ('team__isnull', True)), fields=('date',), name='occupancy_org_date_unique'),
+        ),
+        migrations.RunPython(build_occupancy, migrations.RunPython.noop),
+    ]
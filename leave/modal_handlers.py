@@ -1,15 +1,18 @@
-from django.http import JsonResponse
+from .json_codec import JsonResponse
 from .slack_utils import slack_client, get_or_create_user, update_leave_thread, start_leave_request_thread
 from .leave_utils import get_leave_balance, get_conflicts_details, get_department_conflicts, get_team_conflicts
 from .models import LeaveRequest, UserRole, Department
+from .working_days import working_days
+from .query_budget import query_budget
 from django.utils import timezone
 from datetime import datetime
 from slack_sdk.errors import SlackApiError
 import logging
-import threading
+from .background import run_in_background
 
 logger = logging.getLogger(__name__)
 
+@query_budget(2)
 def handle_leave_request_modal_submission(payload):
     """
     Handle leave request modal submission with immediate response
@@ -30,17 +33,15 @@ def handle_leave_request_modal_submission(payload):
     """
     try:
         # IMMEDIATE RESPONSE - Return success first to avoid timeout
+        @query_budget(40)
         def process_leave_request_background():
             """Background function to process leave request"""
             try:
-                values = payload['view']['state']['values']
-                leave_type = values['leave_type']['leave_type_select']['selected_option']['value']
-                start_date = datetime.strptime(values['start_date']['start_date_select']['selected_date'], '%Y-%m-%d').date()
-                end_date = datetime.strptime(values['end_date']['end_date_select']['selected_date'], '%Y-%m-%d').date()
-                reason = values['reason']['reason_input']['value']
-                # Fix backup_person None value issue
-                backup_person_value = values.get('backup_person', {}).get('backup_person_input', {}).get('value')
-                backup_person = backup_person_value if backup_person_value is not None else ''
+                leave_type = payload.required('leave_type', 'leave_type_select')
+                start_date = payload.date('start_date', 'start_date_select', required=True)
+                end_date = payload.date('end_date', 'end_date_select', required=True)
+                reason = payload.value('reason', 'reason_input')
+                backup_person = payload.value('backup_person', 'backup_person_input', '')
                 
                 # Validate dates
                 if start_date > end_date:
@@ -50,23 +51,23 @@ def handle_leave_request_modal_submission(payload):
                 if start_date < today:
                     try:
                         slack_client.chat_postMessage(
-                            channel=payload['user']['id'],
+                            channel=payload.user_id,
                             text='❌ Start date cannot be in the past. Please submit a new request with valid dates.'
                         )
                     except SlackApiError:
                         slack_client.chat_postMessage(
                             channel='leave_app',
-                            text=f'❌ <@{payload["user"]["id"]}> - Start date cannot be in the past.'
+                            text=f'❌ <@{payload.user_id}> - Start date cannot be in the past.'
                         )
                     return
                 
                 # Calculate duration
-                duration = (end_date - start_date).days + 1
+                duration = working_days(start_date, end_date)
                 
                 # Check balance and conflicts
                 from .leave_utils import get_leave_balance, get_conflicts_details
-                user = get_or_create_user(payload['user']['id'])
-                balance = get_leave_balance(payload['user']['id'])
+                user = get_or_create_user(payload.user_id)
+                balance = get_leave_balance(payload.user_id)
                 conflicts = get_conflicts_details(start_date, end_date, user)
                 
                 # Check balance but don't reject - send to managers with balance info
@@ -358,16 +359,14 @@ def handle_leave_request_modal_submission(payload):
                     else:
                         # Fallback to DM without thread
                         slack_client.chat_postMessage(
-                            channel=payload['user']['id'],
+                            channel=payload.user_id,
                             text=f'❌ Error processing leave request: {str(e)}'
                         )
                 except:
                     pass
         
         # Start background thread
-        thread = threading.Thread(target=process_leave_request_background)
-        thread.daemon = True
-        thread.start()
+        run_in_background(process_leave_request_background)
         
         # Return immediate response to close modal
         return JsonResponse({"response_action": "clear"})
@@ -383,6 +382,7 @@ def handle_leave_request_modal_submission(payload):
 
 # Add AI support wrapper function for backward compatibility
 
+@query_budget(42)
 def process_leave_request_core_with_ai(user_id, leave_type, start_date, end_date, reason, backup_person, is_ai_request=False, original_query=''):
     """Enhanced version of leave processing with AI support"""
     try:
@@ -409,7 +409,7 @@ def process_leave_request_core_with_ai(user_id, leave_type, start_date, end_date
             }
         
         # Calculate duration
-        duration = (end_date - start_date).days + 1
+        duration = working_days(start_date, end_date)
         
         # Get user and check balance
         user = get_or_create_user(user_id)
@@ -701,15 +701,15 @@ def process_leave_request_core_with_ai(user_id, leave_type, start_date, end_date
             'message': f'Error processing leave request: {str(e)}'
         }
 
+@query_budget(2)
 def handle_email_leave_request_modal_submission(payload):
     """Handle email-style leave request modal submission with AI processing"""
     try:
-        values = payload['view']['state']['values']
-        user_id = payload['user']['id']
+        user_id = payload.user_id
         
         # Extract email form data
-        selected_managers = values['email_to']['managers_select']['selected_users']
-        content_text = values['email_content']['content_input']['value']
+        selected_managers = payload.value('email_to', 'managers_select', [])
+        content_text = payload.value('email_content', 'content_input')
         
         if not selected_managers:
             return JsonResponse({
@@ -727,6 +727,7 @@ def handle_email_leave_request_modal_submission(payload):
                 }
             })
         
+        @query_budget(64)
         def process_email_leave_request():
             """Background function to process email leave request with AI"""
             try:
@@ -776,7 +777,7 @@ def handle_email_leave_request_modal_submission(payload):
                 from .models import LeaveRequest, UserRole
                 start_date = datetime.strptime(ai_response['start_date'], '%Y-%m-%d').date()
                 end_date = datetime.strptime(ai_response['end_date'], '%Y-%m-%d').date()
-                days = (end_date - start_date).days + 1
+                days = working_days(start_date, end_date)
                 
                 leave_request = LeaveRequest.objects.create(
                     employee=user,
@@ -788,9 +789,8 @@ def handle_email_leave_request_modal_submission(payload):
                     status='PENDING'
                 )
                 
-                # Set selected managers after creation
-                leave_request.selected_managers = ','.join(selected_managers)
-                leave_request.save()
+                # Set selected managers after creation (one approver assignment per manager)
+                leave_request.set_selected_managers(selected_managers)
                 
                 # Get conflicts and department info like the original workflow
                 conflicts = get_conflicts_details(start_date, end_date, user)
@@ -1072,9 +1072,7 @@ def handle_email_leave_request_modal_submission(payload):
                     pass
         
         # Start background processing
-        thread = threading.Thread(target=process_email_leave_request)
-        thread.daemon = True
-        thread.start()
+        run_in_background(process_email_leave_request)
         
         # Return immediate success to clear modal
         return JsonResponse({"response_action": "clear"})
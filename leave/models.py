@@ -34,6 +34,10 @@ class Team(models.Model):
         return self.name
 
 class LeaveBalance(models.Model):
+    # Monthly allowance restored by the rollover job (rollover_leave_balances)
+    MONTHLY_CASUAL = 2
+    MONTHLY_SICK = 5
+
     user = models.OneToOneField(User, on_delete=models.CASCADE)
     casual_leave = models.IntegerField(default=2)
     sick_leave = models.IntegerField(default=5)
@@ -47,34 +51,57 @@ class LeaveBalance(models.Model):
     def __str__(self):
         return f"{self.user.username}'s Leave Balance"
 
+    def is_stale(self, today=None):
+        """True if the row has not been rolled over for the current month yet"""
+        today = today or timezone.now().date()
+        if not self.last_reset_date:
+            return False
+        return (self.last_reset_date.year, self.last_reset_date.month) < (today.year, today.month)
+
     def reset_monthly_balance(self):
+        """Roll this row over now if the monthly job has not reached it (used before writes)"""
         today = timezone.now().date()
-        if self.last_reset_date.month != today.month or self.last_reset_date.year != today.year:
-            self.casual_leave = 2
-            self.sick_leave = 5
+        if self.is_stale(today):
+            self.casual_leave = self.MONTHLY_CASUAL
+            self.sick_leave = self.MONTHLY_SICK
             self.casual_used = 0  # Reset used days
             self.sick_used = 0    # Reset used days
-            self.last_reset_date = today
+            self.last_reset_date = today.replace(day=1)
             self.save()
 
     def get_used_days(self, leave_type):
+        # Stale rows are read as already rolled over - reads never write
+        stale = self.is_stale()
         if leave_type == 'CASUAL':
-            return self.casual_used
+            return 0 if stale else self.casual_used
         elif leave_type == 'SICK':
-            return self.sick_used
+            return 0 if stale else self.sick_used
         return 0
 
     def get_remaining_days(self, leave_type):
+        stale = self.is_stale()
         if leave_type == 'CASUAL':
-            return max(0, self.casual_leave - self.casual_used)
+            return self.MONTHLY_CASUAL if stale else max(0, self.casual_leave - self.casual_used)
         elif leave_type == 'SICK':
-            return max(0, self.sick_leave - self.sick_used)
+            return self.MONTHLY_SICK if stale else max(0, self.sick_leave - self.sick_used)
         elif leave_type == 'MATERNITY':
             return self.maternity_leave
         elif leave_type == 'PATERNITY':
             return self.paternity_leave
         return 0
 
+class BalanceRollover(models.Model):
+    """Watermark for the monthly balance rollover - one row per month rolled over"""
+    period = models.DateField(unique=True)  # First day of the month
+    rows_updated = models.IntegerField(default=0)
+    rolled_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        ordering = ['-period']
+
+    def __str__(self):
+        return f"Rollover {self.period:%Y-%m} ({self.rows_updated} rows)"
+
 class LeaveRequest(models.Model):
     LEAVE_TYPES = [
         ('CASUAL', 'Casual Leave'),
@@ -134,31 +161,231 @@ class LeaveRequest(models.Model):
     # Manager selection for email workflow
     selected_managers = models.TextField(null=True, blank=True)  # Store comma-separated manager IDs
 
+    class Meta:
+        indexes = [
+            # Incremental leave index sync (leave_index.sync_from_db) reads recently saved rows
+            models.Index(fields=['updated_at'], name='leave_request_updated_idx'),
+        ]
+
     def __str__(self):
         return f"{self.employee.username}'s {self.get_leave_type_display()} ({self.start_date} to {self.end_date})"
     
     def get_selected_managers_list(self):
-        """Return list of selected manager IDs"""
+        """Return list of selected manager IDs (assignment table first, legacy CSV fallback)"""
+        assignments = self._get_approver_assignments()
+        if assignments:
+            return [assignment.manager_slack_id for assignment in assignments]
         if self.selected_managers:
             return [manager.strip() for manager in self.selected_managers.split(',') if manager.strip()]
         return []
-    def get_manager_thread(self, manager_id):
-        """Get thread timestamp for specific manager with fallback"""
-        if self.manager_threads and manager_id in self.manager_threads:
-            return self.manager_threads[manager_id]
-        # FALLBACK to main thread_ts for backward compatibility
-        return self.thread_ts
     
-    def set_manager_thread(self, manager_id, thread_ts):
+    def set_selected_managers(self, manager_ids):
+        """Store selected managers as approver assignments (CSV kept for older code paths)"""
+        self.selected_managers = ','.join(manager_ids)
+        self.save(update_fields=['selected_managers'])
+        LeaveApproverAssignment.objects.bulk_create(
+            [LeaveApproverAssignment(leave=self, manager_slack_id=manager_id) for manager_id in manager_ids],
+            ignore_conflicts=True
+        )
+        self.__dict__.pop('_approver_assignments', None)
+    
+    def set_manager_thread(self, manager_id, thread_ts, channel=None):
         """Store thread timestamp for specific manager"""
+        # The assignment normally exists already (set_selected_managers) - one UPDATE instead of update_or_create
+        updated = LeaveApproverAssignment.objects.filter(leave=self, manager_slack_id=manager_id).update(
+            thread_ts=thread_ts, channel=channel or manager_id, updated_at=timezone.now()
+        )
+        if not updated:
+            LeaveApproverAssignment.objects.create(
+                leave=self, manager_slack_id=manager_id, thread_ts=thread_ts, channel=channel or manager_id
+            )
+        self.__dict__.pop('_approver_assignments', None)
+        # Keep the legacy JSON column in step until all readers use assignments
         if not self.manager_threads:
             self.manager_threads = {}
         self.manager_threads[manager_id] = thread_ts
-        self.save()
+        self.save(update_fields=['manager_threads'])
     
     def get_manager_thread(self, manager_id):
         """Get thread timestamp for specific manager"""
+        for assignment in self._get_approver_assignments():
+            if assignment.manager_slack_id == manager_id and assignment.thread_ts:
+                return assignment.thread_ts
         return self.manager_threads.get(manager_id) if self.manager_threads else None
+    
+    def _get_approver_assignments(self):
+        """Assignments for this leave - uses prefetch_related results when available"""
+        if not self.pk:
+            return []
+        if '_approver_assignments' not in self.__dict__:
+            self.__dict__['_approver_assignments'] = list(self.approver_assignments.all())
+        return self.__dict__['_approver_assignments']
+    
+    def save(self, *args, **kwargs):
+        super().save(*args, **kwargs)
+        # Close open approver assignments once the request reaches a final status
+        assignment_state = APPROVER_STATE_FOR_STATUS.get(self.status)
+        if assignment_state:
+            update_fields = kwargs.get('update_fields')
+            if update_fields is None or 'status' in update_fields:
+                LeaveApproverAssignment.objects.filter(leave=self, state='PENDING').update(
+                    state=assignment_state,
+                    updated_at=timezone.now()
+                )
+                self.__dict__.pop('_approver_assignments', None)
+
+# Leave status -> state for approver assignments that are still pending
+APPROVER_STATE_FOR_STATUS = {
+    'APPROVED': 'APPROVED',
+    'APPROVED_UNPAID': 'APPROVED',
+    'APPROVED_COMP': 'APPROVED',
+    'APPROVED_COMPENSATORY': 'APPROVED',
+    'REJECTED': 'REJECTED',
+    'CANCELLED': 'CANCELLED',
+}
+
+class LeaveApproverAssignment(models.Model):
+    """A manager selected to approve a leave request, with that manager's DM thread"""
+    STATE_CHOICES = [
+        ('PENDING', 'Pending'),
+        ('APPROVED', 'Approved'),
+        ('REJECTED', 'Rejected'),
+        ('CANCELLED', 'Cancelled')
+    ]
+
+    leave = models.ForeignKey(LeaveRequest, on_delete=models.CASCADE, related_name='approver_assignments')
+    manager_slack_id = models.CharField(max_length=50)
+    channel = models.CharField(max_length=50, null=True, blank=True)
+    thread_ts = models.CharField(max_length=50, null=True, blank=True)
+    state = models.CharField(max_length=20, choices=STATE_CHOICES, default='PENDING')
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        ordering = ['id']
+        constraints = [
+            models.UniqueConstraint(fields=['leave', 'manager_slack_id'], name='leave_approver_unique'),
+        ]
+        indexes = [
+            models.Index(fields=['manager_slack_id', 'state'], name='leave_approver_mgr_state_idx'),
+            models.Index(fields=['state'], name='leave_approver_state_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.manager_slack_id} - leave {self.leave_id} ({self.state})"
+
+class LeaveDocument(models.Model):
+    """Supporting document uploaded for a leave request (one row per uploaded file)"""
+    leave = models.ForeignKey(LeaveRequest, on_delete=models.CASCADE, related_name='documents')
+    file_id = models.CharField(max_length=50, db_index=True)
+    file_name = models.CharField(max_length=255, default='document')
+    file_type = models.CharField(max_length=50, default='unknown')
+    file_size = models.BigIntegerField(default=0)
+    permalink = models.URLField(max_length=500, null=True, blank=True)
+    url_private = models.URLField(max_length=500, null=True, blank=True)
+    employee_notes = models.TextField(null=True, blank=True)
+    # Share state per manager: {manager_slack_id: {"shared": bool, "shared_at": iso timestamp}}
+    shared_with = models.JSONField(default=dict, blank=True)
+    uploaded_at = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        ordering = ['-uploaded_at']
+        indexes = [
+            models.Index(fields=['leave', '-uploaded_at'], name='leave_doc_leave_uploaded_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.file_name} ({self.file_id}) for leave {self.leave_id}"
+
+    def is_shared_with(self, manager_id):
+        """Check if the file was already shared to a manager's DM"""
+        return bool(self.shared_with and self.shared_with.get(manager_id, {}).get('shared'))
+
+    def mark_shared(self, manager_id):
+        """Record that the file was shared to a manager's DM"""
+        if not self.shared_with:
+            self.shared_with = {}
+        self.shared_with[manager_id] = {
+            'shared': True,
+            'shared_at': timezone.now().isoformat()
+        }
+        self.save(update_fields=['shared_with'])
+
+class SlackMessageRef(models.Model):
+    """Slack message posted by the bot for a leave request - (channel, ts) -> leave lookup"""
+    ROLE_CHOICES = [
+        ('EMPLOYEE', 'Employee'),
+        ('MANAGER', 'Manager'),
+        ('MANAGER_CHANNEL', 'Manager Channel'),
+        ('DOCUMENT', 'Document')
+    ]
+
+    channel = models.CharField(max_length=50)
+    ts = models.CharField(max_length=50)
+    thread_ts = models.CharField(max_length=50, null=True, blank=True)
+    leave = models.ForeignKey(LeaveRequest, on_delete=models.CASCADE, related_name='slack_messages')
+    role = models.CharField(max_length=20, choices=ROLE_CHOICES)
+    manager_slack_id = models.CharField(max_length=50, null=True, blank=True)
+    notification_type = models.CharField(max_length=50, null=True, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['channel', 'ts'], name='slack_msg_channel_ts_unique'),
+        ]
+        indexes = [
+            models.Index(fields=['channel', 'thread_ts'], name='slack_msg_channel_thread_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.channel}/{self.ts} -> leave {self.leave_id} ({self.role})"
+
+class Holiday(models.Model):
+    """Public holiday - excluded from working-day counts (see working_days.py)"""
+    calendar = models.CharField(max_length=50, default='default')  # e.g. a country/office code
+    date = models.DateField()
+    name = models.CharField(max_length=100)
+
+    class Meta:
+        ordering = ['date']
+        constraints = [
+            models.UniqueConstraint(fields=['calendar', 'date'], name='holiday_calendar_date_unique'),
+        ]
+
+    def __str__(self):
+        return f"{self.name} ({self.date}, {self.calendar})"
+
+class DailyOccupancy(models.Model):
+    """
+    Approved/pending leave headcount per day for a department, a team, or the
+    whole organisation (department and team both empty). Maintained by
+    occupancy.py through signals - rebuild with `manage.py rebuild_occupancy`.
+    """
+    date = models.DateField()
+    department = models.ForeignKey(Department, on_delete=models.CASCADE, null=True, blank=True)
+    team = models.ForeignKey(Team, on_delete=models.CASCADE, null=True, blank=True)
+    approved_count = models.IntegerField(default=0)
+    pending_count = models.IntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=['department', 'date'], condition=models.Q(department__isnull=False),
+                name='occupancy_department_date_unique'
+            ),
+            models.UniqueConstraint(
+                fields=['team', 'date'], condition=models.Q(team__isnull=False),
+                name='occupancy_team_date_unique'
+            ),
+            models.UniqueConstraint(
+                fields=['date'], condition=models.Q(department__isnull=True, team__isnull=True),
+                name='occupancy_org_date_unique'
+            ),
+        ]
+
+    def __str__(self):
+        scope = self.department or self.team or 'All'
+        return f"{scope} {self.date}: {self.approved_count} approved, {self.pending_count} pending"
 
 class LeavePolicy(models.Model):
     name = models.CharField(max_length=100)
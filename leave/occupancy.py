@@ -0,0 +1,218 @@
+from django.db import transaction
+from django.db.models import Count, F, OuterRef, Q, Subquery
+from django.db.models.functions import Coalesce
+from datetime import timedelta
+from collections import defaultdict
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Status buckets counted in DailyOccupancy (everything else does not occupy a day)
+APPROVED_STATUSES = {'APPROVED', 'APPROVED_UNPAID', 'APPROVED_COMP', 'APPROVED_COMPENSATORY'}
+PENDING_STATUSES = {
+    'PENDING', 'PENDING_DOCS', 'DOCS_SUBMITTED', 'DOCS_PENDING_LATER',
+    'PENDING_UNPAID', 'PENDING_COMP', 'PENDING_COMP_DATE'
+}
+ACTIVE_STATUSES = APPROVED_STATUSES | PENDING_STATUSES
+
+def status_bucket(status):
+    """'approved_count' / 'pending_count' / None for a leave status"""
+    if status in APPROVED_STATUSES:
+        return 'approved_count'
+    if status in PENDING_STATUSES:
+        return 'pending_count'
+    return None
+
+def _date_range(start_date, end_date):
+    days = (end_date - start_date).days + 1
+    return [start_date + timedelta(days=i) for i in range(max(days, 0))]
+
+def _scope_filter(department_id=None, team_id=None):
+    if department_id:
+        return Q(department_id=department_id)
+    if team_id:
+        return Q(team_id=team_id)
+    return Q(department__isnull=True, team__isnull=True)
+
+def get_user_scopes(user_id):
+    """Occupancy scopes a user counts towards: org-wide, their department, each team"""
+    from .models import UserRole, Team
+    scopes = [(None, None)]
+    department_id = UserRole.objects.filter(user_id=user_id).values_list('department_id', flat=True).first()
+    if department_id:
+        scopes.append((department_id, None))
+    for team_id in Team.members.through.objects.filter(user_id=user_id).values_list('team_id', flat=True):
+        scopes.append((None, team_id))
+    return scopes
+
+def _apply_delta(scopes, start_date, end_date, bucket, delta):
+    """Add delta to a bucket for every day of a range in each scope (2 queries per scope, 1 to remove)"""
+    from .models import DailyOccupancy
+    if not bucket or not delta or not start_date or not end_date or end_date < start_date:
+        return
+    dates = _date_range(start_date, end_date)
+    for department_id, team_id in scopes:
+        if delta > 0:
+            # Rows being decremented were created when the leave was counted
+            DailyOccupancy.objects.bulk_create(
+                [DailyOccupancy(date=day, department_id=department_id, team_id=team_id) for day in dates],
+                ignore_conflicts=True
+            )
+        DailyOccupancy.objects.filter(
+            _scope_filter(department_id, team_id),
+            date__range=(start_date, end_date)
+        ).update(**{bucket: F(bucket) + delta})
+
+def apply_leave_change(user_id, old, new, scopes=None):
+    """
+    Move a leave's contribution from its old state to its new one
+
+    old/new are (status, start_date, end_date) tuples, or None for a leave
+    that did not exist / no longer exists.
+    """
+    old_bucket = status_bucket(old[0]) if old else None
+    new_bucket = status_bucket(new[0]) if new else None
+    if old_bucket == new_bucket and (not old_bucket or old[1:] == new[1:]):
+        return
+
+    scopes = scopes or get_user_scopes(user_id)
+    with transaction.atomic():
+        if old_bucket:
+            _apply_delta(scopes, old[1], old[2], old_bucket, -1)
+        if new_bucket:
+            _apply_delta(scopes, new[1], new[2], new_bucket, 1)
+
+def apply_bulk_status_change(leaves, old_status):
+    """Explicit hook for bulk_update paths (signals do not fire there)"""
+    scopes_by_user = {}
+    for leave in leaves:
+        if leave.employee_id not in scopes_by_user:
+            scopes_by_user[leave.employee_id] = get_user_scopes(leave.employee_id)
+        apply_leave_change(
+            leave.employee_id,
+            (old_status, leave.start_date, leave.end_date),
+            (leave.status, leave.start_date, leave.end_date),
+            scopes=scopes_by_user[leave.employee_id]
+        )
+
+def _apply_day_deltas(scope, deltas, sign, chunk_size=500):
+    """Add per-day [approved, pending] counts to one scope - days with the same change share one UPDATE"""
+    from .models import DailyOccupancy
+    department_id, team_id = scope
+    if sign > 0:
+        DailyOccupancy.objects.bulk_create(
+            [DailyOccupancy(date=day, department_id=department_id, team_id=team_id) for day in deltas],
+            ignore_conflicts=True,
+            batch_size=chunk_size
+        )
+    days_by_change = defaultdict(list)
+    for day, (approved, pending) in deltas.items():
+        days_by_change[(approved * sign, pending * sign)].append(day)
+    for (approved, pending), days in days_by_change.items():
+        for i in range(0, len(days), chunk_size):
+            DailyOccupancy.objects.filter(
+                _scope_filter(department_id, team_id),
+                date__in=days[i:i + chunk_size]
+            ).update(approved_count=F('approved_count') + approved, pending_count=F('pending_count') + pending)
+
+def move_user_scope(user_id, old_scope, new_scope):
+    """A user changed department/team - move their active leaves between scopes (query count independent of leave count)"""
+    from .models import LeaveRequest
+    leaves = LeaveRequest.objects.filter(employee_id=user_id, status__in=ACTIVE_STATUSES).values_list(
+        'status', 'start_date', 'end_date'
+    )
+    deltas = defaultdict(lambda: [0, 0])
+    for status, start_date, end_date in leaves:
+        index = 0 if status_bucket(status) == 'approved_count' else 1
+        for day in _date_range(start_date, end_date):
+            deltas[day][index] += 1
+    if not deltas:
+        return
+    with transaction.atomic():
+        if old_scope:
+            _apply_day_deltas(old_scope, deltas, -1)
+        if new_scope:
+            _apply_day_deltas(new_scope, deltas, 1)
+
+def has_occupancy(start_date, end_date, department=None, team=None, exclude_user=None, bucket=None):
+    """
+    True if anyone in the scope is on approved/pending leave in the range
+
+    Answered from DailyOccupancy alone - one lookup on the (scope, date)
+    unique index - so callers skip their LeaveRequest overlap scans when it
+    is False. bucket limits it to 'approved_count' or 'pending_count'.
+    exclude_user (who must belong to the scope, e.g. the applicant) is left
+    out by subtracting their own leaves per day in the same query. The table
+    is kept current by the signals and apply_bulk_status_change; writes that
+    bypass both need `manage.py rebuild_occupancy`.
+    """
+    from .models import DailyOccupancy, LeaveRequest
+    department_id, team_id = getattr(department, 'id', department), getattr(team, 'id', team)
+    statuses = {'approved_count': APPROVED_STATUSES, 'pending_count': PENDING_STATUSES}.get(bucket, ACTIVE_STATUSES)
+    days = DailyOccupancy.objects.filter(
+        _scope_filter(department_id, team_id),
+        date__range=(start_date, end_date)
+    ).alias(occupied=F(bucket) if bucket else F('approved_count') + F('pending_count'))
+    if exclude_user:
+        own = LeaveRequest.objects.filter(
+            employee_id=getattr(exclude_user, 'id', exclude_user),
+            status__in=statuses,
+            start_date__lte=OuterRef('date'),
+            end_date__gte=OuterRef('date')
+        ).order_by().values('employee_id').annotate(days=Count('id')).values('days')
+        days = days.alias(own=Coalesce(Subquery(own), 0)).filter(occupied__gt=F('own'))
+    else:
+        days = days.filter(occupied__gt=0)
+    return days.exists()
+
+def rebuild_occupancy(start_date=None, end_date=None, batch_size=1000):
+    """
+    Recompute DailyOccupancy from LeaveRequest (optionally only for a date range)
+
+    Counts are accumulated in memory and written with bulk_create after the
+    old rows for the range are deleted, all in one transaction.
+    """
+    from .models import DailyOccupancy, LeaveRequest, UserRole, Team
+
+    departments = dict(UserRole.objects.exclude(department__isnull=True).values_list('user_id', 'department_id'))
+    teams = defaultdict(list)
+    for user_id, team_id in Team.members.through.objects.values_list('user_id', 'team_id'):
+        teams[user_id].append(team_id)
+
+    leaves = LeaveRequest.objects.filter(status__in=ACTIVE_STATUSES)
+    if start_date:
+        leaves = leaves.filter(end_date__gte=start_date)
+    if end_date:
+        leaves = leaves.filter(start_date__lte=end_date)
+
+    counts = defaultdict(lambda: {'approved_count': 0, 'pending_count': 0})
+    for user_id, status, leave_start, leave_end in leaves.values_list('employee_id', 'status', 'start_date', 'end_date').iterator():
+        bucket = status_bucket(status)
+        first = max(leave_start, start_date) if start_date else leave_start
+        last = min(leave_end, end_date) if end_date else leave_end
+        scopes = [(None, None)]
+        if user_id in departments:
+            scopes.append((departments[user_id], None))
+        scopes += [(None, team_id) for team_id in teams.get(user_id, [])]
+        for day in _date_range(first, last):
+            for department_id, team_id in scopes:
+                counts[(day, department_id, team_id)][bucket] += 1
+
+    existing = DailyOccupancy.objects.all()
+    if start_date:
+        existing = existing.filter(date__gte=start_date)
+    if end_date:
+        existing = existing.filter(date__lte=end_date)
+
+    with transaction.atomic():
+        deleted = existing.delete()[0]
+        DailyOccupancy.objects.bulk_create(
+            [
+                DailyOccupancy(date=day, department_id=department_id, team_id=team_id, **values)
+                for (day, department_id, team_id), values in counts.items()
+            ],
+            batch_size=batch_size
+        )
+
+    logger.info(f"Rebuilt occupancy: {len(counts)} rows written, {deleted} rows replaced")
+    return len(counts)
@@ -0,0 +1,246 @@
+"""
+On-demand profiling of live requests
+
+ProfilingMiddleware profiles a sampled fraction (LEAVE_PROFILE_RATE) of
+requests to LEAVE_PROFILE_PATHS - optionally only some slash commands or
+interactions (LEAVE_PROFILE_COMMANDS) - and every request from a flagged
+Slack user (LEAVE_PROFILE_USERS). Background jobs started with
+run_in_background during a profiled request are profiled as well.
+
+Each profiled request gets a directory under LEAVE_PROFILE_DIR holding
+meta.json plus one profile per part (the request itself and each job):
+.prof files (pstats) in 'cprofile' mode, or folded stacks (flamegraph
+input) in 'sample' mode, which samples stacks every LEAVE_PROFILE_SAMPLE_MS
+at a fraction of cProfile's overhead. `manage.py profiles` lists and
+summarizes them. With neither a rate nor flagged users the middleware
+removes itself at startup.
+"""
+from collections import Counter
+from contextlib import contextmanager
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.utils import timezone
+import contextvars
+import threading
+import cProfile
+import random
+import uuid
+import json
+import time
+import sys
+import os
+import re
+import logging
+
+logger = logging.getLogger(__name__)
+
+PROFILE_MODES = ('cprofile', 'sample')
+
+_current_session = contextvars.ContextVar('leave_profile_session', default=None)
+
+
+def profile_dir():
+    return getattr(settings, 'LEAVE_PROFILE_DIR', os.path.join(settings.BASE_DIR, 'profiles'))
+
+
+def profile_mode():
+    mode = getattr(settings, 'LEAVE_PROFILE_MODE', 'cprofile')
+    return mode if mode in PROFILE_MODES else 'cprofile'
+
+
+def profiling_enabled():
+    return bool(getattr(settings, 'LEAVE_PROFILE_RATE', 0) or getattr(settings, 'LEAVE_PROFILE_USERS', []))
+
+
+def slack_request_info(request):
+    """(label, slack user id) for a Slack request - the command, or interaction type + callback/action id"""
+    from .json_codec import request_payload
+    try:
+        if request.content_type == 'application/x-www-form-urlencoded':
+            if request.POST.get('command'):
+                return request.POST['command'], request.POST.get('user_id')
+            if request.POST.get('payload'):
+                payload = request_payload(request)
+                detail = (
+                    payload.get('view', {}).get('callback_id')
+                    or next((action.get('action_id') for action in payload.get('actions', [])), None)
+                )
+                label = f"{payload.get('type', 'interaction')}:{detail}" if detail else payload.get('type', 'interaction')
+                return label, payload.get('user', {}).get('id')
+        elif request.content_type == 'application/json' and request.body:
+            body = request_payload(request)
+            event = body.get('event', {})
+            return f"{body.get('type', 'json')}:{event.get('type', '')}".rstrip(':'), event.get('user')
+    except Exception as e:
+        logger.debug(f"Could not read Slack request info for profiling: {e}")
+    return request.path, None
+
+
+def should_profile(request):
+    """(reason, label, user id) for a request - reason is None unless it should be profiled"""
+    paths = getattr(settings, 'LEAVE_PROFILE_PATHS', ['/slack/'])
+    if not any(request.path.startswith(path) for path in paths):
+        return None, None, None
+    label, user_id = slack_request_info(request)
+    if user_id and user_id in getattr(settings, 'LEAVE_PROFILE_USERS', []):
+        return 'flagged user', label, user_id
+    commands = getattr(settings, 'LEAVE_PROFILE_COMMANDS', [])
+    if commands and not any(label == command or label.endswith(f':{command}') for command in commands):
+        return None, label, user_id
+    if random.random() < getattr(settings, 'LEAVE_PROFILE_RATE', 0):
+        return 'sampled', label, user_id
+    return None, label, user_id
+
+
+class StackSampler:
+    """One shared thread that samples the stacks of registered threads while any are registered"""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.counters = {}  # thread id -> Counter of folded stacks
+        self.thread = None
+
+    def add(self, thread_id, counter):
+        with self.lock:
+            self.counters[thread_id] = counter
+            if self.thread is None:
+                self.thread = threading.Thread(target=self._loop, name='profile-sampler', daemon=True)
+                self.thread.start()
+
+    def remove(self, thread_id):
+        with self.lock:
+            self.counters.pop(thread_id, None)
+
+    def _loop(self):
+        interval = getattr(settings, 'LEAVE_PROFILE_SAMPLE_MS', 5) / 1000.0
+        while True:
+            with self.lock:
+                if not self.counters:
+                    self.thread = None
+                    return
+                frames = sys._current_frames()
+                for thread_id, counter in self.counters.items():
+                    frame = frames.get(thread_id)
+                    if frame is not None:
+                        counter[_folded_stack(frame)] += 1
+            time.sleep(interval)
+
+
+def _folded_stack(frame):
+    stack = []
+    while frame is not None:
+        code = frame.f_code
+        stack.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})")
+        frame = frame.f_back
+    return ';'.join(reversed(stack))
+
+
+_sampler = StackSampler()
+
+
+class ProfileSession:
+    """Everything profiled for one request: the request part and its background jobs"""
+
+    def __init__(self, request, reason, label, user_id):
+        self.mode = profile_mode()
+        self.started = time.time()
+        slug = re.sub(r'[^A-Za-z0-9]+', '-', label or 'request').strip('-')[:40] or 'request'
+        self.id = f"{timezone.now():%Y%m%d-%H%M%S}-{slug}-{uuid.uuid4().hex[:6]}"
+        self.path = os.path.join(profile_dir(), self.id)
+        os.makedirs(self.path, exist_ok=True)
+        self.meta = {
+            'id': self.id,
+            'mode': self.mode,
+            'reason': reason,
+            'label': label,
+            'user': user_id,
+            'route': request.path,
+            'method': request.method,
+            'started_at': timezone.now().isoformat(),
+        }
+        self.lock = threading.Lock()
+        self.jobs = 0
+
+    @contextmanager
+    def part(self, name):
+        """Profile the current thread for the duration of the block and write it as one part"""
+        with self.lock:
+            if name != 'request':
+                self.jobs += 1
+                name = f"job{self.jobs}-{name}"
+        name = re.sub(r'[^A-Za-z0-9_.-]+', '_', name)
+        started = time.perf_counter()
+        profiler = counter = None
+        if self.mode == 'cprofile':
+            profiler = cProfile.Profile()
+            try:
+                profiler.enable()
+            except ValueError as e:
+                # Python 3.12+ allows one active profiler per process (sys.monitoring) - an overlapping
+                # request or a job of a profiled request is sampled instead of failing
+                logger.debug(f"cProfile unavailable for {self.id}/{name}, sampling instead: {e}")
+                profiler = None
+        if profiler is None:
+            counter = Counter()
+            _sampler.add(threading.get_ident(), counter)
+        try:
+            yield
+        finally:
+            duration_ms = (time.perf_counter() - started) * 1000
+            try:
+                if profiler:
+                    profiler.disable()
+                    profiler.dump_stats(os.path.join(self.path, f'{name}.prof'))
+                else:
+                    _sampler.remove(threading.get_ident())
+                    with open(os.path.join(self.path, f'{name}.folded'), 'w') as fh:
+                        fh.writelines(f"{stack} {count}\n" for stack, count in counter.most_common())
+                with open(os.path.join(self.path, f'{name}.json'), 'w') as fh:
+                    json.dump({'name': name, 'thread': threading.current_thread().name, 'duration_ms': round(duration_ms, 3)}, fh)
+            except Exception as e:
+                logger.error(f"Error writing profile {self.id}/{name}: {e}")
+
+    def finish(self, status_code):
+        self.meta['status'] = status_code
+        self.meta['request_ms'] = round((time.time() - self.started) * 1000, 3)
+        try:
+            with open(os.path.join(self.path, 'meta.json'), 'w') as fh:
+                json.dump(self.meta, fh, indent=2)
+        except Exception as e:
+            logger.error(f"Error writing profile metadata {self.id}: {e}")
+        logger.info(f"Profiled {self.meta['label']} ({self.meta['reason']}) -> {self.path}")
+
+
+@contextmanager
+def profile_job(name):
+    """Profile a background job if the request that started it is being profiled (no-op otherwise)"""
+    session = _current_session.get()
+    if session is None:
+        yield
+        return
+    with session.part(name):
+        yield
+
+
+class ProfilingMiddleware:
+    """Profiles selected requests (see module docstring); removed at startup when profiling is off"""
+
+    def __init__(self, get_response):
+        if not profiling_enabled():
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+
+    def __call__(self, request):
+        reason, label, user_id = should_profile(request)
+        if not reason:
+            return self.get_response(request)
+
+        session = ProfileSession(request, reason, label, user_id)
+        token = _current_session.set(session)
+        try:
+            with session.part('request'):
+                response = self.get_response(request)
+            session.finish(response.status_code)
+            return response
+        finally:
+            _current_session.reset(token)
@@ -0,0 +1,112 @@
+"""
+Per-handler database query budgets
+
+Handlers declare the most queries one call may run:
+
+    @query_budget(8)
+    def handle_my_leaves(request):
+        ...
+
+    with query_budget(3, 'leave.bulk_lookup'):
+        ...
+
+Only queries run on the current thread's connection are counted, so work a
+handler hands to a background thread needs its own budget (decorate the
+background function). QUERY_BUDGET_MODE picks what happens on overrun:
+'off' (no counting), 'log' (warning, the default) or 'raise'
+(QueryBudgetExceeded - for tests and check_query_budgets). Every counted
+call is recorded in budget_stats() either way.
+"""
+from contextlib import ContextDecorator
+from django.conf import settings
+from django.db import connection
+import threading
+import logging
+
+logger = logging.getLogger(__name__)
+
+QUERY_BUDGET_MODES = ('off', 'log', 'raise')
+
+# name -> declared limit, filled as budgets are declared
+BUDGETS = {}
+
+_stats_lock = threading.Lock()
+_stats = {}
+
+
+class QueryBudgetExceeded(Exception):
+    def __init__(self, name, limit, used):
+        super().__init__(f"{name} ran {used} queries (budget {limit})")
+        self.name = name
+        self.limit = limit
+        self.used = used
+
+
+def query_budget_mode():
+    mode = getattr(settings, 'QUERY_BUDGET_MODE', 'log')
+    return mode if mode in QUERY_BUDGET_MODES else 'log'
+
+
+def _record(name, limit, used):
+    with _stats_lock:
+        entry = _stats.setdefault(name, {'limit': limit, 'calls': 0, 'max': 0, 'total': 0, 'exceeded': 0})
+        entry['limit'] = limit
+        entry['calls'] += 1
+        entry['total'] += used
+        entry['max'] = max(entry['max'], used)
+        if used > limit:
+            entry['exceeded'] += 1
+
+
+def budget_stats():
+    """Copy of {name: {'limit', 'calls', 'max', 'total', 'exceeded'}} for every budget run so far"""
+    with _stats_lock:
+        return {name: dict(entry) for name, entry in _stats.items()}
+
+
+def reset_budget_stats():
+    with _stats_lock:
+        _stats.clear()
+
+
+class query_budget(ContextDecorator):
+    """Decorator / context manager capping the queries one call may run (see module docstring)"""
+
+    def __init__(self, limit, name=None):
+        self.limit = limit
+        self.name = name
+        self.used = 0
+        if name:
+            BUDGETS[name] = limit
+
+    def __call__(self, func):
+        if self.name is None:
+            self.name = f"{func.__module__}.{func.__qualname__}"
+            BUDGETS[self.name] = self.limit
+        return super().__call__(func)
+
+    def _recreate_cm(self):
+        # Fresh counter per call - the decorated function may run on several threads at once
+        return query_budget(self.limit, self.name)
+
+    def _count(self, execute, sql, params, many, context):
+        self.used += 1
+        return execute(sql, params, many, context)
+
+    def __enter__(self):
+        self._mode = query_budget_mode()
+        if self._mode != 'off':
+            self._wrapper = connection.execute_wrapper(self._count)
+            self._wrapper.__enter__()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if self._mode == 'off':
+            return False
+        self._wrapper.__exit__(exc_type, exc, tb)
+        _record(self.name, self.limit, self.used)
+        if self.used > self.limit:
+            if self._mode == 'raise' and exc_type is None:
+                raise QueryBudgetExceeded(self.name, self.limit, self.used)
+            logger.warning(f"Query budget exceeded: {self.name} ran {self.used} queries (budget {self.limit})")
+        return False
@@ -0,0 +1,118 @@
+from django.contrib.auth.models import User
+from django.db.models import QuerySet
+from django.db.models.signals import post_save, post_delete, pre_save, pre_delete, m2m_changed
+from django.dispatch import receiver
+from .models import Holiday, LeaveRequest, UserRole, Team
+from .working_days import invalidate_holiday_cache
+from . import occupancy
+from .leave_index import leave_changed, leave_deleted
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Fields that change a leave's DailyOccupancy contribution
+OCCUPANCY_FIELDS = {'status', 'start_date', 'end_date'}
+
+
+@receiver([post_save, post_delete], sender=Holiday)
+def holiday_changed(sender, **kwargs):
+    """Holidays changed - working-day calendars must be rebuilt"""
+    invalidate_holiday_cache()
+
+
+@receiver(pre_save, sender=LeaveRequest)
+def remember_leave_occupancy(sender, instance, update_fields=None, **kwargs):
+    """Remember the stored status/dates so post_save can apply the difference"""
+    instance._occupancy_old = None
+    if not instance.pk or (update_fields is not None and not OCCUPANCY_FIELDS & set(update_fields)):
+        instance._occupancy_skip = True
+        return
+    instance._occupancy_skip = False
+    instance._occupancy_old = LeaveRequest.objects.filter(pk=instance.pk).values_list(
+        'status', 'start_date', 'end_date'
+    ).first()
+
+
+@receiver(post_save, sender=LeaveRequest)
+def update_leave_occupancy(sender, instance, created, **kwargs):
+    """Keep DailyOccupancy in step with leave status/date changes"""
+    if not created and getattr(instance, '_occupancy_skip', False):
+        return
+    leave_changed(instance)
+    try:
+        occupancy.apply_leave_change(
+            instance.employee_id,
+            getattr(instance, '_occupancy_old', None),
+            (instance.status, instance.start_date, instance.end_date)
+        )
+    except Exception as e:
+        logger.error(f"Error updating occupancy for leave {instance.pk}: {e}")
+
+
+@receiver(pre_delete, sender=LeaveRequest)
+def remember_leave_scopes(sender, instance, **kwargs):
+    """Scopes before the delete - deleting a user removes their role and team rows without signals"""
+    instance._occupancy_scopes = None
+    if occupancy.status_bucket(instance.status):
+        instance._occupancy_scopes = occupancy.get_user_scopes(instance.employee_id)
+
+
+@receiver(post_delete, sender=LeaveRequest)
+def remove_leave_occupancy(sender, instance, **kwargs):
+    leave_deleted(instance.pk)
+    try:
+        occupancy.apply_leave_change(
+            instance.employee_id,
+            (instance.status, instance.start_date, instance.end_date),
+            None,
+            scopes=getattr(instance, '_occupancy_scopes', None)
+        )
+    except Exception as e:
+        logger.error(f"Error removing occupancy for leave {instance.pk}: {e}")
+
+
+@receiver(pre_save, sender=UserRole)
+def remember_user_department(sender, instance, **kwargs):
+    instance._old_department_id = (
+        UserRole.objects.filter(pk=instance.pk).values_list('department_id', flat=True).first()
+        if instance.pk else None
+    )
+
+
+@receiver(post_save, sender=UserRole)
+def update_department_occupancy(sender, instance, **kwargs):
+    """Department changed - move the user's active leaves to the new department"""
+    old_department_id = getattr(instance, '_old_department_id', None)
+    if old_department_id == instance.department_id:
+        return
+    occupancy.move_user_scope(
+        instance.user_id,
+        (old_department_id, None) if old_department_id else None,
+        (instance.department_id, None) if instance.department_id else None
+    )
+
+
+@receiver(post_delete, sender=UserRole)
+def remove_department_occupancy(sender, instance, origin=None, **kwargs):
+    """Role deleted on its own - take the user's active leaves out of the department"""
+    if isinstance(origin, User) or (isinstance(origin, QuerySet) and origin.model is User):
+        return  # The user's leaves are deleted with it and remove their own occupancy
+    if instance.department_id:
+        occupancy.move_user_scope(instance.user_id, (instance.department_id, None), None)
+
+
+@receiver(m2m_changed, sender=Team.members.through)
+def update_team_occupancy(sender, instance, action, reverse, pk_set, **kwargs):
+    """Team membership changed - add/remove the member's active leaves for that team"""
+    if action == 'post_add':
+        # Django filters already-existing memberships out of pk_set for add
+        pairs = [(instance.pk, pk) if reverse else (pk, instance.pk) for pk in pk_set or ()]
+        for user_id, team_id in pairs:
+            occupancy.move_user_scope(user_id, None, (None, team_id))
+    elif action in ('pre_remove', 'pre_clear'):
+        # pk_set is what was asked for (or nothing for clear) - use actual memberships
+        memberships = sender.objects.filter(**({'user_id': instance.pk} if reverse else {'team_id': instance.pk}))
+        if action == 'pre_remove':
+            memberships = memberships.filter(**({'team_id__in': pk_set} if reverse else {'user_id__in': pk_set}))
+        for user_id, team_id in memberships.values_list('user_id', 'team_id'):
+            occupancy.move_user_scope(user_id, (None, team_id), None)
@@ -0,0 +1,203 @@
+"""
+Typed access to Slack interaction payloads
+
+Handlers used to walk payload['view']['state']['values'][block][action]...
+by hand, and each one did it a little differently. SlackPayload wraps the
+decoded payload and exposes the fields handlers use:
+
+    payload.type, payload.user_id, payload.trigger_id, payload.channel_id,
+    payload.message_ts, payload.callback_id, payload.private_metadata
+    payload.action, payload.action_id, payload.action_value   (block_actions)
+    payload.value(block_id, action_id, default=None)     input value, whatever the element type
+    payload.required(block_id, action_id)                same, but missing -> SlackPayloadError
+    payload.options(block_id, action_id)                 selected option dicts of a multi-select
+    payload.date(block_id, action_id)                    a datepicker value as a date
+
+The JSON is decoded on first use when the wrapper is built from text
+(from_json), and the state values and first action are looked up once and
+cached. Identity fields and required() raise SlackPayloadError naming the
+missing path, so a malformed payload fails the same way in every handler.
+str(payload) is a one-line summary, which keeps logging cheap. Item access
+(payload['view'], payload.get('team')) still reaches the raw dict.
+"""
+from datetime import datetime
+
+from .json_codec import loads, request_payload
+
+_MISSING = object()
+
+# Where an input element keeps its value, by element type - checked in this order
+_VALUE_KEYS = (
+    'value', 'selected_date', 'selected_time', 'selected_date_time', 'selected_user', 'selected_users',
+    'selected_conversation', 'selected_conversations', 'selected_channel', 'selected_channels', 'files',
+)
+
+
+class SlackPayloadError(ValueError):
+    """A field a handler needs is missing from the payload"""
+
+
+class SlackPayload:
+    __slots__ = ('_source', '_data', '_values', '_action')
+
+    def __init__(self, data=None, source=None):
+        self._source = source
+        self._data = data
+        self._values = None
+        self._action = _MISSING
+
+    @classmethod
+    def from_json(cls, text):
+        """Wrap a JSON string (or bytes) - it is decoded on first access"""
+        return cls(source=text)
+
+    @classmethod
+    def from_request(cls, request):
+        """The payload of a Slack interaction request, decoded once per request (json_codec.request_payload)"""
+        return cls(request_payload(request) or {})
+
+    @property
+    def data(self):
+        """The decoded payload dict"""
+        if self._data is None:
+            self._data = loads(self._source) if self._source else {}
+            self._source = None
+        return self._data
+
+    # ---- raw access ----
+
+    def __getitem__(self, key):
+        return self.data[key]
+
+    def __contains__(self, key):
+        return key in self.data
+
+    def get(self, key, default=None):
+        return self.data.get(key, default)
+
+    def _path(self, *keys):
+        node = self.data
+        for key in keys:
+            if not isinstance(node, dict) or key not in node:
+                raise SlackPayloadError(f"Slack payload has no {'.'.join(keys)}")
+            node = node[key]
+        return node
+
+    # ---- identity ----
+
+    @property
+    def type(self):
+        return self.data.get('type')
+
+    @property
+    def user_id(self):
+        return self._path('user', 'id')
+
+    @property
+    def trigger_id(self):
+        return self._path('trigger_id')
+
+    @property
+    def channel_id(self):
+        return self._path('channel', 'id')
+
+    @property
+    def message_ts(self):
+        return self._path('message', 'ts')
+
+    @property
+    def callback_id(self):
+        return self._path('view', 'callback_id')
+
+    @property
+    def private_metadata(self):
+        return self._path('view', 'private_metadata')
+
+    # ---- block actions ----
+
+    @property
+    def action(self):
+        """The first (for buttons, the only) action of a block_actions payload"""
+        if self._action is _MISSING:
+            actions = self.data.get('actions') or []
+            self._action = actions[0] if actions else None
+        if self._action is None:
+            raise SlackPayloadError("Slack payload has no actions")
+        return self._action
+
+    @property
+    def action_id(self):
+        return self.action.get('action_id')
+
+    @property
+    def action_value(self):
+        return self.action.get('value')
+
+    # ---- input values ----
+
+    @property
+    def values(self):
+        """State values by block id then action id - the view's for submissions, the message's for block actions"""
+        if self._values is None:
+            view = self.data.get('view')
+            state = (view or {}).get('state') if view else self.data.get('state')
+            self._values = (state or {}).get('values') or {}
+        return self._values
+
+    def element(self, block_id, action_id):
+        """The raw state of one input element ({} when it is not in the payload)"""
+        return self.values.get(block_id, {}).get(action_id) or {}
+
+    def value(self, block_id, action_id, default=None):
+        """
+        An input's value whatever its element type - text, the selected
+        option's value (a list of values for multi-selects), a date string,
+        user ids, files - or default when it is missing or empty
+        """
+        element = self.element(block_id, action_id)
+        if 'selected_option' in element:
+            option = element['selected_option']
+            return option['value'] if option else default
+        if 'selected_options' in element:
+            return [option['value'] for option in element['selected_options'] or []] or default
+        for key in _VALUE_KEYS:
+            if key in element:
+                value = element[key]
+                return default if value is None or value == '' else value
+        return default
+
+    def required(self, block_id, action_id):
+        value = self.value(block_id, action_id)
+        if value is None:
+            raise SlackPayloadError(f"Slack payload has no value for {block_id}.{action_id}")
+        return value
+
+    def options(self, block_id, action_id):
+        """Selected option dicts (value and text) of a multi-select, [] when none"""
+        return self.element(block_id, action_id).get('selected_options') or []
+
+    def date(self, block_id, action_id, required=False):
+        """A datepicker's selected date as a date (None when empty, SlackPayloadError when required)"""
+        value = self.required(block_id, action_id) if required else self.value(block_id, action_id)
+        return datetime.strptime(value, '%Y-%m-%d').date() if value else None
+
+    # ---- logging ----
+
+    def __str__(self):
+        data = self.data
+        parts = [data.get('type') or 'payload']
+        view = data.get('view') or {}
+        if view.get('callback_id'):
+            parts.append(f"callback={view['callback_id']}")
+        actions = data.get('actions') or []
+        if actions:
+            parts.append(f"action={actions[0].get('action_id')}")
+            if actions[0].get('value'):
+                parts.append(f"value={actions[0]['value']}")
+        user = (data.get('user') or {}).get('id')
+        if user:
+            parts.append(f"user={user}")
+        return ' '.join(parts)
+
+    def __repr__(self):
+        return f'<SlackPayload {self}>'
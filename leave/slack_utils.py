@@ -1,8 +1,13 @@
 from slack_sdk.web.client import WebClient
 from slack_sdk.errors import SlackApiError
+from slack_sdk.http_retry.builtin_handlers import RateLimitErrorRetryHandler
+from django.conf import settings
 from django.contrib.auth.models import User
-from .models import UserRole
+from .models import UserRole, SlackMessageRef
+from .tracing import span, REQUEST_ID_HEADER
+from django.db.models import Q
 import logging
+import time
 import os
 from dotenv import load_dotenv
 
@@ -13,10 +18,88 @@ logger = logging.getLogger(__name__)
 
 SLACK_BOT_TOKEN = os.getenv('SLACK_BOT_TOKEN')
 SLACK_MANAGER_CHANNEL = os.getenv('SLACK_MANAGER_CHANNEL', '#leave-approvals')
-slack_client = WebClient(
+
+
+class MeteredWebClient(WebClient):
+    """WebClient that traces each call (leave.tracing) and records per-method latency and outcome in leave.metrics"""
+
+    def api_call(self, api_method, **kwargs):
+        from .metrics import metrics_enabled, observe_slack_call
+        with span(f'slack {api_method}') as call:
+            kwargs['headers'] = {**(kwargs.get('headers') or {}), REQUEST_ID_HEADER: call.trace_id}
+            if not metrics_enabled():
+                return super().api_call(api_method, **kwargs)
+            started = time.perf_counter()
+            outcome = 'exception'
+            try:
+                response = super().api_call(api_method, **kwargs)
+                outcome = 'ok'
+                return response
+            except SlackApiError as e:
+                outcome = e.response.get('error') or 'error'
+                call.attrs['slack_error'] = outcome
+                raise
+            finally:
+                observe_slack_call(api_method, time.perf_counter() - started, outcome)
+
+
+class MeteredRateLimitErrorRetryHandler(RateLimitErrorRetryHandler):
+    """Counts every HTTP 429 in leave.metrics - including the last one, when retries are used up"""
+
+    def can_retry(self, *, state, request, response=None, error=None):
+        if response is not None and response.status_code == 429:
+            from .metrics import metrics_enabled, record_slack_rate_limit
+            if metrics_enabled():
+                record_slack_rate_limit(request.url)
+        return super().can_retry(state=state, request=request, response=response, error=error)
+
+
+# SLACK_API_BASE_URL lets load tests point the client at a local fake (manage.py fake_slack_server)
+slack_client = MeteredWebClient(
     token=SLACK_BOT_TOKEN,
+    base_url=getattr(settings, 'SLACK_API_BASE_URL', WebClient.BASE_URL),
     timeout=30
 )
+# Wait out HTTP 429s (Retry-After) instead of failing - matters for multi-message sends
+slack_client.retry_handlers.append(
+    MeteredRateLimitErrorRetryHandler(max_retry_count=int(os.getenv('SLACK_RATE_LIMIT_RETRIES', '3')))
+)
+
+# Slack rejects messages with more than 50 blocks
+SLACK_MAX_BLOCKS = 50
+
+def post_blocks_in_chunks(channel, blocks, text, chunk_size=SLACK_MAX_BLOCKS):
+    """
+    Post a (possibly lazy) stream of blocks as a parent message plus threaded pages
+
+    Blocks are consumed as they are produced: each page of up to chunk_size
+    blocks is sent as soon as it is full, so the first page shows up while
+    later ones are still being rendered. Returns (channel_id, parent_ts, pages).
+    """
+    chunk_size = max(1, min(chunk_size, SLACK_MAX_BLOCKS))
+    channel_id, parent_ts, pages = channel, None, 0
+    page = []
+
+    def send(page_blocks):
+        nonlocal channel_id, parent_ts, pages
+        pages += 1
+        page_text = text if pages == 1 else f"{text} (page {pages})"
+        if parent_ts is None:
+            response = slack_client.chat_postMessage(channel=channel_id, blocks=page_blocks, text=page_text)
+            channel_id, parent_ts = response['channel'], response['ts']
+        else:
+            slack_client.chat_postMessage(channel=channel_id, thread_ts=parent_ts, blocks=page_blocks, text=page_text)
+
+    for block in blocks:
+        page.append(block)
+        if len(page) == chunk_size:
+            send(page)
+            page = []
+    if page or pages == 0:
+        send(page or [{"type": "section", "text": {"type": "mrkdwn", "text": text}}])
+    if pages > 1:
+        logger.info(f"Sent {pages} page(s) to {channel_id} (thread {parent_ts})")
+    return channel_id, parent_ts, pages
 
 def check_manager_status(user_id):
     """Check if user is in manager channel"""
@@ -235,6 +318,38 @@ def is_in_manager_channel(channel_id):
         logger.error(f"Error checking channel: {e}")
         return False
 
+def record_message_ref(response, leave_request, role, manager_id=None, notification_type=None):
+    """Remember which leave a posted message belongs to - never breaks the send path"""
+    try:
+        if not response or not response.get('ok'):
+            return
+        message = response.get('message') or {}
+        SlackMessageRef.objects.bulk_create([SlackMessageRef(
+            channel=response['channel'],
+            ts=response['ts'],
+            thread_ts=message.get('thread_ts'),
+            leave=leave_request,
+            role=role,
+            manager_slack_id=manager_id,
+            notification_type=notification_type
+        )], ignore_conflicts=True)
+    except Exception as e:
+        logger.warning(f"Could not record message ref for leave {leave_request.id}: {e}")
+
+def get_message_ref(channel, ts, thread_ts=None):
+    """
+    Find the leave a Slack message belongs to (one indexed lookup)
+
+    Matches the message itself, the thread root we posted, or any of our
+    replies in the same thread. Returns SlackMessageRef (with leave) or None.
+    """
+    key = thread_ts or ts
+    return SlackMessageRef.objects.select_related('leave', 'leave__employee').filter(
+        Q(ts=key) | Q(thread_ts=key),
+        channel=channel
+    ).order_by('ts').first()
+
+
 def send_slack_message(channel, blocks, fallback_text=""):
     """Send message to Slack channel"""
     try:
@@ -277,6 +392,7 @@ def send_manager_notification(blocks, text=None):
         logger.error(f"Error sending to manager channel: {e}")
         return None
 
+@span()
 def start_leave_request_thread(user, leave_request, blocks):
     """Start a new thread for leave request in manager channel"""
     try:
@@ -291,6 +407,7 @@ def start_leave_request_thread(user, leave_request, blocks):
         if response and response['ts']:
             leave_request.thread_ts = response['ts']
             leave_request.save()
+            record_message_ref(response, leave_request, 'MANAGER_CHANNEL', notification_type='new_request')
             
         return response
     except SlackApiError as e:
@@ -303,12 +420,14 @@ def update_leave_thread(leave_request, blocks, text=None):
         if not leave_request.thread_ts:
             return None
             
-        return slack_client.chat_postMessage(
+        response = slack_client.chat_postMessage(
             channel=SLACK_MANAGER_CHANNEL.lstrip('#'),
             thread_ts=leave_request.thread_ts,
             blocks=blocks,
             text=text or "Leave request update"
         )
+        record_message_ref(response, leave_request, 'MANAGER_CHANNEL', notification_type='thread_update')
+        return response
     except SlackApiError as e:
         logger.error(f"Error updating thread: {e}")
         return None
@@ -339,6 +458,7 @@ def send_employee_notification(leave_request, blocks, text_summary, notification
             if not leave_request.employee_thread_ts:
                 leave_request.employee_thread_ts = response['ts']
                 leave_request.save()
+            record_message_ref(response, leave_request, 'EMPLOYEE', notification_type=notification_type)
             logger.info(f"Employee notification sent to {employee_id}, employee_thread_ts: {leave_request.employee_thread_ts}")
             return True
         else:
@@ -349,6 +469,7 @@ def send_employee_notification(leave_request, blocks, text_summary, notification
         logger.error(f"Error sending employee notification: {e}")
         return False
 
+@span()
 def start_employee_leave_thread(leave_request, blocks, text_summary):
     """Start a new thread for employee leave notifications"""
     try:
@@ -373,6 +494,7 @@ def start_employee_leave_thread(leave_request, blocks, text_summary):
         if response and response['ts']:
             leave_request.employee_thread_ts = response['ts']
             leave_request.save()
+            record_message_ref(response, leave_request, 'EMPLOYEE', notification_type='initial_confirmation')
             logger.info(f"Employee thread created for leave {leave_request.id}, thread_ts: {response['ts']}")
             
         return response
@@ -489,6 +611,7 @@ def send_manager_update_notification(leave_request, blocks, text_summary, exclud
                 )
                 
                 if response['ok']:
+                    record_message_ref(response, leave_request, 'MANAGER', manager_id, notification_type)
                     notification_results.append({
                         'manager': manager_id,
                         'success': True,
@@ -548,7 +671,8 @@ def send_leave_request_to_managers(selected_managers, leave_request, leave_block
                     if not leave_request.thread_ts:
                         leave_request.thread_ts = response['ts']
                         leave_request.save()
-                    leave_request.set_manager_thread(manager_id, response['ts'])
+                    leave_request.set_manager_thread(manager_id, response['ts'], response['channel'])
+                    record_message_ref(response, leave_request, 'MANAGER', manager_id, 'new_request')
                     notification_results['sent'].append({
                         'manager': manager_id,
                         'ts': response['ts'],
@@ -585,7 +709,7 @@ def send_leave_request_to_managers(selected_managers, leave_request, leave_block
 
 # Add this function to your existing slack_utils.py - don't modify existing functions
 
-def send_document_directly_to_managers(leave_request, file_id, file_name, doc_notes):
+def send_document_directly_to_managers(leave_request, file_id, file_name, doc_notes, document=None):
     """Send document directly to all managers via DM - separate from main notification"""
     try:
         # Get all managers
@@ -602,6 +726,9 @@ def send_document_directly_to_managers(leave_request, file_id, file_name, doc_no
                 )
                 
                 if share_response['ok']:
+                    if document:
+                        document.mark_shared(manager.username)
+                    
                     # Send a separate message explaining the document
                     explanation_blocks = [
                         {
@@ -641,11 +768,12 @@ def send_document_directly_to_managers(leave_request, file_id, file_name, doc_no
                         }
                     ]
                     
-                    slack_client.chat_postMessage(
+                    explanation_response = slack_client.chat_postMessage(
                         channel=manager.username,
                         blocks=explanation_blocks,
                         text=f"Document for {leave_request.employee.username}'s leave request"
                     )
+                    record_message_ref(explanation_response, leave_request, 'DOCUMENT', manager.username, 'document_shared')
                     
                     logger.info(f"Document shared directly to manager {manager.username}")
                     
@@ -1,9 +1,9 @@
-from django.http import JsonResponse
+from .json_codec import JsonResponse
 from .models import Team
 from .slack_utils import get_or_create_user, slack_client
 from django.db import transaction
 from slack_sdk.errors import SlackApiError
-import threading
+from .background import run_in_background
 import logging
 
 logger = logging.getLogger(__name__)
@@ -77,9 +77,7 @@ def handle_create_team(request):
                     )
         
         # Start background thread
-        thread = threading.Thread(target=create_team_background)
-        thread.daemon = True
-        thread.start()
+        run_in_background(create_team_background)
         
         # Return immediate response
         return JsonResponse({'text': f'⏳ Creating team "{team_name}"...'})
@@ -152,9 +150,7 @@ def handle_view_team(request):
                     )
         
         # Start background thread
-        thread = threading.Thread(target=view_team_background)
-        thread.daemon = True
-        thread.start()
+        run_in_background(view_team_background)
         
         # Return immediate response
         return JsonResponse({'text': f'⏳ Loading team "{team_name}" information...'})
@@ -257,9 +253,7 @@ def handle_join_team(request):
                     )
         
         # Start background thread for database operation
-        thread = threading.Thread(target=join_team_background)
-        thread.daemon = True
-        thread.start()
+        run_in_background(join_team_background)
         
         # Return immediate response (within 3 seconds)
         return JsonResponse({'text': f'⏳ Processing request to join team "{team_name}"...'})
@@ -371,9 +365,7 @@ def handle_leave_team(request):
                     )
         
         # Start background thread
-        thread = threading.Thread(target=leave_team_background)
-        thread.daemon = True
-        thread.start()
+        run_in_background(leave_team_background)
         
         # Return immediate response
         return JsonResponse({'text': f'⏳ Processing request to leave team "{team_name}"...'})
@@ -528,9 +520,7 @@ def handle_remove_member(request):
                     )
         
         # Start background thread
-        thread = threading.Thread(target=remove_member_background)
-        thread.daemon = True
-        thread.start()
+        run_in_background(remove_member_background)
         
         # Return immediate response
         return JsonResponse({'text': f'⏳ Processing request to remove @{target_username} from team "{team_name}"...'})
@@ -739,9 +729,7 @@ def handle_admin_role(request):
                     )
         
         # Start background thread
-        thread = threading.Thread(target=manage_admin_role_background)
-        thread.daemon = True
-        thread.start()
+        run_in_background(manage_admin_role_background)
         
         # Return immediate response
         action_text = "granting" if action == 'add' else "removing"
@@ -0,0 +1,67 @@
+import os
+
+from django.core.management import call_command
+from django.db import connection
+from django.test import TestCase, TransactionTestCase
+from django.test.utils import CaptureQueriesContext, override_settings
+
+from leave.calendar_handlers import process_team_calendar_query
+from leave.working_days import invalidate_holiday_cache
+
+CALENDAR_VIEWS = {
+    'list': ['SHOW_DETAILS'],
+    'by department': ['SHOW_DETAILS', 'GROUP_DEPT', 'SHOW_REASONS'],
+    'stream': ['STREAM', 'GROUP_DEPT'],
+    'heatmap': ['HEATMAP'],
+}
+
+
+@override_settings(QUERY_BUDGET_MODE='raise')
+class CalendarQueryCountTests(TestCase):
+    """The compiled team calendar query runs the same number of queries however many leaves match"""
+
+    def _generate_org(self, users, leaves):
+        call_command(
+            'generate_synthetic_org', users=users, departments=4, teams=6, leaves=leaves, seed=7,
+            today='2025-06-01', clear=True, stdout=open(os.devnull, 'w')
+        )
+
+    def _query_counts(self, **filters):
+        """{view: queries run} for a year of leaves; self.matched is the number of leaves the query matched"""
+        counts = {}
+        for view, display_options in CALENDAR_VIEWS.items():
+            query_params = {
+                'start_date': '2025-01-01', 'end_date': '2025-12-31', 'status': 'ALL', 'leave_type': 'ALL',
+                'display_options': display_options, **filters,
+            }
+            invalidate_holiday_cache()  # Every view pays for loading the holiday calendar, not just the first
+            with CaptureQueriesContext(connection) as queries:
+                result = process_team_calendar_query(query_params)
+                blocks = list(result['blocks'])
+            self.assertTrue(result['success'], result.get('message'))
+            self.assertTrue(blocks)
+            counts[view] = len(queries)
+            self.matched = result['count']
+        return counts
+
+    def test_query_count_does_not_grow_with_result_size(self):
+        self._generate_org(users=30, leaves=60)
+        small = self._query_counts()
+        small_matched = self.matched
+        small_filtered = self._query_counts(department_filter='Synthetic Dept', sort_option='STATUS_PENDING')
+
+        self._generate_org(users=200, leaves=3000)
+        self.assertEqual(self._query_counts(), small)
+        self.assertGreater(self.matched, small_matched * 10)
+        self.assertEqual(self._query_counts(department_filter='Synthetic Dept', sort_option='STATUS_PENDING'), small_filtered)
+
+
+class QueryBudgetTests(TransactionTestCase):
+    """Every handler path that works offline stays within its declared query budget and does not fail"""
+
+    def test_query_budgets_hold(self):
+        # Raises CommandError on an overrun or a failed scenario
+        call_command(
+            'check_query_budgets', users=150, teams=8, leaves=3000, repeat=2, seed=7, budget_mode='raise',
+            current_db=True, stdout=open(os.devnull, 'w')
+        )
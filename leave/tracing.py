@@ -0,0 +1,171 @@
+"""
+Request tracing across background jobs, Slack and LLM calls
+
+Every request gets a trace id: the caller's X-Request-ID if it sent a
+usable one, otherwise a fresh one. The id goes back in the X-Request-ID
+response header. Work is timed in spans:
+
+    with span('occupancy.apply', leave_id=leave.id):
+        ...
+
+    @span('approval.notify')
+    def notify_managers(...):
+        ...
+
+The current span lives in a contextvar. run_in_background copies the
+context, so a trace follows its work into job threads, and each job is a
+span of its own. Slack Web API and LLM calls are spans too. Outgoing Slack
+calls also send the trace id as X-Request-ID. Every log record carries
+the trace and span ids (%(trace)s in the log format), which ties lines
+from job threads back to the request that started them.
+
+Each finished span is logged on leave.tracing with its duration. When
+LEAVE_TRACE_FILE is set, spans are also appended there as JSON lines, and
+`manage.py traces <trace id>` shows one trace as a timed tree.
+"""
+from contextlib import ContextDecorator
+from django.conf import settings
+import contextvars
+import threading
+import logging
+import time
+import uuid
+import re
+
+from .json_codec import dumps_str
+
+logger = logging.getLogger(__name__)
+
+REQUEST_ID_HEADER = 'X-Request-ID'
+_REQUEST_ID_RE = re.compile(r'^[A-Za-z0-9._-]{8,64}$')
+
+_current_span = contextvars.ContextVar('leave_trace_span', default=None)
+_file_lock = threading.Lock()
+
+
+def new_id():
+    return uuid.uuid4().hex[:16]
+
+
+def current_span():
+    return _current_span.get()
+
+
+def current_trace_id():
+    """Trace id of the active span, or None outside a trace"""
+    active = _current_span.get()
+    return active.trace_id if active else None
+
+
+class span(ContextDecorator):
+    """Decorator / context manager timing a unit of work as a child of the active span (see module docstring)"""
+
+    def __init__(self, name=None, trace_id=None, **attrs):
+        self.name = name
+        self.trace_id = trace_id
+        self.attrs = attrs
+
+    def __call__(self, func):
+        if self.name is None:
+            self.name = func.__qualname__
+        return super().__call__(func)
+
+    def _recreate_cm(self):
+        # Fresh span per call - the decorated function may run on several threads at once
+        return span(self.name, self.trace_id, **self.attrs)
+
+    def __enter__(self):
+        parent = _current_span.get()
+        self.parent_id = parent.span_id if parent else None
+        self.trace_id = self.trace_id or (parent.trace_id if parent else new_id())
+        self.span_id = new_id()
+        self.started_at = time.time()
+        self._started = time.perf_counter()
+        self.duration_ms = None
+        self.error = None
+        self._token = _current_span.set(self)
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.duration_ms = (time.perf_counter() - self._started) * 1000
+        if exc_type is not None:
+            self.error = exc_type.__name__
+        try:
+            _emit(self)
+        finally:
+            _current_span.reset(self._token)
+        return False
+
+
+def _emit(finished):
+    """Log a finished span (while it is still current, so the record carries its ids) and write it to LEAVE_TRACE_FILE"""
+    attrs = ''.join(f" {key}={value}" for key, value in finished.attrs.items())
+    error = f" error={finished.error}" if finished.error else ''
+    logger.info(f"span {finished.name} {finished.duration_ms:.1f}ms{attrs}{error}")
+
+    path = getattr(settings, 'LEAVE_TRACE_FILE', '')
+    if not path:
+        return
+    line = dumps_str({
+        'trace': finished.trace_id,
+        'span': finished.span_id,
+        'parent': finished.parent_id,
+        'name': finished.name,
+        'start': round(finished.started_at, 6),
+        'duration_ms': round(finished.duration_ms, 3),
+        'thread': threading.current_thread().name,
+        'error': finished.error,
+        'attrs': {key: str(value) for key, value in finished.attrs.items()},
+    })
+    try:
+        with _file_lock, open(path, 'a') as fh:
+            fh.write(line + '\n')
+    except OSError as e:
+        logger.error(f"Error writing span to {path}: {e}")
+
+
+def request_id_from(request):
+    """The caller's X-Request-ID if it looks like an id, else None"""
+    incoming = request.headers.get(REQUEST_ID_HEADER, '')
+    return incoming if _REQUEST_ID_RE.match(incoming) else None
+
+
+class TracingMiddleware:
+    """Runs every request in a root span and returns its trace id in X-Request-ID"""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        root = span(request.path, trace_id=request_id_from(request), method=request.method)
+        with root:
+            request.trace_id = root.trace_id
+            response = self.get_response(request)
+            from .metrics import request_labels
+            route, slack = request_labels(request)
+            root.name = f"{route} {slack}".rstrip()
+            root.attrs['status'] = response.status_code
+        response[REQUEST_ID_HEADER] = root.trace_id
+        return response
+
+
+# ---- Log records ----
+
+_base_record_factory = None
+
+
+def _record_factory(*args, **kwargs):
+    record = _base_record_factory(*args, **kwargs)
+    active = _current_span.get()
+    record.trace_id = active.trace_id if active else '-'
+    record.span_id = active.span_id if active else '-'
+    record.trace = f"[{active.trace_id}/{active.span_id}] " if active else ''
+    return record
+
+
+def install_log_record_factory():
+    """Give every log record trace_id, span_id and trace (a '[trace/span] ' prefix, empty outside a trace)"""
+    global _base_record_factory
+    if _base_record_factory is None:
+        _base_record_factory = logging.getLogRecordFactory()
+        logging.setLogRecordFactory(_record_factory)
@@ -1,7 +1,12 @@
 from django.urls import path
 from . import views
+from . import calendar_feeds
+from . import metrics
 
 urlpatterns = [
     path('slack/events/', views.slack_events, name='slack_events'),
     path('slack/commands/assign-manager/', views.handle_slack_command, name='assign_manager'),
-]
\ No newline at end of file
+    path('calendar/department/<int:department_id>.ics', calendar_feeds.department_calendar_feed, name='department_calendar_feed'),
+    path('calendar/team/<int:team_id>.ics', calendar_feeds.team_calendar_feed, name='team_calendar_feed'),
+    path('metrics', metrics.metrics_view, name='metrics'),
+]
@@ -1,11 +1,11 @@
-from django.http import JsonResponse
+from .json_codec import JsonResponse, request_payload
+from .slack_payload import SlackPayload
 from django.views.decorators.csrf import csrf_exempt
 from django.views.decorators.http import require_POST
 from django.utils import timezone
 from django.contrib.auth.models import User
 from django.db import transaction
 from datetime import datetime, timedelta
-import json
 import logging
 
 # Import Slack SDK
@@ -16,7 +16,8 @@ from .slack_utils import (
     slack_client, get_or_create_user, is_manager, is_in_manager_channel,
     send_personal_notification, send_manager_notification, start_leave_request_thread,
     update_leave_thread, SLACK_MANAGER_CHANNEL, send_employee_notification,
-    send_manager_update_notification  # Add this missing import
+    send_manager_update_notification,  # Add this missing import
+    get_message_ref
 )
 from .leave_utils import (
     get_leave_balance, get_maternity_leave_info, get_paternity_leave_info,
@@ -39,10 +40,13 @@ from .command_handlers import (
 from .modal_handlers import handle_leave_request_modal_submission, handle_email_leave_request_modal_submission
 from .block_action_handlers import handle_block_actions
 from .calendar_handlers import handle_team_calendar, handle_team_calendar_filter_submission  # Import from calendar_handlers only
+from .bulk_approval_handlers import handle_bulk_approve, handle_bulk_approval_submission
+from .background import run_in_background
 
 from .models import LeaveRequest, LeaveBalance, UserRole, Department, Team
 
-logging.basicConfig(level=logging.INFO)
+# %(trace)s is '[trace id/span id] ' inside a traced request or job (leave/tracing.py)
+logging.basicConfig(level=logging.INFO, format='%(levelname)s:%(name)s:%(trace)s%(message)s')
 logger = logging.getLogger(__name__)
 
 @csrf_exempt
@@ -91,24 +95,28 @@ def slack_events(request):
                         return handle_admin_role(request)
                     elif command == '/debug-manager':
                         return handle_debug_manager_command(request)
+                    elif command == '/bulk-approve':
+                        return handle_bulk_approve(request)
                         
                 elif request.POST.get('payload'):
                     # Handle interaction payload (button clicks, modal submissions)
-                    payload = json.loads(request.POST.get('payload'))
+                    payload = SlackPayload.from_request(request)
                     logger.info(f"Interaction payload: {payload}")
                     
-                    if payload.get('type') == 'view_submission':
+                    if payload.type == 'view_submission':
                         return handle_modal_submission(payload)
-                    elif payload.get('type') == 'block_actions':
+                    elif payload.type == 'block_actions':
                         return handle_block_actions(payload)
                     
             # Handle JSON data (events API)
             elif request.headers.get('Content-Type') == 'application/json':
-                body = json.loads(request.body.decode('utf-8'))
+                body = request_payload(request)
                 logger.info(f"JSON payload: {body}")
                 
                 if body.get('type') == 'url_verification':
                     return JsonResponse({'challenge': body['challenge']})
+                elif body.get('type') == 'event_callback':
+                    return handle_event_callback(body)
             
             return JsonResponse({'status': 'ok'})
             
@@ -118,11 +126,53 @@ def slack_events(request):
     
     return JsonResponse({'error': 'Invalid request method'}, status=405)
 
+def handle_event_callback(body):
+    """Route Events API callbacks - message events are matched to their leave request"""
+    try:
+        event = body.get('event', {})
+        if event.get('type') != 'message':
+            return JsonResponse({'status': 'ok'})
+        
+        # Edits and deletes carry the original message in a nested field
+        subtype = event.get('subtype')
+        if subtype == 'message_changed':
+            message = event.get('message', {})
+        elif subtype == 'message_deleted':
+            message = event.get('previous_message', {})
+        else:
+            message = event
+            # Ignore new posts by us (and other bots) to avoid loops - edits and deletes of our
+            # messages are exactly what the SlackMessageRef lookup below is for
+            if message.get('bot_id') or subtype == 'bot_message':
+                return JsonResponse({'status': 'ok'})
+        
+        # Only thread replies and edits/deletes of our own messages can belong to a leave
+        thread_ts = message.get('thread_ts')
+        if not thread_ts and not subtype:
+            return JsonResponse({'status': 'ok'})
+        
+        ref = get_message_ref(event.get('channel'), message.get('ts'), thread_ts)
+        if not ref:
+            return JsonResponse({'status': 'ok'})
+        
+        return handle_leave_message_event(ref, message, subtype)
+        
+    except Exception as e:
+        logger.error(f"Error handling event callback: {e}")
+        return JsonResponse({'status': 'ok'})
+
+def handle_leave_message_event(ref, message, subtype=None):
+    """Message event in a leave thread (reply, edit or delete) - resolved via SlackMessageRef"""
+    logger.info(
+        f"Message event ({subtype or 'reply'}) from {message.get('user')} on leave {ref.leave_id} "
+        f"[{ref.role}{' ' + ref.manager_slack_id if ref.manager_slack_id else ''}] in {ref.channel}"
+    )
+    return JsonResponse({'status': 'ok'})
+
 def handle_modal_submission(payload):
     """Route modal submissions to appropriate handlers"""
     try:
-        view = payload['view']
-        callback_id = view['callback_id']
+        callback_id = payload.callback_id
         
         if callback_id == 'department_selection':
             return handle_department_modal_submission(payload)
@@ -136,6 +186,8 @@ def handle_modal_submission(payload):
             return handle_email_leave_request_modal_submission(payload)
         elif callback_id == 'comp_date_selection':
             return handle_comp_date_selection(payload)
+        elif callback_id == 'bulk_approval_modal':
+            return handle_bulk_approval_submission(payload)
         
         return JsonResponse({})
             
@@ -152,9 +204,8 @@ def handle_department_modal_submission(payload):
     """Handle department selection modal submission"""
     try:
         # Process the department selection form
-        values = payload['view']['state']['values']
-        selected_department = values['department_select']['department_choice']['selected_option']['value']
-        user = get_or_create_user(payload['user']['id'])
+        selected_department = payload.required('department_select', 'department_choice')
+        user = get_or_create_user(payload.user_id)
         
         # Get or create the predefined department
         department, created = Department.objects.get_or_create(name=selected_department)
@@ -220,16 +271,15 @@ def handle_document_upload_modal_submission(payload):
             """Background function to process document upload"""
             try:
                 # Get leave request ID and details
-                leave_id = payload['view']['private_metadata']
+                leave_id = payload.private_metadata
                 leave_request = LeaveRequest.objects.get(id=leave_id)
-                values = payload['view']['state']['values']
                 
                 # Process file and notes
-                file_info = values['document_upload']['file_upload']
-                doc_notes = values.get('document_notes', {}).get('notes_input', {}).get('value', '')
+                files = payload.value('document_upload', 'file_upload', [])
+                doc_notes = payload.value('document_notes', 'notes_input', '')
                 
                 # Check if file was actually uploaded
-                if not file_info.get('files') or len(file_info['files']) == 0:
+                if not files:
                     # Send error message to employee via threaded DM
                     send_employee_notification(
                         leave_request,
@@ -251,7 +301,7 @@ def handle_document_upload_modal_submission(payload):
                     return
                 
                 # Get file information - SIMPLE APPROACH
-                uploaded_file = file_info['files'][0]
+                uploaded_file = files[0]
                 file_id = uploaded_file['id']
                 file_name = uploaded_file.get('name', 'document')
                 file_size = uploaded_file.get('size', 0)
@@ -272,8 +322,22 @@ def handle_document_upload_modal_submission(payload):
                 )
                 leave_request.document_submission_date = timezone.now().date()
                 leave_request.save()
+                
+                # Keep a structured record so later actions don't re-parse document_notes
+                from .models import LeaveDocument
+                document = LeaveDocument.objects.create(
+                    leave=leave_request,
+                    file_id=file_id,
+                    file_name=file_name,
+                    file_type=file_type,
+                    file_size=file_size or 0,
+                    permalink=uploaded_file.get('permalink'),
+                    url_private=file_url,
+                    employee_notes=doc_notes
+                )
+                
                 from .slack_utils import send_document_directly_to_managers
-                send_document_directly_to_managers(leave_request, file_id, file_name, doc_notes)
+                send_document_directly_to_managers(leave_request, file_id, file_name, doc_notes, document=document)
                 # Simple manager notification - just like it was working before
                 document_blocks = [
                     {
@@ -374,7 +438,7 @@ def handle_document_upload_modal_submission(payload):
                 logger.error(f"Background error processing document upload: {e}")
                 # Send error notification to employee via threaded DM
                 try:
-                    leave_request = LeaveRequest.objects.get(id=payload['view']['private_metadata'])
+                    leave_request = LeaveRequest.objects.get(id=payload.private_metadata)
                     send_employee_notification(
                         leave_request,
                         [{
@@ -391,10 +455,7 @@ def handle_document_upload_modal_submission(payload):
                     pass
                 
         # Start background thread IMMEDIATELY
-        import threading
-        thread = threading.Thread(target=process_document_upload_background)
-        thread.daemon = True
-        thread.start()
+        run_in_background(process_document_upload_background)
         
         # Return immediate response to clear modal (prevents timeout)
         return JsonResponse({"response_action": "clear"})
@@ -412,13 +473,11 @@ def handle_comp_date_selection(payload):
     """Handle compensatory date selection modal submission"""
     try:
         # Get leave request ID and details
-        leave_id = payload['view']['private_metadata']
+        leave_id = payload.private_metadata
         leave_request = LeaveRequest.objects.get(id=leave_id)
-        values = payload['view']['state']['values']
         
         # Get selected date
-        selected_date = values['comp_date']['date_select']['selected_date']
-        comp_date = datetime.strptime(selected_date, '%Y-%m-%d').date()
+        comp_date = payload.date('comp_date', 'date_select', required=True)
         
         # Update leave request
         leave_request.compensatory_date = comp_date
@@ -586,10 +645,7 @@ def handle_assign_manager_command(request):
                 )
         
         # Start background thread
-        import threading
-        thread = threading.Thread(target=assign_manager_role)
-        thread.daemon = True
-        thread.start()
+        run_in_background(assign_manager_role)
         
         return JsonResponse({'text': '⏳ Assigning manager role...'})
         
@@ -766,10 +822,7 @@ def handle_make_manager_command(request):
                     pass
         
         # Start background thread
-        import threading
-        thread = threading.Thread(target=process_make_manager_background)
-        thread.daemon = True
-        thread.start()
+        run_in_background(process_make_manager_background)
         
         # Return immediate response to avoid timeout
         return JsonResponse({'text': '⏳ Processing manager assignment request...'})
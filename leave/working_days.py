@@ -0,0 +1,83 @@
+from django.conf import settings
+from django.db.models.query import QuerySet
+from datetime import timedelta
+import numpy as np
+import threading
+import logging
+import time
+
+logger = logging.getLogger(__name__)
+
+# Holiday calendar cache: {calendar: (loaded_at, busdaycalendar)} - rebuilt lazily. Signals clear it in
+# the process that saved the Holiday; other processes pick the change up within LEAVE_HOLIDAY_CACHE_TTL
+_calendar_cache = {}
+_cache_lock = threading.Lock()
+
+def _cache_ttl():
+    return getattr(settings, 'LEAVE_HOLIDAY_CACHE_TTL', 300)
+
+def get_weekmask():
+    """Working weekdays Mon..Sun as a 7-char mask, e.g. '1111100' (Mon-Fri)"""
+    return getattr(settings, 'LEAVE_WEEKMASK', '1111100')
+
+def get_busdaycalendar(calendar=None):
+    """NumPy business-day calendar (weekmask + holidays) for a holiday calendar"""
+    calendar = calendar or getattr(settings, 'LEAVE_HOLIDAY_CALENDAR', 'default')
+    with _cache_lock:
+        cached = _calendar_cache.get(calendar)
+    if cached is not None and time.monotonic() - cached[0] < _cache_ttl():
+        return cached[1]
+
+    from .models import Holiday
+    holidays = np.array(
+        list(Holiday.objects.filter(calendar=calendar).values_list('date', flat=True)),
+        dtype='datetime64[D]'
+    )
+    busdaycal = np.busdaycalendar(weekmask=get_weekmask(), holidays=holidays)
+    with _cache_lock:
+        _calendar_cache[calendar] = (time.monotonic(), busdaycal)
+    return busdaycal
+
+def invalidate_holiday_cache():
+    """Drop cached calendars (called when Holiday rows change)"""
+    with _cache_lock:
+        _calendar_cache.clear()
+
+def working_days(start_date, end_date, calendar=None):
+    """Working days in an inclusive date range"""
+    if not start_date or not end_date or end_date < start_date:
+        return 0
+    return int(np.busday_count(start_date, end_date + timedelta(days=1), busdaycal=get_busdaycalendar(calendar)))
+
+def working_days_array(start_dates, end_dates, calendar=None):
+    """Vectorized working days for parallel sequences of inclusive ranges -> int array"""
+    if len(start_dates) == 0:
+        return np.zeros(0, dtype=np.int64)
+    starts = np.array(start_dates, dtype='datetime64[D]')
+    ends = np.array(end_dates, dtype='datetime64[D]') + np.timedelta64(1, 'D')
+    counts = np.busday_count(starts, ends, busdaycal=get_busdaycalendar(calendar))
+    return np.maximum(counts, 0)
+
+def leave_durations(leaves, calendar=None):
+    """
+    Working days for every leave in a result set at once
+
+    Accepts a queryset (only the two date columns are fetched) or a list of
+    leaves. Returns an int array in the same order as the input.
+    """
+    if isinstance(leaves, QuerySet):
+        rows = list(leaves.values_list('start_date', 'end_date'))
+    else:
+        rows = [(leave.start_date, leave.end_date) for leave in leaves]
+    if not rows:
+        return np.zeros(0, dtype=np.int64)
+    starts, ends = zip(*rows)
+    return working_days_array(starts, ends, calendar)
+
+def total_working_days(leaves, calendar=None):
+    """Sum of working days over a result set"""
+    return int(leave_durations(leaves, calendar).sum())
+
+def leave_working_days(leave, calendar=None):
+    """Working days for a single leave request"""
+    return working_days(leave.start_date, leave.end_date, calendar)